@@ -0,0 +1,137 @@
+"""WhatsApp booking parser: accuracy on labelled messages and messages/second.
+
+Checks a set of English, Hinglish and Devanagari messages against the
+expected pickup, drop, vehicle and trip type, next to the old
+split-on-"from"/"to" parser. Then parses --messages generated messages
+(random places, aliases, templates and typos, so place spans miss the
+gazetteer cache on first sight) twice: cold, then with a warm cache.
+
+    cd backend && python benchmarks/bench_booking_parser.py [--messages 20000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.booking_parser import BookingParser  # noqa: E402
+from services.gazetteer import DEFAULT_PLACES_PATH, Gazetteer  # noqa: E402
+
+NOW = datetime(2026, 1, 15, 6, 0, tzinfo=timezone.utc)
+
+# message -> (pickup, drop, vehicle_type, trip_type)
+LABELLED = {
+    "Book ride from Connaught Place to Cyber Hub": ("Connaught Place", "Cyber Hub", None, "one-way"),
+    "book sedan from conaught place to cyberhub at 6pm": ("Connaught Place", "Cyber Hub", "sedan", "one-way"),
+    "Noida sector 18 se airport jana hai": ("Noida Sector 18", "IGI Airport Terminal 3", None, "one-way"),
+    "मुझे लाल किला से इंडिया गेट तक जाना है": ("Red Fort", "India Gate", None, "one-way"),
+    "kal subah 9 baje CP se T3 innova chahiye": ("Connaught Place", "IGI Airport Terminal 3", "suv", "one-way"),
+    "auto chahiye karol bagh to lajpat nagar abhi": ("Karol Bagh", "Lajpat Nagar", "auto", "one-way"),
+    "pick me up from hauz khas drop at saket in 20 min": ("Hauz Khas", "Saket", None, "one-way"),
+    "to aerocity from gurgaon": ("Gurugram", "Aerocity", None, "one-way"),
+    "akshardham se noida round trip 5 baje": ("Akshardham", "Noida", None, "round-trip"),
+    "Book ride from new delhi stn to nizamuddin tomorrow 7:30 pm": (
+        "New Delhi Railway Station", "Hazrat Nizamuddin Railway Station", None, "one-way"
+    ),
+    "raat 11 baje rajiv chowk se ggn": ("Connaught Place", "Gurugram", None, "one-way"),
+    "नोएडा सेक्टर 18 से एयरपोर्ट ५ बजे ऑटो": ("Noida Sector 18", "IGI Airport Terminal 3", "auto", "one-way"),
+    "8 hours rental from ndls to huda city center": (
+        "New Delhi Railway Station", "Millennium City Centre", None, "rental-8hr"
+    ),
+    "Pls book mini frm Qutab Minar to Select City Walk": ("Qutub Minar", "Select Citywalk", "mini", "one-way"),
+    "hauz khaas -> aiims": ("Hauz Khas", "AIIMS", None, "one-way"),
+}
+
+TEMPLATES = [
+    "Book ride from {a} to {b}",
+    "book {v} from {a} to {b} at {h}pm",
+    "{a} se {b} jana hai",
+    "kal subah {h} baje {a} se {b} {v} chahiye",
+    "{a} to {b} abhi",
+    "pick me up from {a} drop at {b} in {h}0 min",
+    "{a} से {b} तक",
+]
+VEHICLES = ["auto", "mini", "sedan", "suv", "innova", "badi gaadi"]
+
+
+def legacy_parse(message: str):
+    """The previous parser: substring split on "from" and "to", no coordinates"""
+    text = message.lower()
+    if "book" in text and "from" in text and "to" in text:
+        parts = text.split("from")[1].split("to")
+        if len(parts) > 1:
+            return parts[0].strip(), parts[1].strip()
+    return None
+
+
+def typo(name: str, rng: random.Random) -> str:
+    if len(name) < 8 or rng.random() < 0.5:
+        return name
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1:] if rng.random() < 0.5 else name[:i] + name[i] + name[i:]
+
+
+def generate(places, count: int, seed: int = 7):
+    rng = random.Random(seed)
+    names = [[p["name"], *p.get("aliases", [])] for p in places]
+    messages = []
+    for _ in range(count):
+        a, b = rng.sample(names, 2)
+        messages.append(rng.choice(TEMPLATES).format(
+            a=typo(rng.choice(a), rng), b=typo(rng.choice(b), rng),
+            v=rng.choice(VEHICLES), h=rng.randint(1, 9)
+        ))
+    return messages
+
+
+def accuracy(parser: BookingParser):
+    correct = legacy_ok = 0
+    for message, expected in LABELLED.items():
+        result = parser.parse(message, NOW)
+        got = (
+            (result.get("pickup") or {}).get("address"), (result.get("drop") or {}).get("address"),
+            result.get("vehicle_type"), result.get("trip_type")
+        )
+        correct += got == expected
+        legacy_ok += legacy_parse(message) is not None
+        if got != expected:
+            print(f"  MISMATCH {message!r}: {got} != {expected}")
+    print(f"labelled: {correct}/{len(LABELLED)} fully correct "
+          f"(old parser split {legacy_ok}/{len(LABELLED)}, never with coordinates)")
+
+
+def throughput(label: str, parser: BookingParser, messages):
+    started = time.perf_counter()
+    statuses = {}
+    for message in messages:
+        status = parser.parse(message, NOW)["status"]
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    print(f"{label:6s} {len(messages)} messages in {elapsed:6.3f}s  "
+          f"{len(messages) / elapsed:9.0f} msg/s  {statuses}")
+
+
+def main(args):
+    started = time.perf_counter()
+    with open(args.places or DEFAULT_PLACES_PATH, encoding="utf-8") as f:
+        places = json.load(f)
+    parser = BookingParser(Gazetteer(places))
+    print(f"gazetteer: {len(places)} places, {parser.places.snapshot()['keys']} keys, "
+          f"built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    accuracy(parser)
+    messages = generate(places, args.messages)
+    throughput("cold", parser, messages)
+    throughput("warm", parser, messages)
+    print(f"gazetteer cache: {parser.places.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--places", help="Gazetteer JSON (default backend/data/places_delhi_ncr.json)")
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""Dispatch assignment time for a batch of rides against online drivers.
+
+Builds the in-memory driver index with random drivers around central
+Delhi, queues random ride requests and times one planning round (candidate
+lookup, vectorised distance matrix and greedy assignment).
+
+    cd backend && python benchmarks/bench_dispatch.py [--rides 1000 --drivers 10000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.driver_index import driver_index  # noqa: E402
+from services.dispatch_service import DispatchEngine, PendingRide, greedy_assignment  # noqa: E402
+from services.geo_service import haversine_km  # noqa: E402
+
+CENTER_LAT, CENTER_LON = 28.6139, 77.2090
+SPREAD_DEG = 0.27
+VEHICLE_TYPES = ["hatchback", "sedan", "suv", "auto"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rides", type=int, default=1000)
+    parser.add_argument("--drivers", type=int, default=10000)
+    parser.add_argument("--radius", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    for i in range(args.drivers):
+        driver_index.upsert(
+            f"D{i}",
+            VEHICLE_TYPES[i % len(VEHICLE_TYPES)],
+            float(CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+            float(CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+        )
+
+    rides = []
+    for i in range(args.rides):
+        location = {
+            "address": "",
+            "latitude": float(CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+            "longitude": float(CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+        }
+        rides.append(PendingRide({
+            "id": f"R{i}",
+            "pickup_location": location,
+            "drop_location": location,
+            "vehicle_type": VEHICLE_TYPES[i % len(VEHICLE_TYPES)]
+        }))
+
+    engine = DispatchEngine(radius_km=args.radius)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        plan = engine.plan(rides)
+        timings.append(time.perf_counter() - started)
+
+    total_km = sum(distance for _, _, distance in plan)
+    print(f"{args.rides} rides x {args.drivers} drivers, radius {args.radius} km")
+    print(f"  full planning round   median {np.median(timings) * 1000:8.1f} ms")
+    print(f"  rides matched         {len(plan)} ({len(plan) / args.rides:.1%}), "
+          f"mean pickup {total_km / max(len(plan), 1):.2f} km")
+
+    # Dense worst case: every ride against every driver, no radius or vehicle pruning
+    lat, lon, _ = driver_index.positions([f"D{i}" for i in range(args.drivers)])
+    ride_lat = np.array([r.latitude for r in rides])[:, np.newaxis]
+    ride_lon = np.array([r.longitude for r in rides])[:, np.newaxis]
+    started = time.perf_counter()
+    cost = haversine_km(ride_lat, ride_lon, lat[np.newaxis, :], lon[np.newaxis, :])
+    matrix = time.perf_counter() - started
+    started = time.perf_counter()
+    pairs = greedy_assignment(cost)
+    assign = time.perf_counter() - started
+    print(f"  dense {cost.shape[0]}x{cost.shape[1]} matrix    {matrix * 1000:8.1f} ms")
+    print(f"  dense greedy assignment {assign * 1000:6.1f} ms ({len(pairs)} pairs, "
+          f"mean pickup {cost[tuple(np.array(pairs).T)].mean():.2f} km)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Query latency of the in-memory driver index at 10k, 100k and 1M drivers.
+
+Drivers are spread uniformly over a 60 x 60 km box around central Delhi.
+
+    cd backend && python benchmarks/bench_driver_index.py [--queries 2000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.driver_index import DriverSpatialIndex  # noqa: E402
+
+CENTER_LAT, CENTER_LON = 28.6139, 77.2090
+SPREAD_DEG = 0.27  # ~30 km either side of the centre
+VEHICLE_TYPES = ["hatchback", "sedan", "suv", "auto"]
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1e6
+    return f"p50 {np.percentile(samples, 50):8.1f} us   p99 {np.percentile(samples, 99):8.1f} us"
+
+
+def run(size: int, queries: int, rng: np.random.Generator):
+    index = DriverSpatialIndex(cell_size_km=1.0, initial_capacity=size)
+    lats = CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+    lons = CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+    vehicles = rng.integers(0, len(VEHICLE_TYPES), size)
+
+    started = time.perf_counter()
+    for i in range(size):
+        index.upsert(f"D{i}", VEHICLE_TYPES[vehicles[i]], float(lats[i]), float(lons[i]))
+    build = time.perf_counter() - started
+
+    query_lats = CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG, queries)
+    query_lons = CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG, queries)
+
+    def timed(fn):
+        samples = []
+        for lat, lon in zip(query_lats, query_lons):
+            t0 = time.perf_counter()
+            fn(float(lat), float(lon))
+            samples.append(time.perf_counter() - t0)
+        return samples
+
+    radius = timed(lambda lat, lon: index.within_radius(lat, lon, 5.0, limit=10))
+    typed = timed(lambda lat, lon: index.within_radius(lat, lon, 5.0, "sedan", limit=10))
+    knn = timed(lambda lat, lon: index.nearest(lat, lon, 10))
+
+    moves = rng.integers(0, size, queries)
+    t0 = time.perf_counter()
+    for i in moves:
+        index.update_position(f"D{i}", float(lats[i]) + 0.001, float(lons[i]) + 0.001)
+    move = (time.perf_counter() - t0) / queries
+
+    print(f"\n{size:>9,} drivers  (build {build:.2f}s, position update {move * 1e6:.1f} us)")
+    print(f"  radius 5 km, top 10        {percentiles(radius)}")
+    print(f"  radius 5 km, sedan, top 10 {percentiles(typed)}")
+    print(f"  10 nearest                 {percentiles(knn)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    for size in args.sizes:
+        run(size, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
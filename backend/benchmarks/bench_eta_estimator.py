@@ -0,0 +1,117 @@
+"""Server-side distance/ETA estimates: pairs/second and profile recovery.
+
+Estimates --pairs random Delhi NCR pickup/drop pairs in one call,
+--repeat times, and reports the best and median time next to a
+per-pair Python loop over the same pairs. Then generates --rides
+synthetic completed rides with known per-city circuity and hourly
+speeds (plus noise and a share of bad meter readings), fits the
+profiles and reports how far the learned values are from the truth.
+No database needed.
+
+    cd backend && python benchmarks/bench_eta_estimator.py [--pairs 100000 --rides 50000]
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.eta_estimator import CITIES, DEFAULT_SPEED_KMH, ETAEstimator  # noqa: E402
+from services.geo_service import EARTH_RADIUS_KM, haversine_km  # noqa: E402
+
+# Delhi NCR bounding box
+LAT_RANGE = (28.35, 28.80)
+LON_RANGE = (76.90, 77.55)
+
+
+def random_pairs(count: int, rng: np.random.Generator):
+    return (
+        rng.uniform(*LAT_RANGE, count), rng.uniform(*LON_RANGE, count),
+        rng.uniform(*LAT_RANGE, count), rng.uniform(*LON_RANGE, count)
+    )
+
+
+def scalar_estimate(estimator: ETAEstimator, plat, plon, dlat, dlon, hour):
+    """The same estimate one pair at a time, for comparison"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (plat, plon, dlat, dlon))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    straight = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    city = int(estimator.city_of(plat, plon)[0])
+    distance = straight * estimator.circuity[city]
+    return distance, distance / estimator.speed[city, hour] * 60
+
+
+def throughput(args, rng: np.random.Generator):
+    estimator = ETAEstimator(refit_interval=0)
+    plat, plon, dlat, dlon = random_pairs(args.pairs, rng)
+    hours = rng.integers(0, 24, args.pairs)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        distance, minutes = estimator.estimate(plat, plon, dlat, dlon, hours)
+        timings.append(time.perf_counter() - started)
+    print(f"batch  {args.pairs} pairs  best {min(timings) * 1000:7.1f} ms  "
+          f"median {np.median(timings) * 1000:7.1f} ms  {args.pairs / min(timings):12.0f} pairs/s")
+
+    sample = min(args.pairs, 5000)
+    started = time.perf_counter()
+    for i in range(sample):
+        expected = scalar_estimate(estimator, plat[i], plon[i], dlat[i], dlon[i], hours[i])
+        assert math.isclose(expected[0], distance[i], rel_tol=1e-9)
+        assert math.isclose(expected[1], minutes[i], rel_tol=1e-9)
+    elapsed = time.perf_counter() - started
+    print(f"loop   {sample} pairs  {elapsed * 1000:7.1f} ms  {sample / elapsed:12.0f} pairs/s (same results)")
+
+
+def recovery(args, rng: np.random.Generator):
+    buckets = len(CITIES) + 1
+    true_circuity = rng.uniform(1.2, 1.6, buckets)
+    true_speed = DEFAULT_SPEED_KMH * rng.uniform(0.7, 1.3, (buckets, 24))
+
+    estimator = ETAEstimator(refit_interval=0, min_samples=args.min_samples)
+    plat, plon, dlat, dlon = random_pairs(args.rides, rng)
+    hours = rng.integers(0, 24, args.rides)
+    city = estimator.city_of(plat, plon)
+    straight = haversine_km(plat, plon, dlat, dlon)
+    distance = straight * true_circuity[city] * rng.lognormal(0, 0.08, args.rides)
+    duration = distance / (true_speed[city, hours] * rng.lognormal(0, 0.15, args.rides)) * 60
+    # Meter errors: zeroed distances, trips left running for hours
+    bad = rng.random(args.rides) < args.bad
+    distance[bad & (rng.random(args.rides) < 0.5)] = 0.1
+    duration[bad] *= rng.uniform(5, 20, np.count_nonzero(bad))
+
+    started = time.perf_counter()
+    used = estimator.fit_samples(plat, plon, dlat, dlon, distance, np.round(duration), hours)
+    elapsed = time.perf_counter() - started
+    print(f"\nfit    {args.rides} rides ({bad.mean():.1%} bad readings), {used} used, {elapsed * 1000:.1f} ms")
+
+    names = [c["name"] for c in CITIES] + ["other"]
+    for i, name in enumerate(names):
+        fitted = estimator.samples[i] >= args.min_samples
+        circuity_error = abs(estimator.circuity[i] / true_circuity[i] - 1)
+        speed_error = np.abs(estimator.speed[i, fitted] / true_speed[i, fitted] - 1)
+        print(f"  {name:10s} samples {int(estimator.samples[i].sum()):6d}  "
+              f"circuity err {circuity_error:6.1%}  "
+              f"speed err median {np.median(speed_error) if fitted.any() else float('nan'):6.1%} "
+              f"({np.count_nonzero(fitted)}/24 hours fitted)")
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    throughput(args, rng)
+    recovery(args, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rides", type=int, default=50000)
+    parser.add_argument("--bad", type=float, default=0.05, help="share of bad meter readings")
+    parser.add_argument("--min-samples", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+"""Fare quote throughput: scalar BillGenerator.calculate_fare vs the vectorised FareMatrix.
+
+Quotes every vehicle type x trip type for batches of random routes, checks
+that every vectorised fare equals the scalar result exactly and prints
+quotes (route x vehicle x trip type fares) per second. No database needed.
+
+    cd backend && python benchmarks/bench_fare_quote.py [--routes 1 1000 1000000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.bill_service import BillGenerator  # noqa: E402
+from services.pricing_cache import PricingTable  # noqa: E402
+from services.fare_quote import FareMatrix  # noqa: E402
+
+VEHICLES = [
+    {"vehicle_type": "auto", "base_price": 25, "price_per_km": 9, "price_per_min": 0.75, "minimum_fare": 40},
+    {"vehicle_type": "hatchback", "base_price": 40, "price_per_km": 10.5, "price_per_min": 1.2, "minimum_fare": 80},
+    {"vehicle_type": "sedan", "base_price": 50, "price_per_km": 12, "price_per_min": 1.5, "minimum_fare": 100},
+    {"vehicle_type": "suv", "base_price": 80, "price_per_km": 16.25, "price_per_min": 2, "minimum_fare": 150,
+     "trip_multipliers": {"round-trip": 1.75, "rental-8hr": 2.4}}
+]
+
+# The scalar path is far slower; past this many routes only a sample is checked
+SCALAR_SAMPLE = 2000
+
+
+def scalar_quotes(table: PricingTable, matrix: FareMatrix, distance, duration) -> np.ndarray:
+    fares = np.empty((len(distance), len(matrix.vehicle_types), len(matrix.trip_types)))
+    for r, (km, minutes) in enumerate(zip(distance.tolist(), duration.tolist())):
+        for v, vehicle_type in enumerate(matrix.vehicle_types):
+            pricing = table.get(vehicle_type)
+            for t, trip_type in enumerate(matrix.trip_types):
+                fares[r, v, t] = BillGenerator.calculate_fare(pricing, km, minutes, trip_type)
+    return fares
+
+
+def main(args):
+    rng = np.random.default_rng(7)
+    table = PricingTable(1, VEHICLES)
+    matrix = FareMatrix(table)
+    cells = len(matrix.vehicle_types) * len(matrix.trip_types)
+
+    for routes in args.routes:
+        distance = np.round(rng.uniform(0, 80, routes), 2)
+        duration = rng.integers(0, 240, routes)
+
+        best = np.inf
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            _, fares = matrix.quote(distance, duration)
+            best = min(best, time.perf_counter() - started)
+
+        sample = min(routes, SCALAR_SAMPLE)
+        started = time.perf_counter()
+        expected = scalar_quotes(table, matrix, distance[:sample], duration[:sample])
+        scalar = (time.perf_counter() - started) / sample * routes
+        mismatches = int(np.count_nonzero(fares[:sample] != expected))
+
+        print(f"{routes:>9,d} routes  vectorised {best * 1000:9.3f} ms "
+              f"({routes * cells / best:14,.0f} fares/s)   "
+              f"scalar {scalar * 1000:11.1f} ms{' (extrapolated)' if sample < routes else ''}   "
+              f"mismatches {mismatches}/{sample * cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, nargs="+", default=[1, 1000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
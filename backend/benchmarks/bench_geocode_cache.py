@@ -0,0 +1,125 @@
+"""Geocode cache hit rate and latency for a city's address mix.
+
+Replays --lookups geocode and reverse-geocode lookups drawn from a Zipf
+distribution over the gazetteer's places (typed with varying case and
+punctuation, plus GPS jitter for map pins) and a long tail of one-off
+addresses, against FakeGeocodeProvider with --latency seconds per call.
+--workers GeocodeCache instances share one MongoDB store the way server
+processes do. Reports the hit rate per tenth of the run, so the warm-up
+and the steady state of a mature city are visible, and the provider
+calls saved. Needs a MongoDB at MONGO_URL; the database named by --db
+is dropped at the end.
+
+    cd backend && python benchmarks/bench_geocode_cache.py [--lookups 20000 --workers 4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from indexes import INDEXES  # noqa: E402
+from services.gazetteer import gazetteer  # noqa: E402
+from services.geocoding import FakeGeocodeProvider, GeocodeCache  # noqa: E402
+
+SUFFIXES = ["", ", New Delhi", ", Delhi NCR", " gate 2", " main gate", ", India"]
+
+
+def typed(name: str, rng: random.Random) -> str:
+    """The same place the way different customers type it"""
+    text = name + rng.choice(SUFFIXES)
+    style = rng.random()
+    if style < 0.3:
+        return text.lower()
+    if style < 0.4:
+        return text.upper()
+    if style < 0.5:
+        return text.replace(" ", "  ").replace(",", " ,")
+    return text
+
+
+def workload(count: int, tail: float, reverse_share: float, seed: int = 11):
+    rng = random.Random(seed)
+    places = gazetteer.places
+    # Zipf popularity: a few airports and stations take most of the bookings
+    weights = 1 / np.arange(1, len(places) + 1) ** 1.1
+    ranks = np.random.default_rng(seed).choice(len(places), size=count, p=weights / weights.sum())
+    lookups = []
+    for i, rank in enumerate(ranks):
+        if rng.random() < tail:
+            lookups.append(("geocode", f"House {rng.randint(1, 999)}, Block {rng.choice('ABCDEFGH')}, "
+                                       f"Sector {rng.randint(1, 150)}, Noida"))
+        elif rng.random() < reverse_share:
+            place = places[rank]
+            # Pins dropped around the same gate: roughly 5-10 m of GPS noise
+            lookups.append(("reverse", (place["latitude"] + rng.gauss(0, 0.00005),
+                                        place["longitude"] + rng.gauss(0, 0.00005))))
+        else:
+            lookups.append(("geocode", typed(places[rank]["name"], rng)))
+    return lookups
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    await db.geocode_cache.create_indexes(INDEXES["geocode_cache"])
+    provider = FakeGeocodeProvider(gazetteer, latency=args.latency)
+    workers = [GeocodeCache(provider="none", precision=args.precision) for _ in range(args.workers)]
+    for cache in workers:
+        cache.provider = provider
+
+    lookups = workload(args.lookups, args.tail, args.reverse_share)
+    window = max(1, len(lookups) // 10)
+    latency = []
+    try:
+        for start in range(0, len(lookups), window):
+            calls_before = provider.calls
+            batch = lookups[start:start + window]
+
+            async def one(i, kind, query):
+                cache = workers[i % len(workers)]
+                started = time.perf_counter()
+                if kind == "geocode":
+                    await cache.geocode(db, query)
+                else:
+                    await cache.reverse(db, *query)
+                latency.append(time.perf_counter() - started)
+
+            # Bursts of concurrent bookings, the way requests arrive at the API
+            for offset in range(0, len(batch), args.concurrency):
+                chunk = batch[offset:offset + args.concurrency]
+                await asyncio.gather(*(one(start + offset + j, *item) for j, item in enumerate(chunk)))
+            calls = provider.calls - calls_before
+            print(f"lookups {start:6d}-{start + len(batch):6d}  provider calls {calls:5d}  "
+                  f"hit rate {1 - calls / len(batch):6.1%}")
+
+        total = {key: sum(cache.stats[key] for cache in workers) for key in workers[0].stats}
+        ms = np.asarray(latency) * 1000
+        print(f"\n{len(lookups)} lookups, {provider.calls} provider calls "
+              f"({1 - provider.calls / len(lookups):.1%} served from cache)")
+        print(f"latency p50 {np.percentile(ms, 50):.2f} ms  p99 {np.percentile(ms, 99):.2f} ms")
+        print(f"tiers: {total}")
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per provider call")
+    parser.add_argument("--tail", type=float, default=0.05, help="share of one-off addresses")
+    parser.add_argument("--reverse-share", type=float, default=0.3)
+    parser.add_argument("--precision", type=int, default=4)
+    parser.add_argument("--db", default="gaddi24x7_bench_geocode")
+    asyncio.run(main(parser.parse_args()))
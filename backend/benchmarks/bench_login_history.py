@@ -0,0 +1,102 @@
+"""Login latency vs account age: the old rewrite-the-whole-array flow vs record_login.
+
+For each history size, seeds one user the old way (every past login
+embedded in login_history) and one the new way (the last
+LOGIN_HISTORY_EMBEDDED entries embedded, the rest in login_events), then
+times repeated logins with both implementations and reports p50/p99.
+Needs a MongoDB at MONGO_URL; the database named by --db is dropped at
+the end.
+
+    cd backend && python benchmarks/bench_login_history.py [--history 10 1000 10000 --logins 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from models import User, UserRole  # noqa: E402
+from services.login_history import record_login, EMBEDDED_LOGINS  # noqa: E402
+
+
+async def legacy_login(db, phone: str):
+    """The previous verify_otp login path"""
+    user_doc = await db.users.find_one({"phone": phone, "role": UserRole.CUSTOMER})
+    user = User(**user_doc)
+    user.last_login = datetime.utcnow()
+    user.login_history.append({
+        "timestamp": datetime.utcnow(),
+        "ip_address": "127.0.0.1",
+        "device_info": "bench"
+    })
+    await db.users.update_one(
+        {"phone": phone, "role": UserRole.CUSTOMER},
+        {"$set": {"last_login": user.last_login, "login_history": user.login_history}}
+    )
+    return user.dict()
+
+
+async def bounded_login(db, phone: str):
+    return await record_login(db, {"phone": phone, "role": UserRole.CUSTOMER}, "127.0.0.1", "bench")
+
+
+def history(count: int):
+    start = datetime.utcnow() - timedelta(days=365)
+    return [
+        {"timestamp": start + timedelta(minutes=i), "ip_address": "10.0.0.1", "device_info": "Mozilla/5.0 (Linux; Android 14)"}
+        for i in range(count)
+    ]
+
+
+async def seed(db, size: int):
+    past = history(size)
+    legacy = User(name="Legacy", phone=f"L{size}", role=UserRole.CUSTOMER, login_history=past).dict()
+    bounded = User(name="Bounded", phone=f"B{size}", role=UserRole.CUSTOMER,
+                   login_history=past[-EMBEDDED_LOGINS:]).dict()
+    await db.users.insert_many([legacy, bounded])
+    for start in range(0, size, 10000):
+        await db.login_events.insert_many([{"user_id": bounded["id"], **entry} for entry in past[start:start + 10000]])
+
+
+async def measure(db, implementation, phone: str, logins: int):
+    samples = []
+    for _ in range(logins):
+        started = time.perf_counter()
+        await implementation(db, phone)
+        samples.append(time.perf_counter() - started)
+    return np.asarray(samples) * 1000
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[args.db]
+    await db.users.create_index([("phone", 1), ("role", 1)])
+    try:
+        for size in args.history:
+            await seed(db, size)
+            for label, implementation, phone in (
+                ("rewrite array (before)", legacy_login, f"L{size}"),
+                ("$push/$slice (after)", bounded_login, f"B{size}")
+            ):
+                samples = await measure(db, implementation, phone, args.logins)
+                print(f"{size:>6} past logins  {label:24s} p50 {np.percentile(samples, 50):8.2f} ms   "
+                      f"p99 {np.percentile(samples, 99):8.2f} ms")
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--db", default="gaddi24x7_bench")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Event-loop impact of n8n notifications: blocking requests.post vs the async client.
+
+Starts benchmarks/fake_webhook.py in-process with injected latency and
+failures, sends --sends booking notifications concurrently and, while they
+run, samples event-loop lag with a 10 ms ticker. The old implementation
+called requests.post inside the coroutine, so every send stalled the loop
+for the full webhook latency; the async client should keep lag near zero,
+deliver every send despite failures (via retries) and never deliver one
+twice (same Idempotency-Key across retries).
+
+    cd backend && python benchmarks/bench_n8n_client.py [--sends 200 --latency 0.3 --failure-rate 0.2]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_webhook import FakeWebhook, serve_in_thread  # noqa: E402
+from services.n8n_service import N8NIntegrationService  # noqa: E402
+
+
+async def sample_lag(samples, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+def booking(i: int):
+    return dict(phone=f"98765{i:05d}", customer_name="Bench", ride_id=f"R{i}",
+                pickup="Connaught Place", drop="Cyber Hub", fare=420.0, otp="1234")
+
+
+async def legacy_send(url: str, i: int):
+    """The previous implementation: a blocking POST inside the coroutine"""
+    try:
+        response = requests.post(url, json={"type": "booking_confirmation", **booking(i)}, timeout=10)
+        response.raise_for_status()
+        return {"status": "success"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+async def run(label: str, sends, count: int):
+    lag, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(sample_lag(lag, stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(sends(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    ok = sum(1 for r in results if r["status"] == "success")
+    lag_ms = np.asarray(lag or [0.0]) * 1000
+    print(f"{label:26s} {count} sends in {elapsed:6.2f}s  ok {ok:4d}  "
+          f"loop lag p50 {np.percentile(lag_ms, 50):7.1f} ms  max {lag_ms.max():8.1f} ms")
+
+
+async def main(args):
+    # Own thread and loop: the blocking client below would otherwise stall the server too
+    webhook = FakeWebhook(args.latency, args.jitter, args.failure_rate)
+    serve_in_thread(webhook, args.port)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+    if args.legacy_sends:
+        await run("requests.post (before)", lambda i: legacy_send(url, i), args.legacy_sends)
+        webhook.reset()
+
+    service = N8NIntegrationService(
+        webhook_url=url, max_concurrency=args.concurrency, retries=args.retries, backoff_base=0.05
+    )
+    await run("httpx.AsyncClient (after)", lambda i: service.send_booking_notification(**booking(i)), args.sends)
+    await service.close()
+    print(f"client stats: {service.snapshot()}")
+    print(f"server stats: {webhook.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=200)
+    parser.add_argument("--legacy-sends", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--port", type=int, default=5679)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""Driver offer fan-out throughput and latency against a fake WhatsApp webhook.
+
+Indexes --drivers random drivers around central Delhi, primes their
+contacts (no database needed) and serves benchmarks/fake_webhook.py on
+the same event loop with --latency per request. Then:
+
+  1. alerts --rides rides at once, each to its --per-ride nearest drivers,
+     and reports offers per second and per-send latency;
+  2. alerts the same number of new rides and closes each one --accept-after
+     seconds later, as if a driver accepted, and reports how many sends were
+     cancelled before reaching the webhook.
+
+    cd backend && python benchmarks/bench_offer_fanout.py [--rides 500 --per-ride 10 --latency 0.02]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_webhook import FakeWebhook  # noqa: E402
+from services.driver_index import driver_index  # noqa: E402
+from services.n8n_service import N8NIntegrationService  # noqa: E402
+from services.offer_fanout import OfferFanout  # noqa: E402
+
+CENTER_LAT, CENTER_LON = 28.6139, 77.2090
+SPREAD_DEG = 0.27
+
+
+def rides(rng, count: int, prefix: str):
+    return [
+        {
+            "id": f"{prefix}{i}",
+            "vehicle_type": "sedan",
+            "estimated_fare": 350.0,
+            "pickup_location": {
+                "latitude": float(CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+                "longitude": float(CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+                "address": "Connaught Place"
+            }
+        }
+        for i in range(count)
+    ]
+
+
+async def main(args):
+    rng = np.random.default_rng(11)
+    for i in range(args.drivers):
+        driver_index.upsert(
+            f"D{i}", "sedan",
+            float(CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+            float(CENTER_LON + rng.uniform(-SPREAD_DEG, SPREAD_DEG)),
+            user_id=f"U{i}"
+        )
+
+    webhook = FakeWebhook(args.latency)
+    server = await webhook.serve(args.port)
+    sender = N8NIntegrationService(
+        webhook_url=f"http://127.0.0.1:{args.port}/webhook",
+        max_connections=args.connections, max_concurrency=args.concurrency, retries=1,
+        pool_shards=args.shards
+    )
+    fanout = OfferFanout(sender, drivers_per_ride=args.per_ride, radius_km=10.0, max_concurrency=args.concurrency)
+    fanout.contacts.prime((f"U{i}", f"9{i:09d}", f"Driver {i}") for i in range(args.drivers))
+
+    try:
+        batch = rides(rng, args.rides, "R")
+        started = time.perf_counter()
+        scheduled = sum([await fanout.alert(None, ride, "Bench") for ride in batch])
+        await asyncio.gather(*(fanout.wait(ride["id"]) for ride in batch))
+        elapsed = time.perf_counter() - started
+        snapshot = fanout.snapshot()
+        print(f"fan-out: {scheduled} offers to {args.rides} rides in {elapsed:.2f}s "
+              f"= {scheduled / elapsed:,.0f} offers/s; send p50 {snapshot['send_seconds_p50'] * 1000:.1f} ms "
+              f"p99 {snapshot['send_seconds_p99'] * 1000:.1f} ms; sent {snapshot['offers_sent']} "
+              f"failed {snapshot['offers_failed']}")
+
+        # Re-alerting a ride must not reach any driver twice
+        again = sum([await fanout.alert(None, ride, "Bench") for ride in batch[:50]])
+        print(f"dedup: re-alerting 50 rides scheduled {again} sends "
+              f"({fanout.stats['duplicates_suppressed']} suppressed)")
+
+        received = webhook.stats["received"]
+        cancelled_before = fanout.stats["offers_cancelled"]
+
+        async def accepted(ride):
+            await fanout.alert(None, ride, "Bench")
+            await asyncio.sleep(args.accept_after)
+            fanout.ride_closed(ride["id"])
+            await fanout.wait(ride["id"])
+
+        second = rides(rng, args.rides, "C")
+        await asyncio.gather(*(accepted(ride) for ride in second))
+        print(f"cancel on accept after {args.accept_after * 1000:.0f} ms: "
+              f"{fanout.stats['offers_cancelled'] - cancelled_before} of {args.rides * args.per_ride} sends cancelled, "
+              f"{webhook.stats['received'] - received} reached the webhook")
+    finally:
+        await sender.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=20000)
+    parser.add_argument("--rides", type=int, default=500)
+    parser.add_argument("--per-ride", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--shards", type=int, default=20)
+    parser.add_argument("--accept-after", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=5680)
+    asyncio.run(main(parser.parse_args()))
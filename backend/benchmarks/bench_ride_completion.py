@@ -0,0 +1,138 @@
+"""Ride completion latency: the old sequential flow vs the current pipeline.
+
+Seeds a pricing config, customer and driver users and ongoing rides in a
+scratch database, then completes them with both implementations and
+reports p50/p99 latency. Needs a MongoDB at MONGO_URL; the database named
+by --db is dropped at the end.
+
+    cd backend && python benchmarks/bench_ride_completion.py [--rides 500 --concurrency 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from models import (  # noqa: E402
+    Ride, RideStatus, ActivityLog, ActivityType, Transaction, TransactionType, VehiclePricing
+)
+from services.bill_service import BillGenerator  # noqa: E402
+from routes.rides import complete_ride  # noqa: E402
+from services.pricing_cache import pricing_cache  # noqa: E402
+
+PRICING = {
+    "id": "pricing_config",
+    "vehicles": [{
+        "vehicle_type": "sedan",
+        "base_price": 50,
+        "price_per_km": 12,
+        "price_per_min": 1.5,
+        "minimum_fare": 100
+    }]
+}
+
+
+async def legacy_complete(db, ride_id, actual_distance, actual_duration, payment_method):
+    """The pre-pipeline implementation: eleven strictly sequential awaits"""
+    ride = Ride(**await db.rides.find_one({"id": ride_id}))
+    pricing_config = await db.pricing_config.find_one({"id": "pricing_config"})
+    vehicle_pricing = next(v for v in pricing_config["vehicles"] if v["vehicle_type"] == ride.vehicle_type)
+    bill = BillGenerator.generate_bill(ride, VehiclePricing(**vehicle_pricing), actual_distance, actual_duration)
+    await db.bills.insert_one(bill.dict())
+    await db.rides.update_one({"id": ride_id}, {"$set": {
+        "status": RideStatus.COMPLETED, "actual_fare": bill.total, "payment_method": payment_method
+    }})
+    customer = await db.users.find_one({"id": ride.customer_id})
+    new_balance = customer["wallet_balance"] - bill.total
+    await db.users.update_one({"id": ride.customer_id}, {"$set": {"wallet_balance": new_balance}})
+    await db.transactions.insert_one(Transaction(
+        user_id=ride.customer_id, amount=bill.total, transaction_type=TransactionType.RIDE_PAYMENT,
+        description="", ride_id=ride_id, balance_before=customer["wallet_balance"], balance_after=new_balance
+    ).dict())
+    driver = await db.users.find_one({"id": ride.driver_id})
+    earning = bill.total * 0.8
+    await db.users.update_one({"id": ride.driver_id}, {"$set": {"wallet_balance": driver["wallet_balance"] + earning}})
+    await db.transactions.insert_one(Transaction(
+        user_id=ride.driver_id, amount=earning, transaction_type=TransactionType.DRIVER_EARNING,
+        description="", ride_id=ride_id, balance_before=driver["wallet_balance"],
+        balance_after=driver["wallet_balance"] + earning
+    ).dict())
+    await db.activity_logs.insert_one(ActivityLog(
+        user_id=ride.customer_id, activity_type=ActivityType.RIDE_COMPLETED, description=""
+    ).dict())
+
+
+async def pipeline_complete(db, ride_id, actual_distance, actual_duration, payment_method):
+    await complete_ride(
+        ride_id=ride_id,
+        actual_distance=actual_distance,
+        actual_duration=actual_duration,
+        payment_method=payment_method,
+        db=db
+    )
+
+
+async def seed(db, prefix: str, count: int):
+    location = {"address": "Connaught Place", "latitude": 28.63, "longitude": 77.22}
+    await db.rides.insert_many([
+        Ride(
+            id=f"{prefix}{i}", customer_id="BENCH-CUSTOMER", driver_id="BENCH-DRIVER",
+            pickup_location=location, drop_location=location, vehicle_type="sedan",
+            distance=10, estimated_duration=25, estimated_fare=250, status=RideStatus.ONGOING
+        ).dict()
+        for i in range(count)
+    ])
+
+
+async def measure(db, implementation, prefix: str, count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await implementation(db, f"{prefix}{i}", 12.5, 30, "wallet")
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return np.asarray(samples) * 1000, time.perf_counter() - started
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[args.db]
+    await db.pricing_config.insert_one(dict(PRICING))
+    await pricing_cache.load(db)
+    await db.users.insert_many([
+        {"id": "BENCH-CUSTOMER", "name": "Bench", "phone": "0", "wallet_balance": 1e9},
+        {"id": "BENCH-DRIVER", "name": "Bench", "phone": "0", "wallet_balance": 0.0}
+    ])
+
+    try:
+        for label, implementation, prefix in (
+            ("sequential (before)", legacy_complete, "OLD"),
+            ("pipeline (after)", pipeline_complete, "NEW")
+        ):
+            await seed(db, prefix, args.rides)
+            samples, elapsed = await measure(db, implementation, prefix, args.rides, args.concurrency)
+            print(f"{label:20s} p50 {np.percentile(samples, 50):7.2f} ms   "
+                  f"p99 {np.percentile(samples, 99):7.2f} ms   {args.rides / elapsed:7.1f} rides/s")
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rides", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--db", default="gaddi24x7_bench")
+    asyncio.run(main(parser.parse_args()))
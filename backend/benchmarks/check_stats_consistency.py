@@ -0,0 +1,119 @@
+"""Consistency check: maintained dashboard counters vs the original aggregation.
+
+Seeds users, drivers and rides in a scratch database through the same
+stats hooks the routes use (registration, ride creation, completion,
+online toggles), then compares StatsRollup.read() with the full
+count/aggregate implementation /admin/stats used before the counters, and
+checks that reconcile() finds no drift. Needs a MongoDB at MONGO_URL; the
+database named by --db is dropped at the end. Exits non-zero on mismatch.
+
+    cd backend && python benchmarks/check_stats_consistency.py [--rides 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from models import Ride, RideStatus, User, UserRole  # noqa: E402
+from services.stats_rollup import StatsRollup  # noqa: E402
+
+
+async def legacy_stats(db):
+    """The pre-rollup /admin/stats implementation"""
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    revenue = await db.rides.aggregate([
+        {"$match": {"status": "completed"}},
+        {"$group": {"_id": None, "total": {"$sum": "$actual_fare"}}}
+    ]).to_list(1)
+    today_revenue = await db.rides.aggregate([
+        {"$match": {"status": "completed", "created_at": {"$gte": today_start}}},
+        {"$group": {"_id": None, "total": {"$sum": "$actual_fare"}}}
+    ]).to_list(1)
+    return {
+        "total_customers": await db.users.count_documents({"role": "customer"}),
+        "total_drivers": await db.users.count_documents({"role": "driver"}),
+        "active_drivers": await db.drivers.count_documents({"is_online": True}),
+        "total_rides": await db.rides.count_documents({}),
+        "completed_rides": await db.rides.count_documents({"status": "completed"}),
+        "total_revenue": round(revenue[0]["total"] if revenue else 0, 2),
+        "today_rides": await db.rides.count_documents({"created_at": {"$gte": today_start}}),
+        "today_revenue": round(today_revenue[0]["total"] if today_revenue else 0, 2)
+    }
+
+
+async def seed(db, rollup: StatsRollup, args):
+    rng = random.Random(args.seed)
+    location = {"address": "Connaught Place", "latitude": 28.63, "longitude": 77.22}
+
+    for i in range(args.users):
+        user = User(name=f"User {i}", phone=str(9000000000 + i),
+                    role=UserRole.DRIVER if i % 5 == 0 else UserRole.CUSTOMER)
+        await db.users.insert_one(user.dict())
+        await rollup.user_registered(db, user.role)
+
+    await db.drivers.insert_many([{"id": f"D{i}", "is_online": False} for i in range(args.drivers)])
+    for _ in range(args.drivers * 3):
+        driver_id = f"D{rng.randrange(args.drivers)}"
+        online = rng.random() < 0.5
+        before = await db.drivers.find_one_and_update({"id": driver_id}, {"$set": {"is_online": online}})
+        if before["is_online"] != online:
+            await rollup.driver_online_changed(db, online)
+
+    now = datetime.utcnow()
+    for i in range(args.rides):
+        # Spread over three days so the today-bucket boundary is exercised
+        ride = Ride(
+            id=f"CHECK-{i}", customer_id="C", pickup_location=location, drop_location=location,
+            vehicle_type="sedan", distance=10, estimated_duration=20, estimated_fare=200,
+            created_at=now - timedelta(minutes=rng.randrange(3 * 24 * 60))
+        )
+        await db.rides.insert_one(ride.dict())
+        await rollup.ride_created(db, ride)
+        if rng.random() < 0.6:
+            fare = round(rng.uniform(80, 900), 2)
+            await db.rides.update_one({"id": ride.id}, {"$set": {"status": RideStatus.COMPLETED, "actual_fare": fare}})
+            await rollup.ride_completed(db, ride, fare)
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[args.db]
+    rollup = StatsRollup()
+    try:
+        await seed(db, rollup, args)
+
+        started = time.perf_counter()
+        expected = await legacy_stats(db)
+        legacy_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        actual = await rollup.read(db)
+        rollup_ms = (time.perf_counter() - started) * 1000
+
+        mismatches = {k: (expected[k], actual[k]) for k in expected if expected[k] != actual[k]}
+        drift = await rollup.reconcile(db)
+        for key, value in sorted(expected.items()):
+            print(f"{key:18s} aggregation {value:>12}   counters {actual[key]:>12}")
+        print(f"read latency: aggregation {legacy_ms:.1f} ms, counters {rollup_ms:.1f} ms")
+        print(f"mismatches: {mismatches or 'none'}; reconcile drift: {drift or 'none'}")
+        return 1 if mismatches or drift else 0
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--rides", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", default="gaddi24x7_stats_check")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,64 @@
+"""Fire many simultaneous accepts at one ride and check exactly one wins.
+
+Runs the ride state machine directly against MongoDB (MONGO_URL / DB_NAME)
+using a throwaway ride, so no API server is needed.
+
+    cd backend && python benchmarks/concurrent_accepts.py [--drivers 500 --rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from models import RideStatus  # noqa: E402
+from services.ride_state import transition_ride, RideTransitionError  # noqa: E402
+
+
+async def race(db, ride_id: str, drivers: int):
+    await db.rides.insert_one({"id": ride_id, "status": RideStatus.REQUESTED})
+
+    async def accept(driver: int):
+        try:
+            await transition_ride(db, ride_id, "accept", {"driver_id": f"DRIVER-{driver}"})
+            return f"DRIVER-{driver}"
+        except RideTransitionError as e:
+            assert e.status_code == 409, e.detail
+            return None
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(accept(i) for i in range(drivers)))
+    elapsed = time.perf_counter() - started
+
+    winners = [r for r in results if r]
+    stored = await db.rides.find_one({"id": ride_id})
+    await db.rides.delete_one({"id": ride_id})
+    return winners, stored["driver_id"], elapsed
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], maxPoolSize=args.pool)
+    db = client[os.environ["DB_NAME"]]
+    failures = 0
+    for round_number in range(args.rounds):
+        winners, stored, elapsed = await race(db, f"RACE-{os.getpid()}-{round_number}", args.drivers)
+        ok = len(winners) == 1 and winners[0] == stored
+        failures += not ok
+        print(f"round {round_number:3d}: {args.drivers} accepts in {elapsed * 1000:7.1f} ms, "
+              f"winners {len(winners)}, stored driver {stored} {'OK' if ok else 'FAIL'}")
+    client.close()
+    print("PASS" if not failures else f"FAIL ({failures} rounds)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--pool", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Local stand-in for the n8n webhook that injects latency and failures.
+
+A minimal keep-alive HTTP/1.1 server on asyncio streams, so it can share
+an event loop with the client under test without costing much CPU. Every
+POST sleeps for --latency seconds (plus up to --jitter), then fails with
+--failure-status for a --failure-rate fraction of requests and otherwise
+answers {"ok": true}. GET /stats reports requests received and how many
+distinct Idempotency-Key values were accepted.
+
+    cd backend && python benchmarks/fake_webhook.py [--port 5678 --latency 0.5 --failure-rate 0.2]
+
+Then point N8N_WEBHOOK_URL at http://127.0.0.1:5678/webhook.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+
+class FakeWebhook:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, failure_status: int = 503):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.accepted_keys = set()
+        self.stats = {"received": 0, "failed": 0, "accepted": 0, "duplicates": 0}
+
+    def reset(self):
+        self.accepted_keys.clear()
+        self.stats.update(received=0, failed=0, accepted=0, duplicates=0)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: dict):
+        data = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+            + data
+        )
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method = lines[0].split(" ", 1)[0]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method != "POST":
+                    await self._respond(writer, 200, {**self.stats, "unique_keys": len(self.accepted_keys)})
+                    continue
+
+                self.stats["received"] += 1
+                await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+                if random.random() < self.failure_rate:
+                    self.stats["failed"] += 1
+                    await self._respond(writer, self.failure_status, {"ok": False})
+                    continue
+                key = headers.get("idempotency-key")
+                if key in self.accepted_keys:
+                    self.stats["duplicates"] += 1
+                self.accepted_keys.add(key)
+                self.stats["accepted"] += 1
+                await self._respond(writer, 200, {"ok": True})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle, host, port, backlog=1024)
+
+
+def serve_in_thread(webhook: FakeWebhook, port: int):
+    """Run the webhook on its own loop in a daemon thread (for clients that block their loop)"""
+    started = threading.Event()
+
+    async def run():
+        await webhook.serve(port)
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(run()), daemon=True).start()
+    started.wait()
+    time.sleep(0.05)
+
+
+async def main(args):
+    webhook = FakeWebhook(args.latency, args.jitter, args.failure_rate, args.failure_status)
+    server = await webhook.serve(args.port)
+    print(f"Fake webhook on http://127.0.0.1:{args.port}/webhook")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=503)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,182 @@
+"""Load test for the driver WebSocket stream (/api/drivers/ws).
+
+Opens many concurrent driver connections, authenticates each one, then
+streams location frames and pings at a fixed rate and reports connect
+time, ping round-trip latency and frame throughput.
+
+    cd backend
+    python benchmarks/loadtest_driver_ws.py --seed --connections 20000 \\
+        --url ws://localhost:8000/api/drivers/ws --duration 60
+
+--seed inserts synthetic verified drivers (LOADTEST-<n>) into MONGO_URL /
+DB_NAME so the connections can authenticate; --cleanup removes them. The
+auth frames carry login tokens signed with the server's JWT_SECRET.
+Raise the open-file limit first (ulimit -n 65535) for large runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import numpy as np
+import websockets
+
+CENTER_LAT, CENTER_LON = 28.6139, 77.2090
+
+
+def seed_drivers(count: int):
+    from pymongo import MongoClient, UpdateOne
+
+    db = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+    operations = [
+        UpdateOne(
+            {"id": f"LOADTEST-{i}"},
+            {"$set": {
+                "id": f"LOADTEST-{i}",
+                "user_id": f"LOADTEST-USER-{i}",
+                "vehicle_type": "sedan",
+                "is_verified": True,
+                "is_online": True
+            }},
+            upsert=True
+        )
+        for i in range(count)
+    ]
+    for start in range(0, len(operations), 10000):
+        db.drivers.bulk_write(operations[start:start + 10000], ordered=False)
+    print(f"Seeded {count} drivers")
+
+
+def cleanup_drivers():
+    from pymongo import MongoClient
+
+    db = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+    result = db.drivers.delete_many({"id": {"$regex": "^LOADTEST-"}})
+    print(f"Removed {result.deleted_count} drivers")
+
+
+class Results:
+    def __init__(self):
+        self.connect_times = []
+        self.ping_rtts = []
+        self.frames_sent = 0
+        self.offers = 0
+        self.failures = 0
+        self.closed = 0
+
+
+def login_token(user_id: str) -> str:
+    """The access token the server issues at login"""
+    return jwt.encode(
+        {"sub": user_id, "role": "driver", "exp": datetime.utcnow() + timedelta(hours=1)},
+        os.environ["JWT_SECRET"],
+        algorithm="HS256"
+    )
+
+
+async def driver(index: int, args, results: Results, stop: asyncio.Event):
+    driver_id = f"LOADTEST-{index}"
+    token = login_token(f"LOADTEST-USER-{index}")
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(args.url, max_queue=64, ping_interval=None) as ws:
+            await ws.send(json.dumps(["auth", driver_id, token]))
+            reply = json.loads(await ws.recv())
+            if reply[0] != "ok":
+                results.failures += 1
+                return
+            results.connect_times.append(time.perf_counter() - started)
+
+            lat = CENTER_LAT + random.uniform(-0.2, 0.2)
+            lon = CENTER_LON + random.uniform(-0.2, 0.2)
+            ping_sent = None
+
+            async def receiver():
+                nonlocal ping_sent
+                async for message in ws:
+                    frame = json.loads(message)
+                    if frame[0] == "P" and ping_sent is not None:
+                        results.ping_rtts.append(time.perf_counter() - ping_sent)
+                        ping_sent = None
+                    elif frame[0] == "o":
+                        results.offers += 1
+
+            receiving = asyncio.create_task(receiver())
+            # Spread the first frame over the interval so connections do not pulse together
+            await asyncio.sleep(random.uniform(0, args.interval))
+            while not stop.is_set():
+                lat += random.uniform(-0.0005, 0.0005)
+                lon += random.uniform(-0.0005, 0.0005)
+                await ws.send(json.dumps(["l", round(lat, 6), round(lon, 6)]))
+                results.frames_sent += 1
+                if ping_sent is None:
+                    ping_sent = time.perf_counter()
+                    await ws.send('["p"]')
+                    results.frames_sent += 1
+                await asyncio.sleep(args.interval)
+            receiving.cancel()
+    except websockets.ConnectionClosed:
+        results.closed += 1
+    except OSError:
+        results.failures += 1
+
+
+def summary(label: str, samples):
+    if not samples:
+        return f"{label}: no samples"
+    ms = np.asarray(samples) * 1000
+    return (
+        f"{label}: p50 {np.percentile(ms, 50):.1f} ms  p99 {np.percentile(ms, 99):.1f} ms  "
+        f"max {ms.max():.1f} ms  (n={len(ms)})"
+    )
+
+
+async def main(args):
+    results = Results()
+    stop = asyncio.Event()
+    tasks = []
+    ramp_started = time.perf_counter()
+    for i in range(args.connections):
+        tasks.append(asyncio.create_task(driver(i, args, results, stop)))
+        if args.ramp_rate and i % args.ramp_rate == args.ramp_rate - 1:
+            await asyncio.sleep(1)
+    ramp = time.perf_counter() - ramp_started
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    elapsed = args.duration + ramp
+    print(f"connections requested {args.connections}, established {len(results.connect_times)}, "
+          f"failed {results.failures}, closed by server {results.closed}")
+    print(summary("connect + auth", results.connect_times))
+    print(summary("ping round trip", results.ping_rtts))
+    print(f"frames sent {results.frames_sent} ({results.frames_sent / elapsed:.0f}/s), "
+          f"offers received {results.offers}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000/api/drivers/ws")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between location frames")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--ramp-rate", type=int, default=2000, help="new connections per second (0 = all at once)")
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.connections + 100:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.connections + 1000), hard))
+
+    if args.seed:
+        seed_drivers(args.connections)
+    asyncio.run(main(args))
+    if args.cleanup:
+        cleanup_drivers()
@@ -0,0 +1,124 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from typing import Dict, Optional
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks live connection pool counters for every server in the topology"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, int]] = {}
+
+    def _bump(self, address, field: str, delta: int = 1):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            stats = self._servers.setdefault(key, {
+                "checked_out": 0,
+                "waiting": 0,
+                "created": 0,
+                "closed": 0,
+                "checkout_failed": 0,
+                "pool_cleared": 0
+            })
+            stats[field] += delta
+
+    def pool_created(self, event):
+        self._bump(event.address, "created", 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, "pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, "created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, "closed")
+
+    def connection_check_out_started(self, event):
+        self._bump(event.address, "waiting")
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, "waiting", -1)
+        self._bump(event.address, "checkout_failed")
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, "waiting", -1)
+        self._bump(event.address, "checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, "checked_out", -1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            servers = {address: dict(stats) for address, stats in self._servers.items()}
+
+        totals = {}
+        for stats in servers.values():
+            for field, value in stats.items():
+                totals[field] = totals.get(field, 0) + value
+        totals["open"] = totals.get("created", 0) - totals.get("closed", 0)
+
+        return {"totals": totals, "servers": servers}
+
+
+pool_stats = PoolStatsListener()
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def pool_options() -> Dict:
+    """Connection pool settings, overridable through the environment"""
+    return {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000)),
+        "maxConnecting": int(os.environ.get("MONGO_MAX_CONNECTING", 2)),
+        "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+    }
+
+
+def connect() -> AsyncIOMotorClient:
+    """Create the process-wide client. Called once from the app startup hook."""
+    global _client
+    if _client is None:
+        options = pool_options()
+        _client = AsyncIOMotorClient(
+            os.environ['MONGO_URL'],
+            event_listeners=[pool_stats],
+            **options
+        )
+        logger.info(f"MongoDB client created with pool options {options}")
+    return _client
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    if _client is None:
+        raise RuntimeError("MongoDB client not initialised; call database.connect() first")
+    return _client
+
+
+def get_db() -> AsyncIOMotorDatabase:
+    """FastAPI dependency returning the shared database handle"""
+    return get_client()[os.environ['DB_NAME']]
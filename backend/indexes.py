@@ -0,0 +1,302 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from services.login_history import LOGIN_EVENTS_TTL_DAYS
+from services.activity_archive import EXPORTED_TTL_DAYS as ACTIVITY_LOG_EXPORTED_TTL_DAYS
+from services.outbox import OUTBOX_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Index declarations per collection. Applied idempotently at startup.
+# Record ids are timestamp-derived and older ones may collide (rides and
+# bills carry a random suffix since), so only the singleton documents
+# (config, counters, rollups) get unique id indexes.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "drivers": [
+        # Nearby driver search: equality filters first, then the geo key
+        IndexModel(
+            [
+                ("is_online", ASCENDING),
+                ("is_verified", ASCENDING),
+                ("vehicle_type", ASCENDING),
+                ("current_location", GEOSPHERE)
+            ],
+            name="drivers_available_geo"
+        ),
+        IndexModel([("id", ASCENDING)], name="drivers_id"),
+        IndexModel([("user_id", ASCENDING)], name="drivers_user"),
+        # Admin pending-KYC queue, newest first
+        IndexModel([("kyc_documents.status", ASCENDING), ("created_at", DESCENDING)], name="drivers_kyc_status"),
+        # Driver index refresh: drivers moved or toggled since the last pass
+        IndexModel([("location_updated_at", ASCENDING)], name="drivers_location_updated"),
+        IndexModel([("status_updated_at", ASCENDING)], name="drivers_status_updated"),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="users_id"),
+        # OTP and social login lookups
+        IndexModel([("phone", ASCENDING), ("role", ASCENDING)], name="users_phone_role"),
+        IndexModel([("email", ASCENDING), ("role", ASCENDING)], name="users_email_role"),
+        # Admin listings: keyset pagination on (created_at, id), optionally by role
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="users_created_keyset"),
+        IndexModel(
+            [("role", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="users_role_created_keyset"
+        ),
+    ],
+    "rides": [
+        IndexModel([("id", ASCENDING)], name="rides_id"),
+        # Ride history per customer / driver, newest first
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING)], name="rides_customer_created"),
+        IndexModel([("driver_id", ASCENDING), ("created_at", DESCENDING)], name="rides_driver_created"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="rides_created_keyset"),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="rides_status_created_keyset"
+        ),
+        # Revenue rollup backfill scans completed rides by completion time
+        IndexModel([("status", ASCENDING), ("completed_at", ASCENDING)], name="rides_status_completed"),
+    ],
+    "bills": [
+        IndexModel([("ride_id", ASCENDING)], name="bills_ride"),
+    ],
+    "transactions": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="transactions_user_created"),
+    ],
+    "activity_logs": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="activity_logs_user_created"),
+        # Archive job scans by day
+        IndexModel([("created_at", ASCENDING)], name="activity_logs_created"),
+        # Only rows already archived carry exported_at, so nothing unarchived expires
+        IndexModel(
+            [("exported_at", ASCENDING)],
+            name="activity_logs_exported_ttl",
+            expireAfterSeconds=ACTIVITY_LOG_EXPORTED_TTL_DAYS * 86400
+        ),
+    ],
+    "login_events": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="login_events_user"),
+        # Full login history expires; the last few stay embedded on the user
+        IndexModel(
+            [("timestamp", ASCENDING)],
+            name="login_events_ttl",
+            expireAfterSeconds=LOGIN_EVENTS_TTL_DAYS * 86400
+        ),
+    ],
+    "otp_codes": [
+        IndexModel([("id", ASCENDING)], name="otp_codes_id", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="otp_codes_ttl", expireAfterSeconds=0),
+    ],
+    "otp_rate_limits": [
+        IndexModel([("id", ASCENDING)], name="otp_rate_limits_id", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="otp_rate_limits_ttl", expireAfterSeconds=0),
+    ],
+    "notification_outbox": [
+        # Ids are deduplication keys, so uniqueness is what prevents double sends
+        IndexModel([("id", ASCENDING)], name="notification_outbox_id", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="notification_outbox_due"),
+        IndexModel([("status", ASCENDING), ("updated_at", DESCENDING)], name="notification_outbox_status_updated"),
+        IndexModel(
+            [("sent_at", ASCENDING)],
+            name="notification_outbox_sent_ttl",
+            expireAfterSeconds=OUTBOX_RETENTION_DAYS * 86400
+        ),
+    ],
+    # Offers relayed to drivers connected to another worker; gone soon after expiry
+    "driver_offers": [
+        IndexModel(
+            [("driver_id", ASCENDING), ("delivered", ASCENDING), ("expires_at", ASCENDING)],
+            name="driver_offers_pending"
+        ),
+        IndexModel([("expires_at", ASCENDING)], name="driver_offers_ttl", expireAfterSeconds=600),
+    ],
+    "activity_archive_index": [
+        IndexModel([("user_id", ASCENDING), ("day", DESCENDING)], name="activity_archive_index_user_day", unique=True),
+    ],
+    # Single-leader locks (services/leases.py); the unique id makes takeover atomic
+    "leases": [
+        IndexModel([("id", ASCENDING)], name="leases_id", unique=True),
+    ],
+    "geocode_cache": [
+        IndexModel([("id", ASCENDING)], name="geocode_cache_id", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="geocode_cache_ttl", expireAfterSeconds=0),
+    ],
+    "pricing_config": [
+        IndexModel([("id", ASCENDING)], name="pricing_config_id", unique=True),
+    ],
+    "stats_counters": [
+        IndexModel([("id", ASCENDING)], name="stats_counters_id", unique=True),
+    ],
+    "revenue_daily": [
+        IndexModel([("id", ASCENDING)], name="revenue_daily_id", unique=True),
+        IndexModel([("date", ASCENDING)], name="revenue_daily_date"),
+    ],
+    "revenue_hourly": [
+        IndexModel([("id", ASCENDING)], name="revenue_hourly_id", unique=True),
+        IndexModel([("date", ASCENDING)], name="revenue_hourly_date"),
+    ],
+}
+
+# Representative query shapes per route, checked with explain() by
+# check_query_plans(). (name, collection, filter, sort)
+_T = datetime(2024, 1, 1)
+QUERY_SHAPES: List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("auth.verify_otp", "users", {"phone": "9876543210", "role": "customer"}, None),
+    ("auth.social_login", "users", {"email": "a@example.com", "role": "customer"}, None),
+    ("users.by_id", "users", {"id": "U1"}, None),
+    ("rides.by_id", "rides", {"id": "R1"}, None),
+    ("rides.customer_history", "rides", {"customer_id": "U1"}, [("created_at", -1)]),
+    ("rides.driver_history", "rides", {"driver_id": "U1"}, [("created_at", -1)]),
+    ("rides.bill", "bills", {"ride_id": "R1"}, None),
+    ("drivers.by_id", "drivers", {"id": "D1"}, None),
+    ("drivers.by_user", "drivers", {"user_id": "U1"}, None),
+    ("drivers.index_refresh", "drivers", {"$or": [
+        {"location_updated_at": {"$gt": _T}}, {"status_updated_at": {"$gt": _T}}
+    ]}, None),
+    ("admin.user_activity.logs", "activity_logs", {"user_id": "U1"}, [("created_at", -1)]),
+    ("activity_archive.oldest", "activity_logs", {"created_at": {"$lt": _T}}, [("created_at", 1)]),
+    ("activity_archive.find", "activity_archive_index", {"user_id": "U1", "day": {"$lte": "2024-01-01"}}, [("day", -1)]),
+    ("admin.user_activity.transactions", "transactions", {"user_id": "U1"}, [("created_at", -1)]),
+    ("admin.user_activity.rides", "rides", {"$or": [{"customer_id": "U1"}, {"driver_id": "U1"}]}, [("created_at", -1)]),
+    ("admin.pending_kyc", "drivers", {"kyc_documents.status": "pending"}, [("created_at", -1)]),
+    ("admin.users_page", "users", {"role": "customer"}, [("created_at", -1), ("id", -1)]),
+    ("admin.users_next_page", "users", {"$or": [
+        {"created_at": {"$lt": _T}}, {"created_at": _T, "id": {"$lt": "U1"}}
+    ]}, [("created_at", -1), ("id", -1)]),
+    ("admin.rides_page", "rides", {"status": "completed"}, [("created_at", -1), ("id", -1)]),
+    ("dispatch.recover", "rides", {"status": "requested", "created_at": {"$gte": _T}}, None),
+    ("dispatch.relay", "driver_offers", {"driver_id": {"$in": ["D1", "D2"]}, "delivered": False, "expires_at": {"$gt": _T}}, None),
+    ("dispatch.engaged", "rides", {"status": {"$in": ["accepted", "ongoing"]}, "driver_id": {"$ne": None}}, None),
+    ("lease.acquire", "leases", {"id": "dispatch"}, None),
+    ("revenue.backfill", "rides", {"status": "completed", "$or": [
+        {"completed_at": {"$gte": _T}}, {"completed_at": None, "created_at": {"$gte": _T}}
+    ]}, None),
+    ("eta.fit", "rides", {
+        "status": "completed", "completed_at": {"$gte": _T}, "trip_type": "one-way",
+        "actual_distance": {"$gt": 0}, "actual_duration": {"$gt": 0}
+    }, [("completed_at", -1)]),
+    ("auth.otp", "otp_codes", {"id": "9876543210"}, None),
+    ("admin.user_logins", "login_events", {"user_id": "U1"}, [("timestamp", -1)]),
+    ("outbox.claim", "notification_outbox", {"status": "pending", "available_at": {"$lte": _T}}, [("available_at", 1)]),
+    ("outbox.dead_letters", "notification_outbox", {"status": "dead"}, [("updated_at", -1)]),
+    ("geocode.lookup", "geocode_cache", {"id": "fwd:connaught place"}, None),
+    ("pricing.config", "pricing_config", {"id": "pricing_config"}, None),
+    ("stats.read", "stats_counters", {"id": {"$in": ["global", "day:2024-01-01"]}}, None),
+    ("revenue.series", "revenue_daily", {"date": {"$gte": "2024-01-01"}}, [("id", 1)]),
+]
+
+
+# Indexes dropped at startup because keeping them is harmful, not just unused
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # TTL on created_at: expired activity_logs rows whether or not they had been archived
+    "activity_logs": ["activity_logs_ttl"],
+}
+
+
+def _declared(model: IndexModel) -> Dict[str, Any]:
+    document = dict(model.document)
+    return {
+        "key": list(document.pop("key").items()),
+        "options": {k: v for k, v in document.items() if k != "name"}
+    }
+
+
+def _existing(info: Dict[str, Any]) -> Dict[str, Any]:
+    ignored = {"v", "key", "name", "ns", "background"}
+    return {
+        "key": list(info["key"].items()),
+        "options": {k: v for k, v in info.items() if k not in ignored and not k.startswith("2dsphere")}
+    }
+
+
+async def index_drift(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared and live indexes per collection.
+
+    Returns {collection: {"missing": [...], "changed": [...], "undeclared": [...]}}
+    for collections that differ; empty when the database matches INDEXES.
+    """
+    report: Dict[str, Dict[str, List[str]]] = {}
+    for collection, models in INDEXES.items():
+        live = {info["name"]: info async for info in db[collection].list_indexes()}
+        live.pop("_id_", None)
+        declared = {model.document["name"]: model for model in models}
+
+        missing = [name for name in declared if name not in live]
+        changed = []
+        for name, model in declared.items():
+            if name in live:
+                want, have = _declared(model), _existing(live[name])
+                # Numeric key directions may come back as floats
+                same_key = [(k, v if isinstance(v, str) else int(v)) for k, v in have["key"]] == want["key"]
+                if not same_key or have["options"] != want["options"]:
+                    changed.append(name)
+        undeclared = [name for name in live if name not in declared]
+
+        if missing or changed or undeclared:
+            report[collection] = {"missing": missing, "changed": changed, "undeclared": undeclared}
+    return report
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """Create every declared index, then log and return any remaining drift.
+
+    Existing identical indexes are a no-op. An index whose name or options
+    conflict with a live one is left alone and reported, not rebuilt.
+    RETIRED_INDEXES are dropped first.
+    """
+    for collection, names in RETIRED_INDEXES.items():
+        live = {info["name"] async for info in db[collection].list_indexes()}
+        for name in names:
+            if name in live:
+                await db[collection].drop_index(name)
+                logger.warning(f"Dropped retired index {name} on {collection}")
+
+    for collection, models in INDEXES.items():
+        try:
+            names = await db[collection].create_indexes(models)
+            logger.info(f"Indexes ensured on {collection}: {', '.join(names)}")
+        except OperationFailure as e:
+            # One conflicting index fails the whole batch; fall back to one at a time
+            logger.error(f"Index conflict on {collection}: {str(e)}")
+            for model in models:
+                try:
+                    await db[collection].create_indexes([model])
+                except OperationFailure:
+                    pass
+
+    drift = await index_drift(db)
+    for collection, problems in drift.items():
+        logger.warning(f"Index drift on {collection}: {problems}")
+    return drift
+
+
+def _stages(plan: Any):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+async def check_query_plans(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """explain() every QUERY_SHAPES entry; one result per shape with its winning plan stages"""
+    results = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explained = await db.command("explain", command, verbosity="queryPlanner")
+        stages = list(dict.fromkeys(_stages(explained["queryPlanner"]["winningPlan"])))
+        results.append({
+            "name": name,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages
+        })
+    return results
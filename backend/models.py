@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
+import uuid
 
 class UserRole(str, Enum):
     CUSTOMER = "customer"
@@ -58,6 +59,11 @@ class User(UserBase):
         from_attributes = True
 
 # Driver Models
+class GeoPoint(BaseModel):
+    """GeoJSON point; coordinates are [longitude, latitude]"""
+    type: str = "Point"
+    coordinates: List[float]
+
 class KYCDocument(BaseModel):
     license_number: str
     license_photo_url: Optional[str] = None
@@ -88,7 +94,7 @@ class DriverCreate(DriverBase):
 class Driver(DriverBase):
     id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
     is_online: bool = False
-    current_location: Optional[Dict[str, float]] = None
+    current_location: Optional[GeoPoint] = None
     total_earnings: float = 0.0
     total_rides: int = 0
     rating: float = 0.0
@@ -98,6 +104,20 @@ class Driver(DriverBase):
     class Config:
         from_attributes = True
 
+class LocationPing(BaseModel):
+    driver_id: str
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    recorded_at: Optional[datetime] = None
+
+    @field_validator("recorded_at")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored timestamps are naive UTC throughout
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 # Ride Models
 class Location(BaseModel):
     address: str
@@ -115,20 +135,35 @@ class RideBase(BaseModel):
     estimated_fare: float
 
 class RideCreate(RideBase):
-    pass
+    # Left out or implausible estimates are filled in by the server
+    distance: Optional[float] = Field(None, ge=0)
+    estimated_duration: Optional[int] = Field(None, ge=0)
+    estimated_fare: Optional[float] = Field(None, ge=0)
 
 class Ride(RideBase):
-    id: str = Field(default_factory=lambda: f"R{int(datetime.utcnow().timestamp())}")
+    # Random suffix: outbox keys and dispatch state are per ride, so ids must not repeat
+    id: str = Field(default_factory=lambda: f"R{int(datetime.utcnow().timestamp())}{uuid.uuid4().hex[:8]}")
     driver_id: Optional[str] = None
     status: RideStatus = RideStatus.REQUESTED
     otp: str = Field(default_factory=lambda: str(datetime.utcnow().microsecond)[-4:])
     actual_fare: Optional[float] = None
+    actual_distance: Optional[float] = None
+    actual_duration: Optional[int] = None
+    # Differ from the actuals when review_completion clamped the readings
+    billed_distance: Optional[float] = None
+    billed_duration: Optional[int] = None
     payment_method: Optional[str] = None
+    accepted_at: Optional[datetime] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    cancelled_at: Optional[datetime] = None
+    cancellation_reason: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     rating: Optional[float] = None
     feedback: Optional[str] = None
+    # Server-side estimate checks (see services/eta_estimator.py)
+    estimate_corrections: List[str] = []
+    completion_flags: List[str] = []
     
     class Config:
         from_attributes = True
@@ -169,7 +204,7 @@ class BillItem(BaseModel):
     amount: float
 
 class Bill(BaseModel):
-    id: str = Field(default_factory=lambda: f"BILL{int(datetime.utcnow().timestamp())}")
+    id: str = Field(default_factory=lambda: f"BILL{int(datetime.utcnow().timestamp())}{uuid.uuid4().hex[:8]}")
     ride_id: str
     customer_id: str
     driver_id: str
@@ -233,6 +268,24 @@ class PricingConfig(BaseModel):
     class Config:
         from_attributes = True
 
+class QuoteRoute(BaseModel):
+    distance: float = Field(ge=0)
+    duration: int = Field(ge=0)
+
+class FareQuoteRequest(BaseModel):
+    routes: List[QuoteRoute] = Field(min_length=1)
+    vehicle_types: Optional[List[str]] = None
+
+class EstimatePair(BaseModel):
+    pickup_latitude: float = Field(ge=-90, le=90)
+    pickup_longitude: float = Field(ge=-180, le=180)
+    drop_latitude: float = Field(ge=-90, le=90)
+    drop_longitude: float = Field(ge=-180, le=180)
+
+class EstimateRequest(BaseModel):
+    pairs: List[EstimatePair] = Field(min_length=1)
+    departure_at: Optional[datetime] = None
+
 # API Keys Config Model
 class APIKeysConfig(BaseModel):
     id: str = "api_keys_config"
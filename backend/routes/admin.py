@@ -1,113 +1,110 @@
-from fastapi import APIRouter, HTTPException, Query
-from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime
 from typing import Optional, List
-import os
+from database import get_db
+from services.pricing_cache import pricing_cache
+from services.batch_loader import Loaders, get_loaders
+from services.stats_rollup import stats_rollup
+from services.revenue_rollup import revenue_rollup
+from services.login_history import get_login_events
+from services.activity_archive import activity_archive
+from services.outbox import outbox
+from services.geocoding import geocoder
+from services.pagination import keyset_page, count_cache, InvalidCursor, KEYSET_SORT
 
 router = APIRouter()
 
-def get_db():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
-
 @router.get("/stats")
-async def get_dashboard_stats():
-    """Get dashboard statistics"""
-    
-    db = get_db()
-    
-    # Total users
-    total_customers = await db.users.count_documents({"role": "customer"})
-    total_drivers = await db.users.count_documents({"role": "driver"})
-    
-    # Active drivers
-    active_drivers = await db.drivers.count_documents({"is_online": True})
-    
-    # Total rides
-    total_rides = await db.rides.count_documents({})
-    completed_rides = await db.rides.count_documents({"status": "completed"})
-    
-    # Revenue calculation
-    revenue_pipeline = [
-        {"$match": {"status": "completed"}},
-        {"$group": {"_id": None, "total": {"$sum": "$actual_fare"}}}
-    ]
-    revenue_result = await db.rides.aggregate(revenue_pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total"] if revenue_result else 0
-    
-    # Today's stats
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_rides = await db.rides.count_documents({
-        "created_at": {"$gte": today_start}
-    })
-    
-    today_revenue_pipeline = [
-        {"$match": {
-            "status": "completed",
-            "created_at": {"$gte": today_start}
-        }},
-        {"$group": {"_id": None, "total": {"$sum": "$actual_fare"}}}
-    ]
-    today_revenue_result = await db.rides.aggregate(today_revenue_pipeline).to_list(1)
-    today_revenue = today_revenue_result[0]["total"] if today_revenue_result else 0
+async def get_dashboard_stats(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Get dashboard statistics from the maintained counters"""
+    
+    return {"success": True, "stats": await stats_rollup.read(db)}
+
+@router.post("/stats/reconcile")
+async def reconcile_dashboard_stats(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Recompute dashboard counters from source and report the drift corrected"""
+    
+    drift = await stats_rollup.reconcile(db)
     
     return {
         "success": True,
-        "stats": {
-            "total_customers": total_customers,
-            "total_drivers": total_drivers,
-            "active_drivers": active_drivers,
-            "total_rides": total_rides,
-            "completed_rides": completed_rides,
-            "total_revenue": total_revenue,
-            "today_rides": today_rides,
-            "today_revenue": today_revenue
-        }
+        "drift": drift,
+        "stats": await stats_rollup.read(db)
     }
 
+async def _offset_page(collection, key: str, query: dict, page: int, limit: int) -> dict:
+    """Legacy page-number pagination; cost grows with depth, prefer cursors"""
+    
+    docs = await collection.find(query).sort(KEYSET_SORT).skip((page - 1) * limit).limit(limit).to_list(limit)
+    total = await count_cache.count(collection, query)
+    
+    return {
+        "success": True,
+        key: docs,
+        "total": total,
+        "page": page,
+        "pages": (total + limit - 1) // limit
+    }
+
+async def _cursor_page(collection, key: str, query: dict, cursor: Optional[str], limit: int, count: Optional[str]) -> dict:
+    """Keyset pagination; the first page also keeps the total/page/pages fields clients already read"""
+    
+    try:
+        docs, next_cursor = await keyset_page(collection, query, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = {
+        "success": True,
+        key: docs,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
+    if cursor:
+        # Deeper pages only count on request; page numbers mean nothing there
+        response["total"] = await count_cache.total(collection, query, count)
+    else:
+        total = await count_cache.total(collection, query, count or "exact")
+        response.update({"total": total, "page": 1, "pages": (total + limit - 1) // limit})
+    return response
+
 @router.get("/users")
 async def get_all_users(
     role: Optional[str] = None,
-    page: int = 1,
-    limit: int = 50
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated)$"),
+    page: Optional[int] = Query(None, ge=1),
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get all users with pagination"""
-    
-    db = get_db()
+    """Get all users, newest first, with cursor pagination"""
     
     query = {}
     if role:
         query["role"] = role
     
-    skip = (page - 1) * limit
-    
-    users = await db.users.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents(query)
+    if page is not None:
+        return await _offset_page(db.users, "users", query, page, limit)
     
-    return {
-        "success": True,
-        "users": users,
-        "total": total,
-        "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+    return await _cursor_page(db.users, "users", query, cursor, limit, count)
 
 @router.get("/users/{user_id}/activity")
-async def get_user_activity(user_id: str, limit: int = 100):
+async def get_user_activity(
+    user_id: str,
+    limit: int = 100,
+    before: Optional[datetime] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     """Get complete activity log for a user"""
     
-    db = get_db()
-    
     # Get user details
     user = await db.users.find_one({"id": user_id})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get activity logs
-    activities = await db.activity_logs.find(
-        {"user_id": user_id}
-    ).sort("created_at", -1).limit(limit).to_list(limit)
+    # Get activity logs (recent ones from MongoDB, older ones from the archive)
+    activities, archive_days_scanned = await activity_archive.find(db, user_id, limit, before)
     
     # Get rides
     rides = await db.rides.find(
@@ -127,6 +124,7 @@ async def get_user_activity(user_id: str, limit: int = 100):
         "transactions": transactions,
         "summary": {
             "total_activities": len(activities),
+            "archive_days_scanned": archive_days_scanned,
             "total_rides": len(rides),
             "total_transactions": len(transactions),
             "last_login": user.get("last_login"),
@@ -134,19 +132,33 @@ async def get_user_activity(user_id: str, limit: int = 100):
         }
     }
 
+@router.get("/users/{user_id}/logins")
+async def get_user_logins(
+    user_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get full login history for a user (beyond the entries kept on the user)"""
+    
+    logins = await get_login_events(db, user_id, limit)
+    
+    return {"success": True, "logins": logins, "total": len(logins)}
+
 @router.get("/drivers/pending-kyc")
-async def get_pending_kyc_drivers():
+async def get_pending_kyc_drivers(
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
+):
     """Get all drivers with pending KYC verification"""
     
-    db = get_db()
-    
     drivers = await db.drivers.find(
         {"kyc_documents.status": "pending"}
     ).sort("created_at", -1).to_list(100)
     
-    # Enrich with user details
+    # Enrich with user details (one batched users query)
+    users = await loaders.users.load_many(driver["user_id"] for driver in drivers)
     for driver in drivers:
-        user = await db.users.find_one({"id": driver["user_id"]})
+        user = users.get(driver["user_id"])
         if user:
             driver["user_details"] = {
                 "name": user["name"],
@@ -165,12 +177,14 @@ async def get_all_rides(
     status: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    page: int = 1,
-    limit: int = 50
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    count: Optional[str] = Query(None, pattern="^(exact|estimated)$"),
+    page: Optional[int] = Query(None, ge=1),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
 ):
-    """Get all rides with filters"""
-    
-    db = get_db()
+    """Get all rides with filters, newest first, with cursor pagination"""
     
     query = {}
     if status:
@@ -180,36 +194,32 @@ async def get_all_rides(
     if end_date:
         query.setdefault("created_at", {})["$lte"] = end_date
     
-    skip = (page - 1) * limit
-    
-    rides = await db.rides.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    total = await db.rides.count_documents(query)
+    if page is not None:
+        response = await _offset_page(db.rides, "rides", query, page, limit)
+    else:
+        response = await _cursor_page(db.rides, "rides", query, cursor, limit, count)
+    rides = response["rides"]
     
-    # Enrich with user and driver details
+    # Enrich with user and driver details (one batched users query)
+    users = await loaders.users.load_many(
+        user_id for ride in rides for user_id in (ride["customer_id"], ride.get("driver_id"))
+    )
     for ride in rides:
-        customer = await db.users.find_one({"id": ride["customer_id"]})
+        customer = users.get(ride["customer_id"])
         if customer:
             ride["customer_name"] = customer["name"]
         
         if ride.get("driver_id"):
-            driver = await db.users.find_one({"id": ride["driver_id"]})
+            driver = users.get(ride["driver_id"])
             if driver:
                 ride["driver_name"] = driver["name"]
     
-    return {
-        "success": True,
-        "rides": rides,
-        "total": total,
-        "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+    return response
 
 @router.get("/pricing")
-async def get_pricing_config():
+async def get_pricing_config(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get current pricing configuration"""
     
-    db = get_db()
-    
     config = await db.pricing_config.find_one({"id": "pricing_config"})
     
     if not config:
@@ -218,28 +228,27 @@ async def get_pricing_config():
     return {"success": True, "config": config}
 
 @router.post("/pricing")
-async def update_pricing_config(config: dict, admin_id: str):
-    """Update pricing configuration"""
-    
-    db = get_db()
+async def update_pricing_config(
+    config: dict,
+    admin_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Update pricing configuration. Bumps the version so every worker reloads it."""
     
     config["updated_at"] = datetime.utcnow()
     config["updated_by"] = admin_id
     
-    await db.pricing_config.update_one(
-        {"id": "pricing_config"},
-        {"$set": config},
-        upsert=True
-    )
+    try:
+        table = await pricing_cache.update(db, config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pricing config: {str(e)}")
     
-    return {"success": True, "message": "Pricing updated successfully"}
+    return {"success": True, "version": table.version, "message": "Pricing updated successfully"}
 
 @router.get("/api-keys")
-async def get_api_keys():
+async def get_api_keys(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get API keys configuration (masked)"""
     
-    db = get_db()
-    
     config = await db.api_keys_config.find_one({"id": "api_keys_config"})
     
     if not config:
@@ -254,11 +263,9 @@ async def get_api_keys():
     return {"success": True, "config": config}
 
 @router.post("/api-keys")
-async def update_api_keys(config: dict):
+async def update_api_keys(config: dict, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Update API keys configuration"""
     
-    db = get_db()
-    
     config["id"] = "api_keys_config"
     config["updated_at"] = datetime.utcnow()
     
@@ -268,35 +275,56 @@ async def update_api_keys(config: dict):
         upsert=True
     )
     
+    # Other workers pick up new map keys on restart
+    await geocoder.start(db)
+    
     return {"success": True, "message": "API keys updated successfully"}
 
 @router.get("/analytics/revenue")
-async def get_revenue_analytics(days: int = 30):
-    """Get revenue analytics for last N days"""
-    
-    db = get_db()
-    
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    pipeline = [
-        {"$match": {
-            "status": "completed",
-            "created_at": {"$gte": start_date}
-        }},
-        {"$group": {
-            "_id": {
-                "$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}
-            },
-            "total_revenue": {"$sum": "$actual_fare"},
-            "ride_count": {"$sum": 1}
-        }},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    results = await db.rides.aggregate(pipeline).to_list(days)
+async def get_revenue_analytics(
+    days: int = Query(30, ge=1, le=1000),
+    granularity: str = Query("day", pattern="^(day|hour)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get revenue analytics for the last N local days from the rollups"""
+    
+    if granularity == "hour" and days > 90:
+        raise HTTPException(status_code=400, detail="Hourly analytics are limited to 90 days")
+    
+    rows = await revenue_rollup.series(db, days, granularity)
     
     return {
         "success": True,
-        "analytics": results,
-        "period_days": days
+        "analytics": [
+            {
+                "_id": row["id"],
+                "total_revenue": round(row["revenue"], 2),
+                "ride_count": row["rides"],
+                "vehicles": row.get("vehicles", {})
+            }
+            for row in rows
+        ],
+        "period_days": days,
+        "granularity": granularity,
+        "timezone": revenue_rollup.tz_name
     }
+
+@router.get("/outbox/dead-letters")
+async def get_dead_letters(
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get notifications that ran out of delivery attempts"""
+    
+    records = await outbox.dead_letters(db, limit)
+    
+    return {"success": True, "dead_letters": records, "depth": await outbox.depth(db)}
+
+@router.post("/outbox/{key}/retry")
+async def retry_dead_letter(key: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Requeue a dead notification with a fresh attempt budget"""
+    
+    if not await outbox.retry(db, key):
+        raise HTTPException(status_code=404, detail="Dead notification not found")
+    
+    return {"success": True, "message": "Notification requeued"}
@@ -1,31 +1,38 @@
-from fastapi import APIRouter, HTTPException, Request
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import APIRouter, HTTPException, Request, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 from models import User, UserCreate, UserRole, LoginMethod, ActivityLog, ActivityType
 from typing import Dict
-import os
+from database import get_db
+from services.stats_rollup import stats_rollup
+from services.login_history import record_login
+from services.otp_service import otp_service, OTPError
+from services.auth_tokens import auth_tokens
+from services.activity_writer import activity_writer
 
 router = APIRouter()
 
-# Get database
-def get_db():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
+def _otp_http_error(e: OTPError) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
 
 @router.post("/send-otp")
-async def send_otp(phone: str, user_type: UserRole):
-    """Send OTP to phone number (Mock for now, will integrate Fast2SMS)"""
+async def send_otp(phone: str, user_type: UserRole, request: Request):
+    """Send OTP to phone number (rate limited per phone and per IP)"""
     
-    # Mock OTP generation
-    otp = "1234"  # In production, generate random OTP and send via Fast2SMS
+    try:
+        otp = await otp_service.send(phone, request.client.host)
+    except OTPError as e:
+        raise _otp_http_error(e)
     
-    # Store OTP in session/cache (for now, just return success)
-    return {
+    response = {
         "success": True,
-        "message": "OTP sent successfully (Mock)",
-        "otp": otp  # Remove in production
+        "message": "OTP sent successfully"
     }
+    if otp:
+        # Only with OTP_ECHO=true, for local development
+        response["otp"] = otp
+    return response
 
 @router.post("/verify-otp")
 async def verify_otp(
@@ -33,50 +40,38 @@ async def verify_otp(
     otp: str,
     user_type: UserRole,
     request: Request,
-    name: str = None
+    name: str = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Verify OTP and login/register user"""
     
-    db = get_db()
-    
-    # Mock OTP verification (accept any 4-digit OTP)
-    if len(otp) != 4:
+    if len(otp) != otp_service.length or not otp.isdigit():
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
-    # Check if user exists
-    user_doc = await db.users.find_one({"phone": phone, "role": user_type})
+    # The code is checked before users is touched
+    try:
+        await otp_service.verify(phone, otp, request.client.host)
+    except OTPError as e:
+        raise _otp_http_error(e)
+    
+    # Existing user: stamp the login in one atomic update (bounded history)
+    user_doc = await record_login(
+        db,
+        {"phone": phone, "role": user_type},
+        ip_address=request.client.host,
+        device_info=request.headers.get("user-agent", "Unknown")
+    )
     
     if user_doc:
-        # Existing user - login
-        user = User(**user_doc)
-        user.last_login = datetime.utcnow()
-        
-        # Add login to history
-        login_entry = {
-            "timestamp": datetime.utcnow(),
-            "ip_address": request.client.host,
-            "device_info": request.headers.get("user-agent", "Unknown")
-        }
-        user.login_history.append(login_entry)
-        
-        # Update user
-        await db.users.update_one(
-            {"phone": phone, "role": user_type},
-            {"$set": {
-                "last_login": user.last_login,
-                "login_history": user.login_history
-            }}
-        )
-        
         # Log activity
         activity = ActivityLog(
-            user_id=user.id,
+            user_id=user_doc["id"],
             activity_type=ActivityType.LOGIN,
             description=f"{user_type.value} logged in",
             ip_address=request.client.host,
             device_info=request.headers.get("user-agent")
         )
-        await db.activity_logs.insert_one(activity.dict())
+        activity_writer.log(activity)
         
     else:
         # New user - register
@@ -91,7 +86,9 @@ async def verify_otp(
             last_login=datetime.utcnow()
         )
         
-        await db.users.insert_one(user.dict())
+        user_doc = user.dict()
+        await db.users.insert_one(dict(user_doc))
+        await stats_rollup.user_registered(db, user.role)
         
         # Log activity
         activity = ActivityLog(
@@ -101,11 +98,12 @@ async def verify_otp(
             ip_address=request.client.host,
             device_info=request.headers.get("user-agent")
         )
-        await db.activity_logs.insert_one(activity.dict())
+        activity_writer.log(activity)
     
     return {
         "success": True,
-        "user": user.dict(),
+        "user": user_doc,
+        "access_token": auth_tokens.issue(user_doc["id"], user_doc["role"]),
         "message": "Login successful"
     }
 
@@ -114,12 +112,11 @@ async def social_login(
     provider: LoginMethod,
     access_token: str,
     user_type: UserRole,
-    request: Request
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Handle Google/Facebook login"""
     
-    db = get_db()
-    
     # Mock social login validation
     # In production, validate token with Google/Facebook API
     
@@ -131,20 +128,15 @@ async def social_login(
         "profile_picture": "https://ui-avatars.com/api/?name=John+Doe"
     }
     
-    # Check if user exists
-    user_doc = await db.users.find_one({
-        "email": social_user_data["email"],
-        "role": user_type
-    })
+    # Existing user: stamp the login
+    user_doc = await record_login(
+        db,
+        {"email": social_user_data["email"], "role": user_type},
+        ip_address=request.client.host,
+        device_info=request.headers.get("user-agent", "Unknown")
+    )
     
-    if user_doc:
-        user = User(**user_doc)
-        user.last_login = datetime.utcnow()
-        await db.users.update_one(
-            {"email": social_user_data["email"], "role": user_type},
-            {"$set": {"last_login": user.last_login}}
-        )
-    else:
+    if not user_doc:
         # Create new user
         user = User(
             name=social_user_data["name"],
@@ -155,7 +147,9 @@ async def social_login(
             profile_picture=social_user_data["profile_picture"],
             last_login=datetime.utcnow()
         )
-        await db.users.insert_one(user.dict())
+        user_doc = user.dict()
+        await db.users.insert_one(dict(user_doc))
+        await stats_rollup.user_registered(db, user.role)
         
         # Log activity
         activity = ActivityLog(
@@ -164,20 +158,19 @@ async def social_login(
             description=f"New {user_type.value} registered via {provider.value}",
             ip_address=request.client.host
         )
-        await db.activity_logs.insert_one(activity.dict())
+        activity_writer.log(activity)
     
     return {
         "success": True,
-        "user": user.dict(),
+        "user": user_doc,
+        "access_token": auth_tokens.issue(user_doc["id"], user_doc["role"]),
         "message": "Login successful"
     }
 
 @router.post("/logout")
-async def logout(user_id: str, request: Request):
+async def logout(user_id: str, request: Request, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Log user logout activity"""
     
-    db = get_db()
-    
     # Log activity
     activity = ActivityLog(
         user_id=user_id,
@@ -185,6 +178,6 @@ async def logout(user_id: str, request: Request):
         description="User logged out",
         ip_address=request.client.host
     )
-    await db.activity_logs.insert_one(activity.dict())
+    activity_writer.log(activity)
     
     return {"success": True, "message": "Logged out successfully"}
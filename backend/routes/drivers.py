@@ -1,25 +1,26 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, WebSocket
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from datetime import datetime
+from typing import List
 from models import (
-    Driver, DriverCreate, KYCDocument, KYCStatus,
+    Driver, DriverCreate, KYCDocument, KYCStatus, LocationPing,
     ActivityLog, ActivityType
 )
-import os
+from services.geo_service import nearby_drivers_pipeline
+from services.driver_index import driver_index, INDEX_PROJECTION
+from services.location_buffer import location_buffer
+from services.driver_connections import connection_manager
+from services.stats_rollup import stats_rollup
+from services.activity_writer import activity_writer
+from database import get_db
 
 router = APIRouter()
 
-def get_db():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
-
 @router.post("/register")
-async def register_driver(driver_data: DriverCreate):
+async def register_driver(driver_data: DriverCreate, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Register new driver with KYC documents"""
     
-    db = get_db()
-    
     # Check if driver already exists
     existing = await db.drivers.find_one({"user_id": driver_data.user_id})
     if existing:
@@ -35,7 +36,7 @@ async def register_driver(driver_data: DriverCreate):
         description="Driver KYC documents submitted for verification",
         metadata={"driver_id": driver.id}
     )
-    await db.activity_logs.insert_one(activity.dict())
+    activity_writer.log(activity)
     
     return {
         "success": True,
@@ -44,10 +45,9 @@ async def register_driver(driver_data: DriverCreate):
     }
 
 @router.get("/{driver_id}")
-async def get_driver(driver_id: str):
+async def get_driver(driver_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get driver details"""
     
-    db = get_db()
     driver = await db.drivers.find_one({"id": driver_id})
     
     if not driver:
@@ -56,10 +56,9 @@ async def get_driver(driver_id: str):
     return {"success": True, "driver": driver}
 
 @router.get("/user/{user_id}")
-async def get_driver_by_user(user_id: str):
+async def get_driver_by_user(user_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get driver by user ID"""
     
-    db = get_db()
     driver = await db.drivers.find_one({"user_id": user_id})
     
     if not driver:
@@ -68,11 +67,15 @@ async def get_driver_by_user(user_id: str):
     return {"success": True, "driver": driver}
 
 @router.post("/{driver_id}/verify-kyc")
-async def verify_kyc(driver_id: str, admin_id: str, approved: bool, rejection_reason: str = None):
+async def verify_kyc(
+    driver_id: str,
+    admin_id: str,
+    approved: bool,
+    rejection_reason: str = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     """Admin verifies or rejects driver KYC"""
     
-    db = get_db()
-    
     driver_doc = await db.drivers.find_one({"id": driver_id})
     if not driver_doc:
         raise HTTPException(status_code=404, detail="Driver not found")
@@ -89,13 +92,18 @@ async def verify_kyc(driver_id: str, admin_id: str, approved: bool, rejection_re
     
     driver.is_verified = approved
     
-    await db.drivers.update_one(
+    updated = await db.drivers.find_one_and_update(
         {"id": driver_id},
         {"$set": {
             "kyc_documents": driver.kyc_documents.dict(),
-            "is_verified": driver.is_verified
-        }}
+            "is_verified": driver.is_verified,
+            "status_updated_at": datetime.utcnow()
+        }},
+        projection=INDEX_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
+    if updated:
+        driver_index.sync(updated)
     
     # Log activity
     activity = ActivityLog(
@@ -108,7 +116,7 @@ async def verify_kyc(driver_id: str, admin_id: str, approved: bool, rejection_re
             "rejection_reason": rejection_reason
         }
     )
-    await db.activity_logs.insert_one(activity.dict())
+    activity_writer.log(activity)
     
     # Send notification to driver (via n8n)
     # ... implement notification
@@ -120,15 +128,26 @@ async def verify_kyc(driver_id: str, admin_id: str, approved: bool, rejection_re
     }
 
 @router.post("/{driver_id}/toggle-online")
-async def toggle_online_status(driver_id: str, is_online: bool):
+async def toggle_online_status(
+    driver_id: str,
+    is_online: bool,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     """Toggle driver online/offline status"""
     
-    db = get_db()
-    
-    await db.drivers.update_one(
+    before = await db.drivers.find_one_and_update(
         {"id": driver_id},
-        {"$set": {"is_online": is_online}}
+        {"$set": {"is_online": is_online, "status_updated_at": datetime.utcnow()}},
+        projection=INDEX_PROJECTION,
+        return_document=ReturnDocument.BEFORE
     )
+    if not before:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    
+    driver_index.sync({**before, "is_online": is_online})
+    # Only an actual change moves the online-drivers counter
+    if bool(before.get("is_online")) != is_online:
+        await stats_rollup.driver_online_changed(db, is_online)
     
     return {
         "success": True,
@@ -136,53 +155,75 @@ async def toggle_online_status(driver_id: str, is_online: bool):
     }
 
 @router.post("/{driver_id}/update-location")
-async def update_location(driver_id: str, latitude: float, longitude: float):
+async def update_location(
+    driver_id: str,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180)
+):
     """Update driver's current location"""
     
-    db = get_db()
-    
-    await db.drivers.update_one(
-        {"id": driver_id},
-        {"$set": {
-            "current_location": {
-                "latitude": latitude,
-                "longitude": longitude
-            }
-        }}
-    )
+    # The in-memory index serves searches; MongoDB is written by the coalescing buffer
+    if location_buffer.add(driver_id, latitude, longitude):
+        driver_index.update_position(driver_id, latitude, longitude)
     
     return {"success": True, "message": "Location updated"}
 
-@router.get("/nearby/search")
-async def find_nearby_drivers(
-    latitude: float,
-    longitude: float,
-    vehicle_type: str = None,
-    radius_km: float = 5.0
-):
-    """Find nearby available drivers"""
+@router.post("/locations/bulk")
+async def update_locations_bulk(pings: List[LocationPing]):
+    """Ingest many driver location pings at once"""
     
-    db = get_db()
+    # Oldest first so the latest ping per driver wins in the index and the buffer
+    accepted = 0
+    for ping in sorted(pings, key=lambda p: p.recorded_at or datetime.min):
+        if location_buffer.add(ping.driver_id, ping.latitude, ping.longitude, ping.recorded_at):
+            driver_index.update_position(ping.driver_id, ping.latitude, ping.longitude)
+            accepted += 1
     
-    # Simple proximity search (in production, use geospatial queries)
-    query = {
-        "is_online": True,
-        "is_verified": True
+    return {
+        "success": True,
+        "received": len(pings),
+        "accepted": accepted
     }
+
+@router.websocket("/ws")
+async def driver_stream(websocket: WebSocket, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Persistent driver connection: location frames up, ride offers down"""
     
-    if vehicle_type:
-        query["vehicle_type"] = vehicle_type
-    
-    drivers = await db.drivers.find(query).to_list(50)
-    
-    # Calculate distance (simplified)
-    nearby_drivers = []
-    for driver in drivers:
-        if driver.get("current_location"):
-            # In production, use proper haversine distance calculation
-            nearby_drivers.append(driver)
+    await connection_manager.serve(websocket, db)
+
+@router.get("/nearby/search")
+async def find_nearby_drivers(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    vehicle_type: str = None,
+    radius_km: float = Query(5.0, gt=0, le=50),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Find nearby available drivers, nearest first, within radius_km"""
+    
+    if driver_index.ready:
+        nearby = driver_index.within_radius(
+            latitude, longitude, radius_km, vehicle_type=vehicle_type, limit=limit
+        )
+        drivers = []
+        for nearby_id, distance_km in nearby:
+            entry = driver_index.describe(nearby_id)
+            entry["distance_km"] = distance_km
+            drivers.append(entry)
+        return {"success": True, "drivers": drivers}
+    
+    # Index not built yet (e.g. during startup): fall back to $geoNear
+    pipeline = nearby_drivers_pipeline(
+        latitude=latitude,
+        longitude=longitude,
+        radius_km=radius_km,
+        vehicle_type=vehicle_type,
+        limit=limit
+    )
+    drivers = await db.drivers.aggregate(pipeline).to_list(limit)
     
     return {
         "success": True,
-        "drivers": nearby_drivers[:10]  # Return top 10
+        "drivers": drivers
     }
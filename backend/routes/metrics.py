@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from database import pool_stats, pool_options, get_db
+from indexes import index_drift, check_query_plans
+from services.location_buffer import location_buffer
+from services.driver_connections import connection_manager
+from services.dispatch_service import dispatch_engine
+from services.pricing_cache import pricing_cache
+from services.stats_rollup import stats_rollup
+from services.revenue_rollup import revenue_rollup
+from services.otp_service import otp_service
+from services.activity_writer import activity_writer
+from services.activity_archive import activity_archive
+from services.n8n_service import n8n_service
+from services.outbox import outbox
+from services.offer_fanout import offer_fanout
+from services.booking_parser import booking_parser
+from services.geocoding import geocoder
+from services.eta_estimator import eta_estimator
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Live MongoDB connection pool statistics"""
+    
+    return {
+        "success": True,
+        "options": pool_options(),
+        "pool": pool_stats.snapshot()
+    }
+
+@router.get("/locations")
+async def get_location_ingest_stats():
+    """Driver location ping and write counters"""
+    
+    return {"success": True, "buffer": location_buffer.snapshot()}
+
+@router.get("/driver-connections")
+async def get_driver_connection_stats():
+    """Driver WebSocket connection counters"""
+    
+    return {"success": True, "connections": connection_manager.snapshot()}
+
+@router.get("/dispatch")
+async def get_dispatch_stats():
+    """Dispatch engine counters, round latency and match rate"""
+    
+    return {"success": True, "dispatch": dispatch_engine.snapshot()}
+
+@router.get("/pricing-cache")
+async def get_pricing_cache_stats():
+    """Loaded pricing table version and reload counters"""
+    
+    return {"success": True, "pricing": pricing_cache.snapshot()}
+
+@router.get("/stats-rollup")
+async def get_stats_rollup_stats():
+    """Dashboard counter increments and reconciliation drift"""
+    
+    return {"success": True, "rollup": stats_rollup.snapshot()}
+
+@router.get("/revenue-rollup")
+async def get_revenue_rollup_stats():
+    """Revenue rollup updates and backfill progress"""
+    
+    return {"success": True, "rollup": revenue_rollup.snapshot()}
+
+@router.get("/otp")
+async def get_otp_stats():
+    """OTP sends, verifications and rate-limit rejections"""
+    
+    return {"success": True, "otp": otp_service.snapshot()}
+
+@router.get("/activity-log")
+async def get_activity_log_stats():
+    """Activity log write-behind queue depth, writes and drops"""
+    
+    return {"success": True, "writer": activity_writer.snapshot()}
+
+@router.get("/activity-archive")
+async def get_activity_archive_stats():
+    """Activity log archive runs, exported and deleted entries, archive reads"""
+    
+    return {"success": True, "archive": activity_archive.snapshot()}
+
+@router.get("/n8n")
+async def get_n8n_stats():
+    """n8n webhook sends, retries, failures and posts in flight"""
+    
+    return {"success": True, "n8n": n8n_service.snapshot()}
+
+@router.get("/outbox")
+async def get_outbox_stats(db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Notification outbox throughput, retries and queue depth by status"""
+    
+    return {"success": True, "outbox": outbox.snapshot(), "depth": await outbox.depth(db)}
+
+@router.get("/offer-fanout")
+async def get_offer_fanout_stats():
+    """Driver WhatsApp alerts sent, failed, cancelled on accept and send latency"""
+    
+    return {"success": True, "fanout": offer_fanout.snapshot()}
+
+@router.get("/booking-parser")
+async def get_booking_parser_stats():
+    """WhatsApp booking messages parsed, incomplete or rejected, and gazetteer cache hits"""
+    
+    return {"success": True, "parser": booking_parser.snapshot()}
+
+@router.get("/geocode-cache")
+async def get_geocode_cache_stats():
+    """Geocoding lookups served from the LRU, from MongoDB or by the provider"""
+    
+    return {"success": True, "geocode": geocoder.snapshot()}
+
+@router.get("/eta")
+async def get_eta_stats():
+    """Learned circuity and speed profiles per city, and bookings/completions corrected or flagged"""
+    
+    return {"success": True, "eta": eta_estimator.snapshot()}
+
+@router.get("/indexes")
+async def get_index_report(explain: bool = False, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Declared vs live index drift, and optionally the query plan of every route shape"""
+    
+    report = {"success": True, "drift": await index_drift(db)}
+    if explain:
+        plans = await check_query_plans(db)
+        report["plans"] = plans
+        report["collscans"] = [plan["name"] for plan in plans if plan["collscan"]]
+    return report
@@ -1,30 +1,66 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import APIRouter, HTTPException, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
+from typing import Optional
 from models import (
-    Ride, RideCreate, RideStatus, Location, ActivityLog, ActivityType,
-    Transaction, TransactionCreate, TransactionType, Bill
+    Ride, RideCreate, RideStatus, Location, ActivityLog, ActivityType, FareQuoteRequest, EstimateRequest
 )
 from services.bill_service import BillGenerator
-from services.n8n_service import N8NIntegrationService
-import os
+from services.outbox import outbox
+from services.offer_fanout import offer_fanout
+from services.dispatch_service import dispatch_engine
+from services.ride_state import transition_ride, RideTransitionError
+from services.ride_completion import settle_completed_ride
+from services.pricing_cache import pricing_cache
+from services.fare_quote import fare_matrix, MAX_QUOTE_ROUTES
+from services.stats_rollup import stats_rollup
+from services.activity_writer import activity_writer
+from services.geocoding import geocoder
+from services.eta_estimator import eta_estimator
+from database import get_db
+import numpy as np
 
 router = APIRouter()
-n8n_service = N8NIntegrationService()
-
-def get_db():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
 
 @router.post("/create")
-async def create_ride(ride_data: RideCreate, background_tasks: BackgroundTasks):
+async def create_ride(
+    ride_data: RideCreate,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     """Create new ride request"""
     
-    db = get_db()
-    
-    ride = Ride(**ride_data.dict())
+    # Distance and duration are estimated server-side; the client's figures
+    # are kept only when they are close to the estimate
+    distance, duration, corrections = eta_estimator.review_booking(
+        ride_data.pickup_location,
+        ride_data.drop_location,
+        ride_data.trip_type,
+        ride_data.distance,
+        ride_data.estimated_duration
+    )
+    fare = ride_data.estimated_fare
+    vehicle_pricing = pricing_cache.get(ride_data.vehicle_type)
+    if vehicle_pricing:
+        server_fare = round(BillGenerator.calculate_fare(vehicle_pricing, distance, duration, ride_data.trip_type), 2)
+        if fare is None:
+            corrections.append("fare_filled")
+            fare = server_fare
+        elif abs(fare - server_fare) > max(1.0, 0.02 * server_fare):
+            corrections.append("fare_replaced")
+            fare = server_fare
+    elif fare is None:
+        raise HTTPException(status_code=503, detail="Pricing not loaded")
+    
+    ride = Ride(**{
+        **ride_data.dict(),
+        "distance": distance,
+        "estimated_duration": duration,
+        "estimated_fare": fare,
+        "estimate_corrections": corrections
+    })
     await db.rides.insert_one(ride.dict())
+    await stats_rollup.ride_created(db, ride)
+    dispatch_engine.submit(ride.dict())
     
     # Log activity
     activity = ActivityLog(
@@ -33,23 +69,24 @@ async def create_ride(ride_data: RideCreate, background_tasks: BackgroundTasks):
         description=f"Ride {ride.id} booked",
         metadata={"ride_id": ride.id, "fare": ride.estimated_fare}
     )
-    await db.activity_logs.insert_one(activity.dict())
+    activity_writer.log(activity)
     
     # Get customer details for notification
-    customer = await db.users.find_one({"id": ride.customer_id})
+    customer = await db.users.find_one({"id": ride.customer_id}, {"_id": 0, "phone": 1, "name": 1})
     
-    # Send notification via n8n (background task)
+    # Queue the WhatsApp confirmation (delivered by the outbox workers)
     if customer:
-        background_tasks.add_task(
-            n8n_service.send_booking_notification,
-            phone=customer["phone"],
-            customer_name=customer["name"],
-            ride_id=ride.id,
-            pickup=ride.pickup_location.address,
-            drop=ride.drop_location.address,
-            fare=ride.estimated_fare,
-            otp=ride.otp
-        )
+        await outbox.enqueue(db, "booking_confirmation", f"booking_confirmation:{ride.id}", {
+            "phone": customer["phone"],
+            "customer_name": customer["name"],
+            "ride_id": ride.id,
+            "pickup": ride.pickup_location.address,
+            "drop": ride.drop_location.address,
+            "fare": ride.estimated_fare,
+            "otp": ride.otp
+        })
+        # Alert the nearest drivers on WhatsApp as well (sends run in the background)
+        await offer_fanout.alert(db, ride.dict(), customer["name"])
     
     return {
         "success": True,
@@ -57,55 +94,135 @@ async def create_ride(ride_data: RideCreate, background_tasks: BackgroundTasks):
         "message": "Ride created successfully"
     }
 
-@router.post("/{ride_id}/accept")
-async def accept_ride(ride_id: str, driver_id: str, background_tasks: BackgroundTasks):
-    """Driver accepts ride"""
+@router.post("/quote")
+async def quote_fares(request: FareQuoteRequest):
+    """Fares for every vehicle type and trip type, for one or many routes"""
+    
+    if len(request.routes) > MAX_QUOTE_ROUTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_ROUTES} routes per request")
+    if pricing_cache.table is None:
+        raise HTTPException(status_code=503, detail="Pricing not loaded")
+    
+    matrix = fare_matrix(pricing_cache.table)
+    distance = np.fromiter((r.distance for r in request.routes), dtype=np.float64, count=len(request.routes))
+    duration = np.fromiter((r.duration for r in request.routes), dtype=np.float64, count=len(request.routes))
+    try:
+        vehicle_types, fares = matrix.quote(distance, duration, request.vehicle_types)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Pricing not found for: {e.args[0]}")
     
-    db = get_db()
+    return {
+        "success": True,
+        "pricing_version": matrix.version,
+        "vehicle_types": vehicle_types,
+        "trip_types": matrix.trip_types,
+        # fares[route][vehicle][trip type]
+        "fares": fares.tolist()
+    }
+
+@router.get("/geocode")
+async def geocode_address(
+    address: str = Query(..., min_length=2, max_length=300),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Coordinates for a pickup or drop address (cached)"""
     
-    ride = await db.rides.find_one({"id": ride_id})
-    if not ride:
-        raise HTTPException(status_code=404, detail="Ride not found")
+    location = await geocoder.geocode(db, address)
+    if location is None:
+        raise HTTPException(status_code=404, detail="Address not found")
     
-    # Update ride
-    await db.rides.update_one(
-        {"id": ride_id},
-        {"$set": {
-            "driver_id": driver_id,
-            "status": RideStatus.ACCEPTED,
-            "started_at": datetime.utcnow()
-        }}
+    return {"success": True, "location": location}
+
+@router.get("/reverse-geocode")
+async def reverse_geocode(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Address for a map pin (cached at rounded coordinates)"""
+    
+    location = await geocoder.reverse(db, latitude, longitude)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No address found for this location")
+    
+    return {"success": True, "location": location}
+
+@router.post("/estimate")
+async def estimate_routes(request: EstimateRequest):
+    """Road distance and duration for one or many pickup/drop pairs"""
+    
+    if len(request.pairs) > MAX_QUOTE_ROUTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_ROUTES} pairs per request")
+    
+    coordinates = np.array([
+        (p.pickup_latitude, p.pickup_longitude, p.drop_latitude, p.drop_longitude) for p in request.pairs
+    ], dtype=np.float64)
+    distance, duration = eta_estimator.estimate(
+        *coordinates.T, hour=eta_estimator.local_hour(request.departure_at)
     )
     
-    # Get driver and customer details
-    driver = await db.users.find_one({"id": driver_id})
-    customer = await db.users.find_one({"id": ride["customer_id"]})
+    return {
+        "success": True,
+        "distance": np.round(distance, 1).tolist(),
+        "duration": np.maximum(1, np.ceil(duration)).astype(int).tolist()
+    }
+
+@router.post("/{ride_id}/accept")
+async def accept_ride(
+    ride_id: str,
+    driver_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Driver accepts ride. Only the first of concurrent accepts wins."""
+    
+    try:
+        ride = await transition_ride(db, ride_id, "accept", {
+            "driver_id": driver_id,
+            "accepted_at": datetime.utcnow()
+        })
+    except RideTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    # Send notification to customer
-    if customer and driver:
-        # In real app, send push notification
-        pass
+    dispatch_engine.ride_accepted(ride_id, driver_id)
+    offer_fanout.ride_closed(ride_id)
     
     return {
         "success": True,
+        "ride": ride,
         "message": "Ride accepted successfully"
     }
 
 @router.post("/{ride_id}/start")
-async def start_ride(ride_id: str):
+async def start_ride(ride_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Start the ride"""
     
-    db = get_db()
+    try:
+        ride = await transition_ride(db, ride_id, "start", {"started_at": datetime.utcnow()})
+    except RideTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    await db.rides.update_one(
-        {"id": ride_id},
-        {"$set": {
-            "status": RideStatus.ONGOING,
-            "started_at": datetime.utcnow()
-        }}
-    )
+    return {"success": True, "ride": ride, "message": "Ride started"}
+
+@router.post("/{ride_id}/cancel")
+async def cancel_ride(
+    ride_id: str,
+    reason: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Cancel a ride that has not started yet"""
     
-    return {"success": True, "message": "Ride started"}
+    try:
+        ride = await transition_ride(db, ride_id, "cancel", {
+            "cancelled_at": datetime.utcnow(),
+            "cancellation_reason": reason
+        })
+    except RideTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    dispatch_engine.ride_closed(ride_id)
+    offer_fanout.ride_closed(ride_id)
+    
+    return {"success": True, "ride": ride, "message": "Ride cancelled"}
 
 @router.post("/{ride_id}/complete")
 async def complete_ride(
@@ -113,24 +230,28 @@ async def complete_ride(
     actual_distance: float,
     actual_duration: int,
     payment_method: str,
-    background_tasks: BackgroundTasks
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Complete ride and generate bill"""
     
-    db = get_db()
-    
-    ride_doc = await db.rides.find_one({"id": ride_id})
+    ride_doc = await db.rides.find_one({"id": ride_id}, {"_id": 0})
     if not ride_doc:
         raise HTTPException(status_code=404, detail="Ride not found")
+    if ride_doc["status"] != RideStatus.ONGOING:
+        raise HTTPException(status_code=409, detail=f"Cannot complete a ride that is {ride_doc['status']}")
     
     ride = Ride(**ride_doc)
     
-    # Get vehicle pricing
-    pricing_config = await db.pricing_config.find_one({"id": "pricing_config"})
-    vehicle_pricing = next(
-        (v for v in pricing_config["vehicles"] if v["vehicle_type"] == ride.vehicle_type),
-        None
-    )
+    # Implausible meter readings are clamped and flagged, never left ONGOING
+    try:
+        billed_distance, billed_duration, completion_flags = eta_estimator.review_completion(
+            ride, actual_distance, actual_duration
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Vehicle pricing comes from the in-process table, not the database
+    vehicle_pricing = pricing_cache.get(ride.vehicle_type)
     
     if not vehicle_pricing:
         raise HTTPException(status_code=400, detail="Pricing not found")
@@ -139,119 +260,54 @@ async def complete_ride(
     bill = BillGenerator.generate_bill(
         ride=ride,
         vehicle_pricing=vehicle_pricing,
-        distance=actual_distance,
-        duration=actual_duration
+        distance=billed_distance,
+        duration=billed_duration
     )
     
-    # Save bill
-    await db.bills.insert_one(bill.dict())
-    
-    # Update ride
-    await db.rides.update_one(
-        {"id": ride_id},
-        {"$set": {
-            "status": RideStatus.COMPLETED,
-            "completed_at": datetime.utcnow(),
-            "actual_fare": bill.total,
-            "payment_method": payment_method
-        }}
-    )
-    
-    # Process payment
-    customer = await db.users.find_one({"id": ride.customer_id})
-    if payment_method == "wallet" and customer:
-        # Deduct from wallet
-        new_balance = customer["wallet_balance"] - bill.total
-        await db.users.update_one(
-            {"id": ride.customer_id},
-            {"$set": {"wallet_balance": new_balance}}
-        )
-        
-        # Create transaction
-        transaction = Transaction(
-            user_id=ride.customer_id,
-            amount=bill.total,
-            transaction_type=TransactionType.RIDE_PAYMENT,
-            description=f"Ride payment for {ride_id}",
-            ride_id=ride_id,
-            balance_before=customer["wallet_balance"],
-            balance_after=new_balance
-        )
-        await db.transactions.insert_one(transaction.dict())
-    
-    # Credit driver earnings
-    if ride.driver_id:
-        driver = await db.users.find_one({"id": ride.driver_id})
-        if driver:
-            commission = bill.total * 0.20  # 20% platform fee
-            driver_earning = bill.total - commission
-            
-            new_driver_balance = driver.get("wallet_balance", 0) + driver_earning
-            await db.users.update_one(
-                {"id": ride.driver_id},
-                {"$set": {"wallet_balance": new_driver_balance}}
-            )
-            
-            # Create transaction
-            transaction = Transaction(
-                user_id=ride.driver_id,
-                amount=driver_earning,
-                transaction_type=TransactionType.DRIVER_EARNING,
-                description=f"Earning from ride {ride_id}",
-                ride_id=ride_id,
-                balance_before=driver.get("wallet_balance", 0),
-                balance_after=new_driver_balance
-            )
-            await db.transactions.insert_one(transaction.dict())
-    
-    # Log activity
-    activity = ActivityLog(
-        user_id=ride.customer_id,
-        activity_type=ActivityType.RIDE_COMPLETED,
-        description=f"Ride {ride_id} completed",
-        metadata={"ride_id": ride_id, "fare": bill.total}
-    )
-    await db.activity_logs.insert_one(activity.dict())
-    
-    # Send bill via WhatsApp (background)
-    if customer:
-        bill_text = BillGenerator.format_bill_text(bill)
-        background_tasks.add_task(
-            n8n_service.send_bill,
-            phone=customer["phone"],
-            bill_text=bill_text,
-            bill_id=bill.id
-        )
+    # Status change, wallets, bill, transactions and activity log
+    try:
+        settled = await settle_completed_ride(db, ride, bill, payment_method, details={
+            "actual_distance": actual_distance,
+            "actual_duration": actual_duration,
+            "billed_distance": billed_distance,
+            "billed_duration": billed_duration,
+            "completion_flags": completion_flags
+        })
+    except RideTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    dispatch_engine.ride_closed(ride_id)
+    offer_fanout.ride_closed(ride_id)
+    
+    # The WhatsApp bill was queued in the outbox by settle_completed_ride; a
+    # resumed completion charged the bill of its first attempt
     
     return {
         "success": True,
-        "bill": bill.dict(),
+        "bill": settled["bill"].dict(),
+        "completion_flags": settled["ride"].get("completion_flags", completion_flags),
         "message": "Ride completed successfully"
     }
 
 @router.get("/customer/{customer_id}")
-async def get_customer_rides(customer_id: str):
+async def get_customer_rides(customer_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get all rides for a customer"""
     
-    db = get_db()
     rides = await db.rides.find({"customer_id": customer_id}).sort("created_at", -1).to_list(100)
     
     return {"success": True, "rides": rides}
 
 @router.get("/driver/{driver_id}")
-async def get_driver_rides(driver_id: str):
+async def get_driver_rides(driver_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get all rides for a driver"""
     
-    db = get_db()
     rides = await db.rides.find({"driver_id": driver_id}).sort("created_at", -1).to_list(100)
     
     return {"success": True, "rides": rides}
 
 @router.get("/{ride_id}")
-async def get_ride(ride_id: str):
+async def get_ride(ride_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get ride details"""
     
-    db = get_db()
     ride = await db.rides.find_one({"id": ride_id})
     
     if not ride:
@@ -260,10 +316,9 @@ async def get_ride(ride_id: str):
     return {"success": True, "ride": ride}
 
 @router.get("/{ride_id}/bill")
-async def get_ride_bill(ride_id: str):
+async def get_ride_bill(ride_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get bill for a ride"""
     
-    db = get_db()
     bill = await db.bills.find_one({"ride_id": ride_id})
     
     if not bill:
@@ -1,17 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import APIRouter, HTTPException, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import os
+from database import get_db
 
 router = APIRouter()
 
-def get_db():
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    return client[os.environ['DB_NAME']]
-
 class SocialMediaLinks(BaseModel):
     facebook: Optional[str] = "https://facebook.com/gaddi24x7"
     twitter: Optional[str] = "https://twitter.com/gaddi24x7"
@@ -33,10 +28,9 @@ class SiteSettings(BaseModel):
     updated_by: Optional[str] = None
 
 @router.get("/settings")
-async def get_site_settings():
+async def get_site_settings(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get current site settings"""
     
-    db = get_db()
     settings = await db.site_settings.find_one({"id": "site_settings"})
     
     if not settings:
@@ -47,11 +41,13 @@ async def get_site_settings():
     return {"success": True, "settings": settings}
 
 @router.post("/settings")
-async def update_site_settings(settings_data: dict, admin_id: str):
+async def update_site_settings(
+    settings_data: dict,
+    admin_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
     """Update site settings"""
     
-    db = get_db()
-    
     # Validate and structure the data
     try:
         settings = SiteSettings(**settings_data)
@@ -76,10 +72,9 @@ async def update_site_settings(settings_data: dict, admin_id: str):
     }
 
 @router.get("/settings/contact")
-async def get_contact_info():
+async def get_contact_info(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get contact information (public endpoint)"""
     
-    db = get_db()
     settings = await db.site_settings.find_one({"id": "site_settings"})
     
     if not settings:
@@ -89,10 +84,9 @@ async def get_contact_info():
     return {"success": True, "contact_info": settings.get("contact_info", ContactInfo().dict())}
 
 @router.get("/settings/social")
-async def get_social_media():
+async def get_social_media(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Get social media links (public endpoint)"""
     
-    db = get_db()
     settings = await db.site_settings.find_one({"id": "site_settings"})
     
     if not settings:
@@ -0,0 +1,57 @@
+"""Archive activity logs older than ACTIVITY_LOG_HOT_DAYS and delete them from MongoDB.
+
+Exports each closed UTC day, oldest first, to a gzipped JSONL part file in
+the configured archive store (ACTIVITY_ARCHIVE_STORE: a local directory or
+an S3-compatible bucket), then deletes that day from activity_logs in
+batches. Safe to interrupt and rerun. The server runs the same job every
+ACTIVITY_ARCHIVE_INTERVAL_SECONDS; only one process archives at a time.
+
+--reindex rebuilds activity_archive_index (which archived days hold each
+user) from the archive store, e.g. for parts written before it existed.
+
+    cd backend && python scripts/archive_activity_logs.py [--hot-days 90] [--reindex]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from services.activity_archive import activity_archive  # noqa: E402
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    if args.hot_days is not None:
+        activity_archive.hot_days = args.hot_days
+    try:
+        started = time.perf_counter()
+        if args.reindex:
+            parts = await activity_archive.reindex(db)
+            print(f"Indexed {parts} archive parts in {time.perf_counter() - started:.1f}s")
+            return
+        days = await activity_archive.archive(db)
+        if activity_archive.stats["runs_skipped"]:
+            print("Another process holds the activity_archive lease; nothing archived")
+            return
+        stats = activity_archive.stats
+        print(f"Archived {days} days ({stats['exported']} exported, {stats['deleted']} deleted) "
+              f"to {activity_archive.store_name} in {time.perf_counter() - started:.1f}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hot-days", type=int, help="days to keep in MongoDB (default: ACTIVITY_LOG_HOT_DAYS)")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the per-user archive index and exit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,45 @@
+"""Backfill the revenue rollups (revenue_daily / revenue_hourly) from completed rides.
+
+Rebuilds every closed local day (REVENUE_TIMEZONE, default Asia/Kolkata)
+from the saved checkpoint up to yesterday, a batch of days at a time, and
+checkpoints after each batch; rerun it to resume after an interruption.
+Rebuilt days are overwritten, so reruns never double count. The server
+runs the same job every REVENUE_BACKFILL_INTERVAL_SECONDS.
+
+    cd backend && python scripts/backfill_revenue.py [--since 2023-01-01] [--batch-days 7]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from services.revenue_rollup import revenue_rollup  # noqa: E402
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    revenue_rollup.batch_days = args.batch_days
+    try:
+        started = time.perf_counter()
+        days = await revenue_rollup.backfill(db, since=date.fromisoformat(args.since) if args.since else None)
+        print(f"Rebuilt {days} days in {time.perf_counter() - started:.1f}s ({revenue_rollup.tz_name})")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", help="local date to rebuild from (default: the checkpoint)")
+    parser.add_argument("--batch-days", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
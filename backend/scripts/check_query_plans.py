@@ -0,0 +1,52 @@
+"""Query-plan regression check: explain() every declared route query shape.
+
+Applies the index registry (indexes.INDEXES) to the target database,
+reports index drift, then runs explain() on each indexes.QUERY_SHAPES
+entry and fails if any winning plan is a COLLSCAN. Meant for CI against a
+local mongod (e.g. `docker run -p 27017:27017 mongo:7`); the scratch
+database is dropped afterwards unless --keep is given.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python scripts/check_query_plans.py [--db gaddi24x7_plans]
+
+Exit status: 0 clean, 1 COLLSCAN regression or index drift.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from indexes import ensure_indexes, check_query_plans  # noqa: E402
+
+
+async def main(args) -> int:
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        drift = await ensure_indexes(db)
+        for collection, problems in drift.items():
+            print(f"DRIFT     {collection}: {problems}")
+
+        results = await check_query_plans(db)
+        for result in results:
+            status = "COLLSCAN" if result["collscan"] else "ok"
+            print(f"{status:9s} {result['name']:36s} {result['collection']:15s} {' > '.join(result['stages'])}")
+
+        regressions = [r["name"] for r in results if r["collscan"]]
+        print(f"{len(results)} query shapes, {len(regressions)} collection scans, {len(drift)} collections drifted")
+        return 1 if regressions or drift else 0
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="gaddi24x7_plans")
+    parser.add_argument("--keep", action="store_true", help="keep the database instead of dropping it")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,43 @@
+"""Seed the geocode cache from the addresses of completed rides.
+
+Groups completed rides' pickup and drop locations by address and writes
+the most used addresses (with their mean coordinates) to geocode_cache,
+both as forward entries under the normalised address and as reverse
+entries under the rounded coordinates. Entries already cached are kept.
+Run once on a new deployment, or after clearing the collection, so
+repeat addresses never reach the geocoding provider.
+
+    cd backend && python scripts/warm_geocode_cache.py [--limit 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+from services.geocoding import geocoder  # noqa: E402
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        started = time.perf_counter()
+        written = await geocoder.warm_from_rides(db, limit=args.limit)
+        print(f"Wrote {written} geocode cache entries in {time.perf_counter() - started:.1f}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=20000, help="most used addresses to seed")
+    asyncio.run(main(parser.parse_args()))
@@ -1,21 +1,34 @@
 from fastapi import FastAPI, APIRouter
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 
-# Import route modules
-from routes import auth, rides, drivers, admin, settings
-
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Import route modules (after .env is loaded, services read it at import time)
+from routes import auth, rides, drivers, admin, settings, metrics
+from services.geo_service import migrate_legacy_locations
+from services.driver_index import driver_index
+from services.location_buffer import location_buffer
+from services.driver_connections import connection_manager
+from services.dispatch_service import dispatch_engine
+from services.pricing_cache import pricing_cache
+from services.stats_rollup import stats_rollup
+from services.revenue_rollup import revenue_rollup
+from services.otp_service import otp_service
+from services.auth_tokens import auth_tokens
+from services.activity_writer import activity_writer
+from services.activity_archive import activity_archive
+from services.n8n_service import n8n_service
+from services.outbox import outbox
+from services.offer_fanout import offer_fanout
+from services.geocoding import geocoder
+from services.eta_estimator import eta_estimator
+from indexes import ensure_indexes
+import database
 
 # Create the main app without a prefix
 app = FastAPI(title="Gaddi24x7 API", version="1.0.0")
@@ -38,6 +51,7 @@ api_router.include_router(rides.router, prefix="/rides", tags=["Rides"])
 api_router.include_router(drivers.router, prefix="/drivers", tags=["Drivers"])
 api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
 api_router.include_router(settings.router, prefix="/settings", tags=["Settings"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -57,6 +71,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db_client():
+    # Refuse to start without the secret every worker signs login tokens with
+    auth_tokens.start()
+    # One shared client (and connection pool) per worker process
+    database.connect()
+    db = database.get_db()
+    # Fails fast without OTP_SECRET when codes are shared through MongoDB
+    otp_service.start(db)
+    
+    # Legacy {latitude, longitude} locations would break the 2dsphere index build
+    await migrate_legacy_locations(db)
+    await ensure_indexes(db)
+    await driver_index.rebuild(db)
+    driver_index.start(db, local=location_buffer.__contains__)
+    await pricing_cache.start(db)
+    await stats_rollup.start(db)
+    await geocoder.start(db)
+    revenue_rollup.start(db)
+    eta_estimator.start(db)
+    activity_writer.start(db)
+    activity_archive.start(db)
+    outbox.start(db)
+    location_buffer.start(db)
+    connection_manager.start(db)
+    # Recovery and dispatch run only in the worker holding the dispatch lease
+    dispatch_engine.start(db)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Persist buffered driver positions and activity logs before the client goes away
+    await dispatch_engine.stop()
+    await driver_index.stop()
+    await connection_manager.stop()
+    await location_buffer.stop()
+    await activity_writer.stop()
+    await pricing_cache.stop()
+    await stats_rollup.stop()
+    await revenue_rollup.stop()
+    await eta_estimator.stop()
+    await activity_archive.stop()
+    await outbox.stop()
+    await offer_fanout.stop()
+    await geocoder.stop()
+    await n8n_service.close()
+    database.close()
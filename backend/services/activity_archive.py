@@ -0,0 +1,371 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import json_util
+from pymongo import UpdateOne
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import asyncio
+import gzip
+import os
+import shutil
+import tempfile
+import uuid
+import logging
+
+from services.leases import Lease
+
+logger = logging.getLogger(__name__)
+
+# activity_logs keeps this many days; older days are exported and deleted
+HOT_DAYS = int(os.environ.get("ACTIVITY_LOG_HOT_DAYS", 90))
+# TTL backstop on activity_logs.exported_at, for exported rows whose delete was interrupted
+EXPORTED_TTL_DAYS = int(os.environ.get("ACTIVITY_LOG_EXPORTED_TTL_DAYS", 1))
+
+
+# Stores. Keys are "<YYYY-MM-DD>/<part>.jsonl.gz"; one or more parts per UTC day.
+
+class LocalArchiveStore:
+    """Archive files under a local directory: <root>/dt=YYYY-MM-DD/part-*.jsonl.gz"""
+
+    def __init__(self, path: str = "archive/activity_logs", **_):
+        self.root = Path(path)
+
+    def put(self, day: str, part: str, source: str):
+        directory = self.root / f"dt={day}"
+        directory.mkdir(parents=True, exist_ok=True)
+        partial = directory / f".{part}.tmp"
+        shutil.move(source, partial)
+        os.replace(partial, directory / part)
+
+    def days(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name[3:] for p in self.root.iterdir() if p.is_dir() and p.name.startswith("dt="))
+
+    def parts(self, day: str) -> List[str]:
+        directory = self.root / f"dt={day}"
+        return sorted(p.name for p in directory.glob("*.jsonl.gz")) if directory.exists() else []
+
+    def open(self, day: str, part: str) -> BinaryIO:
+        return open(self.root / f"dt={day}" / part, "rb")
+
+
+class S3ArchiveStore:
+    """Archive objects in an S3-compatible bucket: <prefix>dt=YYYY-MM-DD/part-*.jsonl.gz"""
+
+    def __init__(self, bucket: str = "", prefix: str = "activity_logs/", endpoint_url: Optional[str] = None, **_):
+        import boto3
+
+        if not bucket:
+            raise ValueError("ACTIVITY_ARCHIVE_S3_BUCKET is required for the s3 archive store")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def put(self, day: str, part: str, source: str):
+        self.client.upload_file(source, self.bucket, f"{self.prefix}dt={day}/{part}")
+        os.remove(source)
+
+    def _list(self, prefix: str, delimiter: Optional[str] = None) -> List[Dict]:
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+        pages = self.client.get_paginator("list_objects_v2").paginate(**kwargs)
+        return list(pages)
+
+    def days(self) -> List[str]:
+        found = []
+        for page in self._list(f"{self.prefix}dt=", delimiter="/"):
+            for entry in page.get("CommonPrefixes", []):
+                found.append(entry["Prefix"][len(self.prefix) + 3:].rstrip("/"))
+        return sorted(found)
+
+    def parts(self, day: str) -> List[str]:
+        prefix = f"{self.prefix}dt={day}/"
+        return sorted(
+            entry["Key"][len(prefix):]
+            for page in self._list(prefix)
+            for entry in page.get("Contents", [])
+            if entry["Key"].endswith(".jsonl.gz")
+        )
+
+    def open(self, day: str, part: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=f"{self.prefix}dt={day}/{part}")["Body"]
+
+
+ARCHIVE_STORES = {"local": LocalArchiveStore, "s3": S3ArchiveStore}
+
+
+def _count_users(store, day: str, part: str) -> Counter:
+    """Entries per user in one archive part (runs in a worker thread)"""
+    users: Counter = Counter()
+    with store.open(day, part) as raw, gzip.open(raw, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            users[json_util.loads(line).get("user_id")] += 1
+    return users
+
+
+def _scan_part(store, day: str, part: str, user_id: str, before: Optional[datetime]) -> List[Dict]:
+    """Stream one archive part and return the user's entries (runs in a worker thread)"""
+    needle = json_util.dumps(user_id)
+    found = []
+    with store.open(day, part) as raw, gzip.open(raw, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            # Cheap substring test before decoding the line
+            if needle not in line:
+                continue
+            doc = json_util.loads(line)
+            if doc.get("user_id") == user_id and (before is None or doc["created_at"] < before):
+                found.append(doc)
+    return found
+
+
+class ActivityArchive:
+    """Hot/archive retention tiers for activity_logs.
+
+    activity_logs holds the last `hot_days` days. `archive()` streams every
+    older UTC day, oldest first, into a gzipped JSONL part file in the
+    archive store, then deletes that day from MongoDB in batches, so the hot
+    collection stays at a constant number of days. Rows are stamped with
+    `exported_at` before the delete; a TTL index on that field
+    (EXPORTED_TTL_DAYS) is a backstop for interrupted deletes, so rows that
+    were never archived never expire. Only one process archives at a time:
+    the holder of the "activity_archive" lease.
+
+    Every export also records, per user, which parts of that day hold the
+    user's entries (activity_archive_index). `find()` reads a user's log
+    newest first across both tiers: the hot collection, then only the
+    archived days that index lists for the user, newest first, until
+    `limit` entries are found or `max_scan_days` such days have been read.
+    A day re-exported after an interrupted delete can hold duplicates, so
+    archive entries are de-duplicated on read.
+    """
+
+    def __init__(
+        self,
+        store: str = "local",
+        hot_days: int = 90,
+        interval: float = 3600.0,
+        batch_size: int = 1000,
+        max_scan_days: int = 366,
+        lease_seconds: float = 600.0,
+        **store_options
+    ):
+        if store not in ARCHIVE_STORES:
+            raise ValueError(f"Unknown activity archive store: {store}")
+        self.store_name = store
+        self._store_options = store_options
+        self._store = None
+        self.hot_days = hot_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_scan_days = max_scan_days
+        # Renewed before every exported day, so it must outlast one day's export
+        self.lease = Lease("activity_archive", ttl=lease_seconds)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "runs": 0,
+            "runs_skipped": 0,
+            "archived_days": 0,
+            "exported": 0,
+            "deleted": 0,
+            "archive_reads": 0,
+            "archive_days_scanned": 0
+        }
+
+    @property
+    def store(self):
+        # Created on first use so a missing bucket or boto3 only fails the archive paths
+        if self._store is None:
+            self._store = ARCHIVE_STORES[self.store_name](**self._store_options)
+        return self._store
+
+    def cutoff(self) -> datetime:
+        """Start of the oldest UTC day kept in activity_logs"""
+        today = datetime.utcnow().date()
+        return datetime.combine(today - timedelta(days=self.hot_days), datetime.min.time())
+
+    # Export
+
+    async def export_day(self, db: AsyncIOMotorDatabase, day: date) -> Tuple[int, int]:
+        """Archive one UTC day and delete it from activity_logs. Returns (exported, deleted)."""
+        start = datetime.combine(day, datetime.min.time())
+        window = {"created_at": {"$gte": start, "$lt": start + timedelta(days=1)}}
+
+        handle, path = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(handle)
+        exported = 0
+        users: Counter = Counter()
+        try:
+            with gzip.open(path, "wt", encoding="utf-8") as out:
+                cursor = db.activity_logs.find(window, {"_id": 0}).sort("created_at", 1).batch_size(self.batch_size)
+                async for doc in cursor:
+                    out.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS))
+                    out.write("\n")
+                    users[doc.get("user_id")] += 1
+                    exported += 1
+            if exported:
+                part = f"part-{uuid.uuid4().hex[:12]}.jsonl.gz"
+                await asyncio.to_thread(self.store.put, day.isoformat(), part, path)
+                # Indexed before the delete: entries are never unreachable by find()
+                await self.index_part(db, day.isoformat(), part, users)
+                # Only stamped rows are left to the TTL backstop
+                await db.activity_logs.update_many(window, {"$set": {"exported_at": datetime.utcnow()}})
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Closed days receive no new entries, so everything in the window was exported
+        deleted = 0
+        while exported:
+            batch = await db.activity_logs.find(window, {"_id": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+            result = await db.activity_logs.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            deleted += result.deleted_count
+
+        self.stats["exported"] += exported
+        self.stats["deleted"] += deleted
+        return exported, deleted
+
+    async def index_part(self, db: AsyncIOMotorDatabase, day: str, part: str, users: Counter):
+        """Record which users have entries in an archive part"""
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "day": day},
+                {"$addToSet": {"parts": part}, "$inc": {"entries": count}},
+                upsert=True
+            )
+            for user_id, count in users.items()
+            if user_id is not None
+        ]
+        for start in range(0, len(operations), self.batch_size):
+            await db.activity_archive_index.bulk_write(operations[start:start + self.batch_size], ordered=False)
+
+    async def reindex(self, db: AsyncIOMotorDatabase) -> int:
+        """Rebuild activity_archive_index from the archive store (for parts written before it existed)"""
+        await db.activity_archive_index.delete_many({})
+        parts = 0
+        for day in await asyncio.to_thread(self.store.days):
+            for part in await asyncio.to_thread(self.store.parts, day):
+                await self.index_part(db, day, part, await asyncio.to_thread(_count_users, self.store, day, part))
+                parts += 1
+        return parts
+
+    async def archive(self, db: AsyncIOMotorDatabase) -> int:
+        """Export and delete every day older than the hot window. Returns days archived."""
+        if not await self.lease.acquire(db):
+            self.stats["runs_skipped"] += 1
+            return 0
+        self.stats["runs"] += 1
+        try:
+            return await self._archive(db)
+        finally:
+            await self.lease.release(db)
+
+    async def _archive(self, db: AsyncIOMotorDatabase) -> int:
+        cutoff = self.cutoff()
+        archived = 0
+        while await self.lease.acquire(db):
+            oldest = await db.activity_logs.find_one(
+                {"created_at": {"$lt": cutoff}}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)]
+            )
+            if not oldest:
+                break
+            day = oldest["created_at"].date()
+            exported, deleted = await self.export_day(db, day)
+            logger.info(f"Archived activity logs for {day}: {exported} exported, {deleted} deleted")
+            archived += 1
+            self.stats["archived_days"] += 1
+            if not deleted:
+                break
+        return archived
+
+    # Reads
+
+    async def find(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_id: str,
+        limit: int = 100,
+        before: Optional[datetime] = None
+    ) -> Tuple[List[Dict], int]:
+        """A user's activity newest first across both tiers. Returns (entries, archive days scanned)."""
+        query: Dict = {"user_id": user_id}
+        if before is not None:
+            query["created_at"] = {"$lt": before}
+        entries = await db.activity_logs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+        if len(entries) >= limit:
+            return entries, 0
+
+        self.stats["archive_reads"] += 1
+        # Only days that hold the user's entries, newest first, at most max_scan_days of them
+        index_query: Dict = {"user_id": user_id}
+        if before is not None:
+            index_query["day"] = {"$lte": before.date().isoformat()}
+        days = await db.activity_archive_index.find(
+            index_query, {"_id": 0, "day": 1, "parts": 1}
+        ).sort("day", -1).limit(self.max_scan_days).to_list(self.max_scan_days)
+        seen = {(entry["id"], entry["created_at"]) for entry in entries}
+        scanned = 0
+        for indexed in days:
+            found: List[Dict] = []
+            for part in indexed["parts"]:
+                found.extend(await asyncio.to_thread(_scan_part, self.store, indexed["day"], part, user_id, before))
+            scanned += 1
+            for entry in sorted(found, key=lambda e: e["created_at"], reverse=True):
+                key = (entry["id"], entry["created_at"])
+                if key not in seen:
+                    seen.add(key)
+                    entries.append(entry)
+            if len(entries) >= limit:
+                break
+
+        self.stats["archive_days_scanned"] += scanned
+        entries.sort(key=lambda e: e["created_at"], reverse=True)
+        return entries[:limit], scanned
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                await self.archive(db)
+            except Exception as e:
+                logger.error(f"Activity log archive failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "store": self.store_name,
+            "hot_days": self.hot_days,
+            "exported_ttl_days": EXPORTED_TTL_DAYS,
+            "interval": self.interval
+        }
+
+
+activity_archive = ActivityArchive(
+    store=os.environ.get("ACTIVITY_ARCHIVE_STORE", "local"),
+    hot_days=HOT_DAYS,
+    interval=float(os.environ.get("ACTIVITY_ARCHIVE_INTERVAL_SECONDS", 3600)),
+    batch_size=int(os.environ.get("ACTIVITY_ARCHIVE_BATCH_SIZE", 1000)),
+    max_scan_days=int(os.environ.get("ACTIVITY_ARCHIVE_MAX_SCAN_DAYS", 366)),
+    lease_seconds=float(os.environ.get("ACTIVITY_ARCHIVE_LEASE_SECONDS", 600)),
+    path=os.environ.get("ACTIVITY_ARCHIVE_PATH", "archive/activity_logs"),
+    bucket=os.environ.get("ACTIVITY_ARCHIVE_S3_BUCKET", ""),
+    prefix=os.environ.get("ACTIVITY_ARCHIVE_S3_PREFIX", "activity_logs/"),
+    endpoint_url=os.environ.get("ACTIVITY_ARCHIVE_S3_ENDPOINT_URL")
+)
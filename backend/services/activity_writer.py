@@ -0,0 +1,136 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from collections import deque
+from typing import Deque, Dict, Optional, Union
+import asyncio
+import os
+import logging
+
+from models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest")
+
+
+class ActivityLogWriter:
+    """Write-behind queue for activity_logs.
+
+    Routes call `log()`, which only appends to a bounded in-memory queue and
+    returns. A background task writes the queue with one unordered
+    insert_many every `flush_interval` seconds, or as soon as `batch_size`
+    entries are waiting. When the queue is full the overflow policy drops
+    the new entry ("drop_newest") or the oldest queued one ("drop_oldest");
+    failed batches are put back at the front while there is room. Pending
+    entries are flushed on shutdown.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_queue: int = 50000,
+        overflow: str = "drop_newest"
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown activity log overflow policy: {overflow}")
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._queue: Deque[Dict] = deque()
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "written": 0,
+            "flushes": 0,
+            "errors": 0,
+            "max_depth": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def log(self, activity: Union[ActivityLog, Dict]) -> bool:
+        """Queue an activity record. Returns False if it (or an older one) was dropped."""
+        doc = activity.dict() if isinstance(activity, ActivityLog) else activity
+        accepted = True
+        if len(self._queue) >= self.max_queue:
+            self.stats["dropped"] += 1
+            if self.overflow == "drop_newest":
+                return False
+            self._queue.popleft()
+            accepted = False
+
+        self._queue.append(doc)
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+        return accepted
+
+    async def flush(self) -> int:
+        """Write everything queued, batch_size documents per insert_many"""
+        written = 0
+        async with self._flush_lock:
+            while self._queue and self._db is not None:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                try:
+                    await self._db.activity_logs.insert_many(batch, ordered=False)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Activity log flush failed ({len(batch)} entries): {str(e)}")
+                    # Put the batch back in front while it fits; the rest is lost
+                    room = max(self.max_queue - len(self._queue), 0)
+                    self.stats["dropped"] += max(len(batch) - room, 0)
+                    self._queue.extendleft(reversed(batch[:room]))
+                    break
+                written += len(batch)
+                self.stats["written"] += len(batch)
+                self.stats["flushes"] += 1
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "queued": len(self._queue),
+            "flush_interval": self.flush_interval,
+            "batch_size": self.batch_size,
+            "max_queue": self.max_queue,
+            "overflow": self.overflow
+        }
+
+
+activity_writer = ActivityLogWriter(
+    flush_interval=float(os.environ.get("ACTIVITY_LOG_FLUSH_INTERVAL_SECONDS", 1.0)),
+    batch_size=int(os.environ.get("ACTIVITY_LOG_BATCH_SIZE", 500)),
+    max_queue=int(os.environ.get("ACTIVITY_LOG_MAX_QUEUE", 50000)),
+    overflow=os.environ.get("ACTIVITY_LOG_OVERFLOW", "drop_newest")
+)
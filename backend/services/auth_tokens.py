@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import os
+import jwt
+
+
+class AuthTokenError(Exception):
+    """Token missing, malformed, expired or signed with another secret"""
+
+
+class AuthTokenService:
+    """Signed (HS256) access tokens issued at login.
+
+    The token carries the user id and role and expires after `ttl` seconds.
+    Every worker must share JWT_SECRET so a token issued by one verifies on
+    all of them; `start()` refuses to run without it.
+    """
+
+    def __init__(self, secret: Optional[str] = None, ttl: float = 30 * 86400, algorithm: str = "HS256"):
+        self._secret = secret
+        self.ttl = ttl
+        self.algorithm = algorithm
+
+    def start(self):
+        if not self._secret:
+            raise RuntimeError("JWT_SECRET is not set; login tokens cannot be issued or verified")
+
+    def issue(self, user_id: str, role: str) -> str:
+        now = datetime.utcnow()
+        return jwt.encode(
+            {"sub": user_id, "role": role, "iat": now, "exp": now + timedelta(seconds=self.ttl)},
+            self._secret,
+            algorithm=self.algorithm
+        )
+
+    def verify(self, token: str) -> Dict:
+        """Claims of a valid token; raises AuthTokenError otherwise"""
+        if not self._secret:
+            raise AuthTokenError("JWT_SECRET is not set")
+        try:
+            return jwt.decode(token, self._secret, algorithms=[self.algorithm], options={"require": ["sub", "exp"]})
+        except (jwt.InvalidTokenError, TypeError) as e:
+            raise AuthTokenError(str(e))
+
+
+auth_tokens = AuthTokenService(
+    secret=os.environ.get("JWT_SECRET"),
+    ttl=float(os.environ.get("JWT_TTL_SECONDS", 30 * 86400))
+)
@@ -0,0 +1,92 @@
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+import asyncio
+
+from database import get_db
+
+USER_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "email": 1}
+
+
+class BatchLoader:
+    """DataLoader-style batching and memoisation of lookups by key.
+
+    `load()` calls made in the same event loop iteration are coalesced into
+    a single `{key: {"$in": [...]}}` query; each key is fetched at most once
+    for the loader's lifetime (one request). Missing documents load as None.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        key: str = "id",
+        projection: Optional[Dict[str, Any]] = None
+    ):
+        self.collection = collection
+        self.key = key
+        self.projection = projection
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self.queries = 0
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Optional[Dict]]:
+        """Documents for the distinct non-empty keys, keyed by key"""
+        keys = list(dict.fromkeys(k for k in keys if k is not None))
+        docs = await asyncio.gather(*(self.load(k) for k in keys))
+        return dict(zip(keys, docs))
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        asyncio.ensure_future(self._fetch(keys))
+
+    async def _fetch(self, keys: List[Hashable]):
+        self.queries += 1
+        projection = self.projection
+        if projection is not None and projection.get(self.key) is None:
+            projection = {**projection, self.key: 1}
+        try:
+            docs = await self.collection.find({self.key: {"$in": keys}}, projection).to_list(None)
+        except Exception as e:
+            for key in keys:
+                # Let a later request retry instead of caching the failure
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {doc[self.key]: doc for doc in docs}
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+class Loaders:
+    """Per-request loader registry; inject with Depends(get_loaders)"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self._users: Optional[BatchLoader] = None
+
+    @property
+    def users(self) -> BatchLoader:
+        """User summaries (id, name, phone, email) by users.id"""
+        if self._users is None:
+            self._users = BatchLoader(self.db.users, "id", USER_SUMMARY_PROJECTION)
+        return self._users
+
+
+def get_loaders(db: AsyncIOMotorDatabase = Depends(get_db)) -> Loaders:
+    # FastAPI resolves a dependency once per request, so loaders never leak across requests
+    return Loaders(db)
@@ -3,18 +3,31 @@ from typing import Optional, List
 from models import (
     Bill, BillItem, Ride, VehiclePricing, TripType
 )
+from services.pricing_cache import pricing_cache
 
 class BillGenerator:
     """Automatic bill generation service"""
     
+    @staticmethod
+    def resolve_pricing(vehicle_type: str, vehicle_pricing: Optional[VehiclePricing] = None) -> VehiclePricing:
+        """Explicit pricing if given, otherwise the cached table entry"""
+        if vehicle_pricing is not None:
+            return vehicle_pricing
+        cached = pricing_cache.get(vehicle_type)
+        if cached is None:
+            raise ValueError(f"Pricing not found for vehicle type {vehicle_type}")
+        return cached
+    
     @staticmethod
     def calculate_fare(
-        vehicle_pricing: VehiclePricing,
+        vehicle_pricing: Optional[VehiclePricing],
         distance: float,
         duration: int,
-        trip_type: TripType
+        trip_type: TripType,
+        vehicle_type: Optional[str] = None
     ) -> float:
-        """Calculate fare based on pricing config"""
+        """Calculate fare based on pricing config (cached table when vehicle_pricing is None)"""
+        vehicle_pricing = BillGenerator.resolve_pricing(vehicle_type, vehicle_pricing)
         base_fare = vehicle_pricing.base_price
         distance_fare = distance * vehicle_pricing.price_per_km
         time_fare = duration * vehicle_pricing.price_per_min
@@ -31,11 +44,13 @@ class BillGenerator:
     @staticmethod
     def generate_bill(
         ride: Ride,
-        vehicle_pricing: VehiclePricing,
+        vehicle_pricing: Optional[VehiclePricing],
         distance: float,
         duration: int
     ) -> Bill:
-        """Generate detailed bill for a ride"""
+        """Generate detailed bill for a ride (cached pricing when vehicle_pricing is None)"""
+        
+        vehicle_pricing = BillGenerator.resolve_pricing(ride.vehicle_type, vehicle_pricing)
         
         # Calculate components
         base_fare = vehicle_pricing.base_price
@@ -0,0 +1,309 @@
+from datetime import datetime, timedelta, timezone, time as clock
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import os
+import re
+import unicodedata
+import logging
+
+from services.gazetteer import Gazetteer, gazetteer
+
+logger = logging.getLogger(__name__)
+
+# Word boundaries that also hold next to Devanagari vowel signs, which \b does not treat as letters
+_L = r"(?<![0-9a-z\u0900-\u097f])"
+_R = r"(?![0-9a-z\u0900-\u097f])"
+
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+
+
+def _words(*phrases: str) -> str:
+    """Alternation of whole phrases, longest first, any run of spaces between words"""
+    ordered = sorted(phrases, key=len, reverse=True)
+    return _L + "(?:" + "|".join(r"\s+".join(map(re.escape, p.split())) for p in ordered) + ")" + _R
+
+
+VEHICLE_WORDS = {
+    "auto": ("auto", "autorickshaw", "auto rickshaw", "rickshaw", "tuk tuk", "ऑटो", "ओटो", "रिक्शा"),
+    "mini": ("mini", "hatchback", "small car", "chhoti gaadi", "choti gaadi", "choti gadi", "मिनी", "छोटी गाड़ी"),
+    "sedan": ("sedan", "dzire", "swift dzire", "etios", "सेडान"),
+    "suv": ("suv", "innova", "ertiga", "xuv", "7 seater", "badi gaadi", "badi gadi", "एसयूवी", "बड़ी गाड़ी")
+}
+_VEHICLES = [(vehicle, re.compile(_words(*words))) for vehicle, words in VEHICLE_WORDS.items()]
+
+_HOURS = r"(?:hrs?|hours?|ghante|ghanta|घंटे|घंटा)"
+_RENTAL = re.compile(
+    _L + r"(?:(?:rental|package|for)\s*(?P<a>4|8|12)\s*" + _HOURS
+    + r"|(?P<b>4|8|12)\s*" + _HOURS + r"\s*(?:rental|package|ke\s+liye|के\s+लिए)"
+    + r"|rental|package)" + _R
+)
+_ROUND_TRIP = re.compile(_words(
+    "round trip", "return trip", "and back", "up down", "aana jaana", "ana jana", "आना जाना", "wapas bhi", "वापसी"
+))
+
+_NOW = re.compile(_words("now", "right now", "asap", "abhi", "abhi ke abhi", "turant", "jaldi", "अभी", "तुरंत"))
+_RELATIVE = re.compile(
+    _L + r"(?:(?:in|after)\s+(?P<a>\d{1,3})\s*(?P<ua>mins?|minutes?|hrs?|hours?)"
+    + r"|(?P<b>\d{1,3})\s*(?P<ub>mins?|minutes?|minat|मिनट|ghante|ghanta|घंटे|घंटा|hrs?|hours?)"
+    + r"\s*(?:baad|bad|mein|me|में|बाद))" + _R
+)
+_DAYS = [
+    (2, re.compile(_words("day after tomorrow", "parso", "parson", "परसों"))),
+    (1, re.compile(_words("tomorrow", "tmrw", "tmr", "kal", "कल"))),
+    (0, re.compile(_words("today", "tonight", "aaj", "आज")))
+]
+# Period of day -> (hour when none is given, how a 1-12 hour reads)
+PERIODS = {
+    "morning": (8, "am"),
+    "afternoon": (14, "pm"),
+    "evening": (18, "pm"),
+    "night": (21, "night")
+}
+_PERIODS = [
+    ("morning", re.compile(_words("morning", "subah", "subha", "savere", "सुबह"))),
+    ("afternoon", re.compile(_words("afternoon", "dopahar", "dopehar", "दोपहर"))),
+    ("evening", re.compile(_words("evening", "shaam", "sham", "शाम"))),
+    ("night", re.compile(_words("night", "tonight", "raat", "rat", "रात")))
+]
+_MERIDIEM = r"(?P<mer>a\.?m\.?|p\.?m\.?|baje|बजे|o\s*'?\s*clock)"
+_CLOCKS = [
+    re.compile(_L + r"(?:(?:at|@)\s*)?(?P<h>\d{1,2})(?:[:.](?P<m>\d{2}))?\s*" + _MERIDIEM + _R),
+    re.compile(r"(?:" + _L + r"at|@)\s*(?P<h>\d{1,2})(?:[:.](?P<m>\d{2}))?" + _R),
+    re.compile(_L + r"(?P<h>\d{1,2}):(?P<m>\d{2})" + _R)
+]
+
+_FROM = r"(?:from|frm|pickup|pick\s+up|pick\s+me\s+(?:up\s+)?from)"
+_TO = r"(?:to|till|upto|up\s+to|drop(?:\s+(?:at|to))?|->|→)"
+_SE = r"(?:se|sey|say|से)"
+_ROUTES = [
+    re.compile(r"^(?:.*?\s)?" + _FROM + r"\s+(?P<pickup>.+?)\s+" + _TO + r"\s+(?P<drop>.+)$"),
+    re.compile(r"^(?:.*?\s)?to\s+(?P<drop>.+?)\s+" + _FROM + r"\s+(?P<pickup>.+)$"),
+    re.compile(r"^(?P<pickup>.+?)\s+" + _SE + r"\s+(?P<drop>.+)$"),
+    re.compile(r"^(?P<pickup>.+?)\s+" + _TO + r"\s+(?P<drop>.+)$"),
+    re.compile(r"^(?:.*?\s)?" + _FROM + r"\s+(?P<pickup>.+)$"),
+    re.compile(r"^(?P<pickup>.+?)\s+" + _SE + r"$"),
+    re.compile(r"^(?:.*?\s)?(?:to|till)\s+(?P<drop>.+)$")
+]
+
+_LEADING_FILLER = re.compile(
+    r"^(?:" + _words(
+        "hi", "hello", "namaste", "please", "pls", "plz", "kindly", "i want", "i need", "want", "need",
+        "book", "booking", "a", "an", "ek", "mujhe", "muje", "mko", "humein", "hume", "ride", "cab", "taxi",
+        "car", "gaadi", "gadi", "गाड़ी", "मुझे", "एक", "बुक", "kar", "karo", "kar do", "chahiye", "chaiye",
+        "me", "my", "the", "from", "for"
+    ) + r"\s*)+"
+)
+_TRAILING_FILLER = re.compile(
+    r"(?:\s*" + _words(
+        "tak", "tk", "तक", "jana", "jaana", "जाना", "chalna", "चलना", "chalo", "chaliye", "pahunchna",
+        "पहुंचना", "ke liye", "के लिए", "ko", "को", "hai", "he", "h", "है", "please", "pls", "plz",
+        "chahiye", "chaiye", "चाहिए", "book", "karo", "kar do", "kardo", "करो", "bhejo", "भेजो",
+        "ride", "cab", "taxi", "gaadi", "gadi", "गाड़ी", "jana hai", "jaana hai", "जाना है"
+    ) + r")+$"
+)
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " ,.;:!?-|।"
+
+USAGE = (
+    "Please send pickup and drop, e.g. \"Book sedan from Connaught Place to Cyber Hub at 6pm\" "
+    "or \"Noida sector 18 se airport jana hai\""
+)
+
+
+class BookingParser:
+    """Turns a free-text WhatsApp booking into pickup/drop coordinates and ride options.
+
+    Handles English, Hinglish and Devanagari phrasings ("from X to Y",
+    "X to Y", "X se Y jana hai", "X से Y तक"), vehicle words ("auto",
+    "innova", "badi gaadi"), rentals and round trips, and pickup times
+    ("abhi", "in 20 min", "kal subah 9 baje", "at 6:30pm") relative to
+    `now` in the booking time zone. Option and time phrases are cut out
+    before the route split so they cannot end up in a place name; places
+    resolve through the in-process gazetteer. All patterns are compiled
+    at import, so a parse is a handful of regex scans plus cached lookups.
+    """
+
+    def __init__(self, places: Gazetteer, tz: str = "Asia/Kolkata"):
+        self.places = places
+        self.tz = ZoneInfo(tz)
+        self.stats = {"parsed": 0, "incomplete": 0, "invalid_format": 0}
+
+    # Options
+
+    @staticmethod
+    def _cut(text: str, match: re.Match) -> str:
+        return text[:match.start()] + " " + text[match.end():]
+
+    def _vehicle(self, text: str) -> Tuple[Optional[str], str]:
+        found = None
+        for vehicle, pattern in _VEHICLES:
+            match = pattern.search(text)
+            if match and (found is None or match.start() < found[1].start()):
+                found = (vehicle, match)
+        if found is None:
+            return None, text
+        return found[0], self._cut(text, found[1])
+
+    def _trip_type(self, text: str) -> Tuple[Optional[str], str]:
+        match = _RENTAL.search(text)
+        if match:
+            hours = match.group("a") or match.group("b") or "4"
+            return f"rental-{hours}hr", self._cut(text, match)
+        match = _ROUND_TRIP.search(text)
+        if match:
+            return "round-trip", self._cut(text, match)
+        return None, text
+
+    def _pickup_time(self, text: str, now: datetime) -> Tuple[Optional[datetime], bool, str]:
+        """(pickup time as naive UTC or None for "as soon as possible", time given but incomplete, rest of text)"""
+        match = _RELATIVE.search(text)
+        if match:
+            amount = int(match.group("a") or match.group("b"))
+            unit = match.group("ua") or match.group("ub")
+            minutes = amount if unit.startswith(("min", "मि")) else amount * 60
+            return self._utc(now + timedelta(minutes=minutes)), False, self._cut(text, match)
+        match = _NOW.search(text)
+        if match:
+            return None, False, self._cut(text, match)
+
+        day = period = hour = None
+        minute = 0
+        meridiem = None
+        for offset, pattern in _DAYS:
+            match = pattern.search(text)
+            if match:
+                day = offset
+                text = self._cut(text, match)
+                break
+        for name, pattern in _PERIODS:
+            match = pattern.search(text)
+            if match:
+                period = name
+                text = self._cut(text, match)
+                break
+        for pattern in _CLOCKS:
+            match = pattern.search(text)
+            if match and int(match.group("h")) < 24 and int(match.group("m") or 0) < 60:
+                hour, minute = int(match.group("h")), int(match.group("m") or 0)
+                meridiem = (match.groupdict().get("mer") or "")[:1]
+                text = self._cut(text, match)
+                break
+
+        if day is None and period is None and hour is None:
+            return None, False, text
+        if hour is None:
+            if period is None:
+                # "kal" alone: the day is known, the hour is not
+                return None, True, text
+            hour = PERIODS[period][0]
+        elif hour <= 12:
+            reading = {"a": "am", "p": "pm"}.get(meridiem) or (PERIODS[period][1] if period else None)
+            if reading == "am":
+                hour = 0 if hour == 12 else hour
+            elif reading == "pm" or (reading == "night" and hour >= 6):
+                hour = hour if hour == 12 else hour + 12
+            elif reading is None:
+                # "5 baje": the next 5 o'clock for today, daytime hours for a named day
+                if day is None:
+                    for candidate in (hour % 12, hour % 12 + 12):
+                        if datetime.combine(now.date(), clock(candidate, minute), tzinfo=self.tz) > now:
+                            hour = candidate
+                            break
+                    else:
+                        hour = hour % 12
+                elif hour < 7:
+                    hour += 12
+
+        local = datetime.combine(now.date() + timedelta(days=day or 0), clock(hour, minute), tzinfo=self.tz)
+        if day is None and local <= now:
+            local += timedelta(days=1)
+        return self._utc(local), False, text
+
+    @staticmethod
+    def _utc(moment: datetime) -> datetime:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+    # Places
+
+    @staticmethod
+    def _clean(segment: str) -> str:
+        segment = segment.strip(_EDGE_PUNCTUATION)
+        segment = _LEADING_FILLER.sub("", segment)
+        segment = _TRAILING_FILLER.sub("", segment)
+        return segment.strip(_EDGE_PUNCTUATION)
+
+    def _place(self, segment: Optional[str]) -> Optional[Dict]:
+        if not segment:
+            return None
+        text = self._clean(segment)
+        if not text:
+            return None
+        match = self.places.resolve(text)
+        if match is None:
+            return {"text": text, "address": text, "latitude": None, "longitude": None, "score": 0.0}
+        return {
+            "text": text,
+            "address": match["name"],
+            "latitude": match["latitude"],
+            "longitude": match["longitude"],
+            "score": match["score"]
+        }
+
+    # Entry point
+
+    def parse(self, message: str, now: Optional[datetime] = None) -> Dict:
+        """Parse one message; status is parsed, incomplete (see `missing`) or invalid_format"""
+        now = (now or datetime.now(timezone.utc)).astimezone(self.tz)
+        text = unicodedata.normalize("NFKC", message).lower().translate(_DEVANAGARI_DIGITS)
+        text = _SPACES.sub(" ", text).strip()
+
+        vehicle_type, text = self._vehicle(text)
+        trip_type, text = self._trip_type(text)
+        pickup_time, time_incomplete, text = self._pickup_time(text, now)
+        text = _SPACES.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+        route = None
+        for pattern in _ROUTES:
+            route = pattern.match(text)
+            if route:
+                break
+        if route is None:
+            self.stats["invalid_format"] += 1
+            return {"status": "invalid_format", "message": USAGE}
+
+        groups = route.groupdict()
+        pickup = self._place(groups.get("pickup"))
+        drop = self._place(groups.get("drop"))
+        missing: List[str] = []
+        # Rentals are booked by the hour from a pickup; a drop is optional
+        drop_required = not (trip_type or "").startswith("rental-")
+        for field, place in (("pickup", pickup), ("drop", drop)):
+            if place is None:
+                if field == "pickup" or drop_required:
+                    missing.append(field)
+            elif place["latitude"] is None:
+                missing.append(f"{field}_location")
+        if time_incomplete:
+            missing.append("pickup_time")
+
+        status = "incomplete" if missing else "parsed"
+        self.stats[status] += 1
+        result = {
+            "status": status,
+            "pickup": pickup,
+            "drop": drop,
+            "vehicle_type": vehicle_type,
+            "trip_type": trip_type or "one-way",
+            "pickup_time": pickup_time,
+            "missing": missing,
+            "needs_confirmation": True
+        }
+        if missing:
+            result["message"] = USAGE
+        return result
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "gazetteer": self.places.snapshot()}
+
+
+booking_parser = BookingParser(gazetteer, tz=os.environ.get("BOOKING_TIMEZONE", "Asia/Kolkata"))
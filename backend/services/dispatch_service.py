@@ -0,0 +1,394 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+import logging
+import numpy as np
+
+from models import RideStatus
+from services.geo_service import haversine_km
+from services.driver_index import driver_index
+from services.driver_connections import connection_manager
+from services.leases import Lease
+
+logger = logging.getLogger(__name__)
+
+
+def greedy_assignment(cost: np.ndarray, k: int = 8) -> List[Tuple[int, int]]:
+    """Greedy minimum-distance matching on a rides x drivers cost matrix.
+
+    Unusable pairs are np.inf. Pairs are taken cheapest first, using only
+    each ride's k cheapest drivers so the sort stays small; rides whose
+    shortlist was exhausted by other rides are retried against the drivers
+    still free until no further pair can be made.
+    """
+    rides, drivers = cost.shape
+    if not rides or not drivers:
+        return []
+
+    ride_used = np.zeros(rides, dtype=bool)
+    driver_used = np.zeros(drivers, dtype=bool)
+    pairs: List[Tuple[int, int]] = []
+    remaining = np.arange(rides)
+
+    while len(remaining):
+        sub = cost[remaining]
+        sub = np.where(driver_used[np.newaxis, :], np.inf, sub)
+        width = min(k, drivers)
+        shortlist = np.argpartition(sub, width - 1, axis=1)[:, :width]
+        shortlist_cost = np.take_along_axis(sub, shortlist, axis=1)
+
+        order = np.argsort(shortlist_cost, axis=None, kind="stable")
+        flat_cost = shortlist_cost.ravel()[order].tolist()
+        flat_rows = (order // width).tolist()
+        flat_cols = shortlist.ravel()[order].tolist()
+
+        progress = False
+        for distance, row, col in zip(flat_cost, flat_rows, flat_cols):
+            if distance == np.inf:
+                break
+            ride = remaining[row]
+            if ride_used[ride] or driver_used[col]:
+                continue
+            ride_used[ride] = True
+            driver_used[col] = True
+            pairs.append((int(ride), int(col)))
+            progress = True
+
+        if not progress:
+            break
+        remaining = remaining[~ride_used[remaining]]
+        # Rides with no finite cost left can never be matched in this round
+        if len(remaining):
+            free = np.where(driver_used[np.newaxis, :], np.inf, cost[remaining])
+            remaining = remaining[np.isfinite(free).any(axis=1)]
+
+    return pairs
+
+
+class PendingRide:
+    __slots__ = (
+        "ride_id", "latitude", "longitude", "vehicle_type",
+        "payload", "excluded", "offers", "submitted_at"
+    )
+
+    def __init__(self, ride: Dict):
+        self.ride_id = ride["id"]
+        self.latitude = ride["pickup_location"]["latitude"]
+        self.longitude = ride["pickup_location"]["longitude"]
+        self.vehicle_type = ride["vehicle_type"]
+        self.payload = {
+            "ride_id": ride["id"],
+            "pickup": ride["pickup_location"],
+            "drop": ride["drop_location"],
+            "vehicle_type": ride["vehicle_type"],
+            "trip_type": ride.get("trip_type"),
+            "distance": ride.get("distance"),
+            "estimated_fare": ride.get("estimated_fare")
+        }
+        self.excluded: Set[str] = set()
+        self.offers = 0
+        self.submitted_at = time.monotonic()
+
+
+class DispatchEngine:
+    """Matches REQUESTED rides to nearby online drivers in short batching windows.
+
+    Every `window` seconds the pending rides are matched against drivers
+    from the in-memory driver index: a rides x drivers pickup-distance
+    matrix is computed in one vectorised call and a greedy assignment
+    minimises total pickup distance. Each ride is offered to its chosen
+    driver over the driver WebSocket; offers that are undeliverable or not
+    accepted within `offer_timeout` put the ride back for the next window,
+    excluding the drivers already tried. Every attempt, delivered or not,
+    counts toward `max_offers`, after which the ride is given up.
+
+    Only one worker process dispatches: the holder of the "dispatch" lease.
+    It loads requested rides from MongoDB when it takes the lease and then
+    every window (rides booked through other workers included), and reloads
+    the drivers engaged on accepted or ongoing rides, so offers are never
+    sent twice. Offers reach drivers connected to any worker: those on
+    other workers are relayed through MongoDB (see DriverConnectionManager).
+    """
+
+    def __init__(
+        self,
+        window: float = 2.0,
+        radius_km: float = 5.0,
+        offer_timeout: float = 15.0,
+        max_offers: int = 5,
+        candidates_per_ride: int = 20,
+        lease_seconds: float = 15.0,
+        max_age_minutes: int = 30
+    ):
+        self.window = window
+        self.radius_km = radius_km
+        self.offer_timeout = offer_timeout
+        self.max_offers = max_offers
+        self.candidates_per_ride = candidates_per_ride
+        self.max_age_minutes = max_age_minutes
+        self.lease = Lease("dispatch", ttl=lease_seconds)
+        self._polled_at: Optional[datetime] = None
+
+        self._pending: Dict[str, PendingRide] = {}
+        # ride_id -> (pending ride, driver_id, expiry)
+        self._offers: Dict[str, Tuple[PendingRide, str, float]] = {}
+        self._busy: Set[str] = set()
+        # ride_id -> driver_id for accepted rides, released when the ride ends
+        self._engaged: Dict[str, str] = {}
+
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._round_latency = deque(maxlen=1000)
+        self._match_latency = deque(maxlen=1000)
+        self.stats = {
+            "rides_submitted": 0,
+            "rounds": 0,
+            "offers_sent": 0,
+            "offers_undeliverable": 0,
+            "offers_expired": 0,
+            "rides_accepted": 0,
+            "rides_abandoned": 0,
+            "unmatched_in_round": 0
+        }
+
+    # Route hooks
+
+    def submit(self, ride: Dict):
+        """Queue a newly requested ride for dispatch (other workers' rides are polled by the leader)"""
+        if not self.lease.held:
+            return
+        self._queue(ride)
+
+    def _queue(self, ride: Dict):
+        if ride["id"] in self._pending or ride["id"] in self._offers:
+            return
+        self._pending[ride["id"]] = PendingRide(ride)
+        self.stats["rides_submitted"] += 1
+
+    def ride_accepted(self, ride_id: str, driver_id: str):
+        """Ride accepted by driver_id, who need not be the driver offered it last"""
+        pending = self._pending.pop(ride_id, None)
+        offer = self._offers.pop(ride_id, None)
+        if offer is not None:
+            pending = offer[0]
+            self._busy.discard(offer[1])
+        if self.lease.held:
+            self._engaged[ride_id] = driver_id
+        if pending is not None:
+            self.stats["rides_accepted"] += 1
+            self._match_latency.append(time.monotonic() - pending.submitted_at)
+
+    def ride_closed(self, ride_id: str):
+        """Ride completed or cancelled: forget it and free its driver"""
+        self._pending.pop(ride_id, None)
+        offer = self._offers.pop(ride_id, None)
+        if offer is not None:
+            self._busy.discard(offer[1])
+        self._engaged.pop(ride_id, None)
+
+    # Matching
+
+    def plan(self, rides: List[PendingRide]) -> List[Tuple[PendingRide, str, float]]:
+        """Choose a driver for as many rides as possible: (ride, driver_id, pickup_km)"""
+        unavailable = self._busy | set(self._engaged.values())
+        candidates: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, ride in enumerate(rides):
+            for driver_id, _ in driver_index.within_radius(
+                ride.latitude, ride.longitude, self.radius_km,
+                vehicle_type=ride.vehicle_type, limit=self.candidates_per_ride
+            ):
+                if driver_id in unavailable or driver_id in ride.excluded:
+                    continue
+                rows.append(row)
+                cols.append(candidates.setdefault(driver_id, len(candidates)))
+        if not candidates:
+            return []
+
+        # Pickup-distance matrix over the nearby candidates; pairs that are
+        # not nearby, the wrong vehicle type or already declined stay at inf
+        driver_ids = list(candidates)
+        driver_lat, driver_lon, _ = driver_index.positions(driver_ids)
+        ride_lat = np.fromiter((r.latitude for r in rides), dtype=np.float64, count=len(rides))
+        ride_lon = np.fromiter((r.longitude for r in rides), dtype=np.float64, count=len(rides))
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+
+        cost = np.full((len(rides), len(driver_ids)), np.inf, dtype=np.float32)
+        cost[rows, cols] = haversine_km(ride_lat[rows], ride_lon[rows], driver_lat[cols], driver_lon[cols])
+
+        return [
+            (rides[row], driver_ids[col], float(cost[row, col]))
+            for row, col in greedy_assignment(cost)
+        ]
+
+    async def _offer(self, ride: PendingRide, driver_id: str, pickup_km: float) -> bool:
+        expires_at = datetime.utcnow() + timedelta(seconds=self.offer_timeout)
+        result = await self._db.rides.update_one(
+            {"id": ride.ride_id, "status": RideStatus.REQUESTED},
+            {"$set": {"offered_driver_id": driver_id, "offer_expires_at": expires_at}}
+        )
+        if not result.matched_count:
+            # Accepted or cancelled meanwhile
+            self._pending.pop(ride.ride_id, None)
+            return False
+
+        ride.excluded.add(driver_id)
+        # Undeliverable attempts count too, so a ride nobody can reach is given up
+        ride.offers += 1
+        offer = {**ride.payload, "pickup_distance_km": round(pickup_km, 3), "expires_in": self.offer_timeout}
+        if not await connection_manager.deliver_offer(driver_id, offer, self.offer_timeout):
+            self.stats["offers_undeliverable"] += 1
+            return False
+
+        self._pending.pop(ride.ride_id, None)
+        self._offers[ride.ride_id] = (ride, driver_id, time.monotonic() + self.offer_timeout)
+        self._busy.add(driver_id)
+        self.stats["offers_sent"] += 1
+        return True
+
+    def _expire_offers(self):
+        now = time.monotonic()
+        for ride_id, (ride, driver_id, expiry) in list(self._offers.items()):
+            if expiry <= now:
+                del self._offers[ride_id]
+                self._busy.discard(driver_id)
+                self._pending[ride_id] = ride
+                self.stats["offers_expired"] += 1
+
+    def _abandon_exhausted(self):
+        for ride_id, ride in list(self._pending.items()):
+            if ride.offers >= self.max_offers:
+                del self._pending[ride_id]
+                self.stats["rides_abandoned"] += 1
+                logger.warning(f"Dispatch gave up on ride {ride_id} after {ride.offers} offers")
+
+    async def dispatch_once(self) -> int:
+        """Run one matching round; returns the number of offers sent"""
+        self._expire_offers()
+        self._abandon_exhausted()
+        if not self._pending:
+            return 0
+
+        started = time.perf_counter()
+        rides = list(self._pending.values())
+        assignments = self.plan(rides)
+        sent = 0
+        for ride, driver_id, pickup_km in assignments:
+            if await self._offer(ride, driver_id, pickup_km):
+                sent += 1
+
+        self.stats["rounds"] += 1
+        self.stats["unmatched_in_round"] = len(rides) - len(assignments)
+        self._round_latency.append(time.perf_counter() - started)
+        return sent
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                if await self._lead():
+                    await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Dispatch round failed: {str(e)}")
+
+    # Leadership
+
+    def _reset(self):
+        self._pending.clear()
+        self._offers.clear()
+        self._busy.clear()
+        self._engaged.clear()
+        self._polled_at = None
+
+    async def _lead(self) -> bool:
+        """Take or renew the dispatch lease and bring the leader's state up to date"""
+        was_leader = self.lease.held
+        if not await self.lease.acquire(self._db):
+            if was_leader:
+                logger.warning("Dispatch lease lost; another worker dispatches now")
+                self._reset()
+            return False
+        if not was_leader:
+            logger.info("Dispatch lease acquired")
+            await self.recover(self._db)
+        else:
+            # Rides booked through other workers since the last poll
+            await self._load_requested(self._polled_at - timedelta(seconds=max(self.window * 2, 5)))
+        await self._sync_engaged()
+        return True
+
+    async def _load_requested(self, since: datetime):
+        self._polled_at = datetime.utcnow()
+        cursor = self._db.rides.find(
+            {"status": RideStatus.REQUESTED, "created_at": {"$gte": since}},
+            {"_id": 0}
+        )
+        async for ride in cursor:
+            self._queue(ride)
+
+    async def _sync_engaged(self):
+        """Drivers on accepted or ongoing rides, whichever worker handled the accept"""
+        active = await self._db.rides.find(
+            {"status": {"$in": [RideStatus.ACCEPTED, RideStatus.ONGOING]}, "driver_id": {"$ne": None}},
+            {"_id": 0, "id": 1, "driver_id": 1}
+        ).to_list(None)
+        self._engaged = {ride["id"]: ride["driver_id"] for ride in active}
+        for ride_id in list(self._offers):
+            if ride_id in self._engaged:
+                self.ride_accepted(ride_id, self._engaged[ride_id])
+
+    async def recover(self, db: AsyncIOMotorDatabase):
+        """Queue rides still waiting for a driver (on taking the lease, e.g. after a restart)"""
+        self._db = db
+        await self._load_requested(datetime.utcnow() - timedelta(minutes=self.max_age_minutes))
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.lease.release(self._db)
+
+    def snapshot(self) -> Dict:
+        def percentile(samples, q):
+            return round(float(np.percentile(samples, q)), 6) if samples else None
+
+        submitted = self.stats["rides_submitted"]
+        return {
+            **self.stats,
+            "leader": self.lease.held,
+            "pending": len(self._pending),
+            "outstanding_offers": len(self._offers),
+            "match_rate": round(self.stats["rides_accepted"] / submitted, 4) if submitted else None,
+            "round_seconds_p50": percentile(self._round_latency, 50),
+            "round_seconds_p99": percentile(self._round_latency, 99),
+            "time_to_accept_seconds_p50": percentile(self._match_latency, 50),
+            "time_to_accept_seconds_p99": percentile(self._match_latency, 99),
+            "window": self.window,
+            "radius_km": self.radius_km,
+            "offer_timeout": self.offer_timeout
+        }
+
+
+dispatch_engine = DispatchEngine(
+    window=float(os.environ.get("DISPATCH_WINDOW_SECONDS", 2.0)),
+    radius_km=float(os.environ.get("DISPATCH_RADIUS_KM", 5.0)),
+    offer_timeout=float(os.environ.get("DISPATCH_OFFER_TIMEOUT_SECONDS", 15.0)),
+    max_offers=int(os.environ.get("DISPATCH_MAX_OFFERS", 5)),
+    lease_seconds=float(os.environ.get("DISPATCH_LEASE_SECONDS", 15.0))
+)
@@ -0,0 +1,359 @@
+from fastapi import WebSocket, WebSocketDisconnect
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import secrets
+import time
+import logging
+
+from services.auth_tokens import auth_tokens, AuthTokenError
+from services.driver_index import driver_index
+from services.location_buffer import location_buffer
+from services.stats_rollup import stats_rollup
+
+logger = logging.getLogger(__name__)
+
+# Frame types. Frames are compact JSON arrays: [type, ...fields]
+FRAME_AUTH = "auth"          # client: ["auth", driver_id, access_token]
+FRAME_LOCATION = "l"         # client: ["l", latitude, longitude]
+FRAME_PING = "p"             # client: ["p"]
+FRAME_AUTH_OK = "ok"         # server: ["ok", driver_id]
+FRAME_PONG = "P"             # server: ["P"]
+FRAME_OFFER = "o"            # server: ["o", {...ride offer...}]
+FRAME_ERROR = "e"            # server: ["e", message]
+
+# WebSocket close codes
+CLOSE_AUTH_FAILED = 4401
+CLOSE_HEARTBEAT_TIMEOUT = 4408
+CLOSE_REPLACED = 4409
+CLOSE_SLOW_CONSUMER = 1013
+
+# Relayed offers are polled in chunks of this many locally connected drivers
+RELAY_CHUNK = 1000
+
+
+class DriverConnection:
+    """One authenticated driver socket with its bounded outbound queue"""
+
+    __slots__ = ("driver_id", "session", "websocket", "queue", "last_seen", "sender")
+
+    def __init__(self, driver_id: str, session: str, websocket: WebSocket, queue_size: int):
+        self.driver_id = driver_id
+        # Also stored on the driver document: only this connection may mark it offline
+        self.session = session
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.sender: Optional[asyncio.Task] = None
+
+    async def _send_loop(self):
+        while True:
+            frame = await self.queue.get()
+            await self.websocket.send_text(frame)
+
+
+class DriverConnectionManager:
+    """Registry of live driver sockets.
+
+    Each connection gets a small outbound queue drained by its own sender
+    task, so a slow client never blocks the caller pushing to it; a client
+    whose queue fills up is disconnected instead. A single sweeper task
+    enforces the heartbeat timeout for every connection and marks drivers
+    offline when they stay silent (or disconnected) for too long.
+
+    Connections are per worker, so each one writes a fresh session token to
+    the driver document; marking offline is conditional on that token, and
+    a driver who reconnected to another worker stays online.
+
+    `deliver_offer()` reaches a driver on any worker: offers for drivers
+    connected elsewhere go to the `driver_offers` collection, and every
+    worker polls it each `relay_interval` seconds for its own drivers,
+    claiming each offer once before sending it.
+    """
+
+    def __init__(
+        self,
+        heartbeat_timeout: float = 30.0,
+        queue_size: int = 32,
+        auth_timeout: float = 10.0,
+        relay_interval: float = 0.5
+    ):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.queue_size = queue_size
+        self.auth_timeout = auth_timeout
+        self.relay_interval = relay_interval
+        self._connections: Dict[str, DriverConnection] = {}
+        # driver_id -> (monotonic disconnect time, session of the closed connection)
+        self._disconnected_at: Dict[str, Tuple[float, str]] = {}
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._relay: Optional[asyncio.Task] = None
+        self.stats = {
+            "connected": 0,
+            "disconnected": 0,
+            "auth_failures": 0,
+            "frames_in": 0,
+            "frames_out": 0,
+            "bad_frames": 0,
+            "slow_consumer_disconnects": 0,
+            "heartbeat_timeouts": 0,
+            "marked_offline": 0,
+            "offers_relayed": 0,
+            "relayed_offers_delivered": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def is_connected(self, driver_id: str) -> bool:
+        return driver_id in self._connections
+
+    # Lifecycle
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+        if self._relay is None and self.relay_interval > 0:
+            self._relay = asyncio.create_task(self._run_relay())
+
+    async def stop(self):
+        for task in (self._sweeper, self._relay):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sweeper = self._relay = None
+        for connection in list(self._connections.values()):
+            await self._close(connection, 1001)
+
+    async def register(self, driver_id: str, websocket: WebSocket) -> DriverConnection:
+        previous = self._connections.get(driver_id)
+        if previous is not None:
+            await self._close(previous, CLOSE_REPLACED)
+
+        session = secrets.token_hex(8)
+        if self._db is not None:
+            await self._db.drivers.update_one(
+                {"id": driver_id},
+                {"$set": {"ws_session": session, "ws_connected_at": datetime.utcnow()}}
+            )
+        connection = DriverConnection(driver_id, session, websocket, self.queue_size)
+        connection.sender = asyncio.create_task(connection._send_loop())
+        self._connections[driver_id] = connection
+        self._disconnected_at.pop(driver_id, None)
+        self.stats["connected"] += 1
+        return connection
+
+    def unregister(self, connection: DriverConnection):
+        if connection.sender is not None:
+            connection.sender.cancel()
+        if self._connections.get(connection.driver_id) is connection:
+            del self._connections[connection.driver_id]
+            self._disconnected_at[connection.driver_id] = (time.monotonic(), connection.session)
+            self.stats["disconnected"] += 1
+
+    async def _close(self, connection: DriverConnection, code: int):
+        self.unregister(connection)
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    # Outbound
+
+    def send(self, driver_id: str, frame: list) -> bool:
+        """Queue a frame for a driver. Returns False if it could not be queued."""
+        connection = self._connections.get(driver_id)
+        if connection is None:
+            return False
+        try:
+            connection.queue.put_nowait(json.dumps(frame, separators=(",", ":"), default=str))
+        except asyncio.QueueFull:
+            self.stats["slow_consumer_disconnects"] += 1
+            asyncio.create_task(self._close(connection, CLOSE_SLOW_CONSUMER))
+            return False
+        self.stats["frames_out"] += 1
+        return True
+
+    def send_offer(self, driver_id: str, offer: Dict) -> bool:
+        return self.send(driver_id, [FRAME_OFFER, offer])
+
+    async def deliver_offer(self, driver_id: str, offer: Dict, ttl: float) -> bool:
+        """Offer a ride to a driver connected to any worker.
+
+        Returns False only when the offer certainly did not go out (the driver
+        is connected here but too slow); a relayed offer may still go unseen.
+        """
+        if driver_id in self._connections or self._db is None:
+            return self.send_offer(driver_id, offer)
+        await self._db.driver_offers.insert_one({
+            "ride_id": offer["ride_id"],
+            "driver_id": driver_id,
+            "offer": offer,
+            "delivered": False,
+            "expires_at": datetime.utcnow() + timedelta(seconds=ttl)
+        })
+        self.stats["offers_relayed"] += 1
+        return True
+
+    async def relay_once(self) -> int:
+        """Send offers relayed by the dispatching worker to drivers connected here"""
+        local: List[str] = list(self._connections)
+        delivered = 0
+        for start in range(0, len(local), RELAY_CHUNK):
+            offers = await self._db.driver_offers.find(
+                {"driver_id": {"$in": local[start:start + RELAY_CHUNK]}, "delivered": False,
+                 "expires_at": {"$gt": datetime.utcnow()}},
+                {"driver_id": 1, "offer": 1}
+            ).to_list(None)
+            for relayed in offers:
+                # Claim first: a driver who moved between workers gets it once
+                claimed = await self._db.driver_offers.update_one(
+                    {"_id": relayed["_id"], "delivered": False}, {"$set": {"delivered": True}}
+                )
+                if claimed.modified_count and self.send_offer(relayed["driver_id"], relayed["offer"]):
+                    delivered += 1
+        self.stats["relayed_offers_delivered"] += delivered
+        return delivered
+
+    async def _run_relay(self):
+        while True:
+            await asyncio.sleep(self.relay_interval)
+            if not self._connections:
+                continue
+            try:
+                await self.relay_once()
+            except Exception as e:
+                logger.error(f"Driver offer relay failed: {str(e)}")
+
+    # Inbound
+
+    @staticmethod
+    async def _receive(websocket: WebSocket) -> Optional[str]:
+        """Next text frame; None for a binary frame, which the protocol does not use"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return message.get("text")
+
+    async def _authenticate(self, websocket: WebSocket, db: AsyncIOMotorDatabase) -> Optional[str]:
+        try:
+            frame = json.loads(
+                await asyncio.wait_for(self._receive(websocket), timeout=self.auth_timeout)
+            )
+            kind, driver_id, token = frame
+            if kind != FRAME_AUTH:
+                return None
+            # The login token names the user; the driver must belong to it
+            claims = auth_tokens.verify(token)
+        except (asyncio.TimeoutError, ValueError, TypeError, AuthTokenError):
+            return None
+
+        driver = await db.drivers.find_one(
+            {"id": driver_id, "user_id": claims["sub"]},
+            {"_id": 0, "id": 1, "is_verified": 1}
+        )
+        if not driver or not driver.get("is_verified"):
+            return None
+        return driver_id
+
+    def _handle(self, connection: DriverConnection, frame: list):
+        if not isinstance(frame, list) or not frame:
+            raise ValueError("frame must be a non-empty array")
+        kind = frame[0]
+        if kind == FRAME_LOCATION:
+            latitude, longitude = float(frame[1]), float(frame[2])
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError("coordinates out of range")
+            if location_buffer.add(connection.driver_id, latitude, longitude):
+                driver_index.update_position(connection.driver_id, latitude, longitude)
+        elif kind == FRAME_PING:
+            self.send(connection.driver_id, [FRAME_PONG])
+        else:
+            raise ValueError(f"unknown frame type {kind!r}")
+
+    async def serve(self, websocket: WebSocket, db: AsyncIOMotorDatabase):
+        """Run one driver socket: authenticate once, then stream frames"""
+        await websocket.accept()
+        driver_id = await self._authenticate(websocket, db)
+        if driver_id is None:
+            self.stats["auth_failures"] += 1
+            await websocket.close(code=CLOSE_AUTH_FAILED)
+            return
+
+        connection = await self.register(driver_id, websocket)
+        self.send(driver_id, [FRAME_AUTH_OK, driver_id])
+        try:
+            while True:
+                message = await self._receive(websocket)
+                connection.last_seen = time.monotonic()
+                self.stats["frames_in"] += 1
+                try:
+                    if message is None:
+                        raise ValueError("binary frames are not supported")
+                    self._handle(connection, json.loads(message))
+                except (ValueError, TypeError, IndexError) as e:
+                    self.stats["bad_frames"] += 1
+                    self.send(driver_id, [FRAME_ERROR, str(e)])
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.unregister(connection)
+
+    # Heartbeats
+
+    async def _mark_offline(self, driver_id: str, session: str):
+        if self._db is None:
+            driver_index.remove(driver_id)
+            return
+        # No match once the driver has reconnected (a new session), here or on another worker
+        result = await self._db.drivers.update_one(
+            {"id": driver_id, "is_online": True, "ws_session": session},
+            {"$set": {"is_online": False, "status_updated_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            driver_index.remove(driver_id)
+            self.stats["marked_offline"] += 1
+            await stats_rollup.driver_online_changed(self._db, False)
+
+    async def _sweep(self):
+        interval = max(self.heartbeat_timeout / 3, 0.5)
+        while True:
+            await asyncio.sleep(interval)
+            deadline = time.monotonic() - self.heartbeat_timeout
+            try:
+                for connection in list(self._connections.values()):
+                    if connection.last_seen < deadline:
+                        self.stats["heartbeat_timeouts"] += 1
+                        await self._close(connection, CLOSE_HEARTBEAT_TIMEOUT)
+                        self._disconnected_at.pop(connection.driver_id, None)
+                        await self._mark_offline(connection.driver_id, connection.session)
+                for driver_id, (since, session) in list(self._disconnected_at.items()):
+                    if since < deadline:
+                        del self._disconnected_at[driver_id]
+                        await self._mark_offline(driver_id, session)
+            except Exception as e:
+                logger.error(f"Driver heartbeat sweep failed: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "open": len(self._connections),
+            "awaiting_reconnect": len(self._disconnected_at),
+            "heartbeat_timeout": self.heartbeat_timeout,
+            "queue_size": self.queue_size
+        }
+
+
+connection_manager = DriverConnectionManager(
+    heartbeat_timeout=float(os.environ.get("DRIVER_WS_HEARTBEAT_TIMEOUT_SECONDS", 30)),
+    queue_size=int(os.environ.get("DRIVER_WS_QUEUE_SIZE", 32)),
+    auth_timeout=float(os.environ.get("DRIVER_WS_AUTH_TIMEOUT_SECONDS", 10)),
+    relay_interval=float(os.environ.get("DRIVER_WS_RELAY_INTERVAL_SECONDS", 0.5))
+)
@@ -0,0 +1,394 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import os
+import logging
+import numpy as np
+
+from services.geo_service import haversine_km
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.32
+
+# Driver fields the index needs
+INDEX_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "user_id": 1,
+    "vehicle_type": 1,
+    "is_online": 1,
+    "is_verified": 1,
+    "current_location": 1
+}
+
+
+class DriverSpatialIndex:
+    """In-process uniform-grid index of online, verified drivers.
+
+    Positions live in flat NumPy arrays addressed by slot number; each grid
+    cell keeps a list of slots so a driver moves between cells in O(1).
+    Queries gather the slots of the cells overlapping the search box and
+    compute exact distances for all candidates in one vectorised call.
+
+    The index is per worker process. MongoDB remains the durable copy: it
+    rebuilds the index on startup, and every `refresh_interval` seconds the
+    drivers whose position or online/verified status changed (through any
+    worker) are re-read, so positions reported to other workers show up
+    within about one interval plus the location flush interval.
+    """
+
+    def __init__(
+        self,
+        cell_size_km: float = 1.0,
+        initial_capacity: int = 1024,
+        refresh_interval: float = 2.0,
+        refresh_lag: float = 10.0
+    ):
+        self.cell_deg = cell_size_km / KM_PER_DEGREE
+        self._stride = int(360 / self.cell_deg) + 2
+        self.ready = False
+        self.refresh_interval = refresh_interval
+        # Re-read this far behind the last refresh: pings reach MongoDB up to a
+        # flush interval after they were recorded
+        self.refresh_lag = refresh_lag
+        self._refreshed_at = datetime.utcnow()
+        self._task: Optional[asyncio.Task] = None
+
+        self._lat = np.zeros(initial_capacity, dtype=np.float64)
+        self._lon = np.zeros(initial_capacity, dtype=np.float64)
+        self._vehicle = np.zeros(initial_capacity, dtype=np.int32)
+        self._cell = np.zeros(initial_capacity, dtype=np.int64)
+        self._pos = np.zeros(initial_capacity, dtype=np.int64)
+        self._ids: List[Optional[str]] = [None] * initial_capacity
+        self._user_ids: List[Optional[str]] = [None] * initial_capacity
+
+        self._slot_of: Dict[str, int] = {}
+        self._free: List[int] = list(range(initial_capacity - 1, -1, -1))
+        self._cells: Dict[int, List[int]] = {}
+
+        self._vehicle_codes: Dict[str, int] = {}
+        self._vehicle_names: List[str] = []
+
+        # Online drivers that have not reported a position yet
+        self._pending: Dict[str, Tuple[Optional[str], str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._slot_of or driver_id in self._pending
+
+    # Storage helpers
+
+    def _grow(self):
+        old = len(self._lat)
+        new = old * 2
+        for name in ("_lat", "_lon", "_vehicle", "_cell", "_pos"):
+            array = getattr(self, name)
+            grown = np.zeros(new, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self._ids.extend([None] * old)
+        self._user_ids.extend([None] * old)
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _vehicle_code(self, vehicle_type: str) -> int:
+        code = self._vehicle_codes.get(vehicle_type)
+        if code is None:
+            code = len(self._vehicle_names)
+            self._vehicle_codes[vehicle_type] = code
+            self._vehicle_names.append(vehicle_type)
+        return code
+
+    def _cell_key(self, latitude: float, longitude: float) -> int:
+        return (
+            math.floor(latitude / self.cell_deg) * self._stride
+            + math.floor(longitude / self.cell_deg)
+        )
+
+    def _cell_add(self, slot: int, key: int):
+        members = self._cells.get(key)
+        if members is None:
+            members = self._cells[key] = []
+        self._cell[slot] = key
+        self._pos[slot] = len(members)
+        members.append(slot)
+
+    def _cell_remove(self, slot: int):
+        key = int(self._cell[slot])
+        members = self._cells[key]
+        index = int(self._pos[slot])
+        last = members.pop()
+        if last != slot:
+            members[index] = last
+            self._pos[last] = index
+        if not members:
+            del self._cells[key]
+
+    # Mutations
+
+    def upsert(
+        self,
+        driver_id: str,
+        vehicle_type: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        user_id: Optional[str] = None
+    ):
+        """Add an online driver, or refresh one already indexed"""
+        if latitude is None or longitude is None:
+            if driver_id not in self._slot_of:
+                self._pending[driver_id] = (user_id, vehicle_type)
+            return
+
+        self._pending.pop(driver_id, None)
+        slot = self._slot_of.get(driver_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slot_of[driver_id] = slot
+            self._ids[slot] = driver_id
+        else:
+            self._cell_remove(slot)
+
+        self._user_ids[slot] = user_id
+        self._vehicle[slot] = self._vehicle_code(vehicle_type)
+        self._lat[slot] = latitude
+        self._lon[slot] = longitude
+        self._cell_add(slot, self._cell_key(latitude, longitude))
+
+    def update_position(self, driver_id: str, latitude: float, longitude: float) -> bool:
+        """Move an indexed driver. Returns False if the driver is not online."""
+        slot = self._slot_of.get(driver_id)
+        if slot is None:
+            pending = self._pending.get(driver_id)
+            if pending is None:
+                return False
+            user_id, vehicle_type = pending
+            self.upsert(driver_id, vehicle_type, latitude, longitude, user_id)
+            return True
+
+        key = self._cell_key(latitude, longitude)
+        if key != self._cell[slot]:
+            self._cell_remove(slot)
+            self._cell_add(slot, key)
+        self._lat[slot] = latitude
+        self._lon[slot] = longitude
+        return True
+
+    def remove(self, driver_id: str):
+        self._pending.pop(driver_id, None)
+        slot = self._slot_of.pop(driver_id, None)
+        if slot is None:
+            return
+        self._cell_remove(slot)
+        self._ids[slot] = None
+        self._user_ids[slot] = None
+        self._free.append(slot)
+
+    def sync(self, doc: Dict):
+        """Index or drop a driver according to its document's online/verified flags"""
+        if not (doc.get("is_online") and doc.get("is_verified")):
+            self.remove(doc["id"])
+            return
+        location = doc.get("current_location") or {}
+        coordinates = location.get("coordinates") or (None, None)
+        self.upsert(
+            doc["id"],
+            doc["vehicle_type"],
+            latitude=coordinates[1],
+            longitude=coordinates[0],
+            user_id=doc.get("user_id")
+        )
+
+    def clear(self):
+        task = self._task
+        self.__init__(
+            cell_size_km=self.cell_deg * KM_PER_DEGREE,
+            refresh_interval=self.refresh_interval,
+            refresh_lag=self.refresh_lag
+        )
+        self._task = task
+
+    # Queries
+
+    def _candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+        lon_span = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        min_row = math.floor((latitude - lat_span) / self.cell_deg)
+        max_row = math.floor((latitude + lat_span) / self.cell_deg)
+        min_col = math.floor((longitude - lon_span) / self.cell_deg)
+        max_col = math.floor((longitude + lon_span) / self.cell_deg)
+
+        slots: List[int] = []
+        cells = self._cells
+        for row in range(min_row, max_row + 1):
+            base = row * self._stride
+            for col in range(min_col, max_col + 1):
+                members = cells.get(base + col)
+                if members:
+                    slots.extend(members)
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def _query(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        vehicle_type: Optional[str],
+        limit: Optional[int]
+    ) -> List[Tuple[str, float]]:
+        slots = self._candidates(latitude, longitude, radius_km)
+        if vehicle_type is not None:
+            code = self._vehicle_codes.get(vehicle_type)
+            if code is None:
+                return []
+            slots = slots[self._vehicle[slots] == code]
+        if not len(slots):
+            return []
+
+        distances = haversine_km(latitude, longitude, self._lat[slots], self._lon[slots])
+        inside = distances <= radius_km
+        slots, distances = slots[inside], distances[inside]
+
+        if limit is not None and limit < len(slots):
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            slots, distances = slots[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+
+        ids = self._ids
+        return [(ids[slots[i]], float(distances[i])) for i in order]
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        vehicle_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """(driver_id, distance_km) pairs within radius_km, nearest first.
+
+        With a limit the search starts at one cell and doubles outwards: once
+        a smaller circle holds `limit` drivers they are the nearest overall,
+        so dense areas never scan the full radius.
+        """
+        if limit is not None:
+            radius = self.cell_deg * KM_PER_DEGREE
+            while radius < radius_km:
+                found = self._query(latitude, longitude, radius, vehicle_type, limit)
+                if len(found) >= limit:
+                    return found
+                radius *= 2
+        return self._query(latitude, longitude, radius_km, vehicle_type, limit)
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_radius_km: float = 50.0,
+        vehicle_type: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """k nearest drivers no further than max_radius_km"""
+        return self.within_radius(latitude, longitude, max_radius_km, vehicle_type, limit=k)
+
+    def describe(self, driver_id: str) -> Optional[Dict]:
+        """Index entry for a driver in the same shape the nearby search returns"""
+        slot = self._slot_of.get(driver_id)
+        if slot is None:
+            return None
+        return {
+            "id": driver_id,
+            "user_id": self._user_ids[slot],
+            "vehicle_type": self._vehicle_names[self._vehicle[slot]],
+            "current_location": {
+                "type": "Point",
+                "coordinates": [float(self._lon[slot]), float(self._lat[slot])]
+            }
+        }
+
+    def vehicle_code(self, vehicle_type: str) -> int:
+        """Code used in the arrays returned by positions(); -1 if no such vehicle is indexed"""
+        return self._vehicle_codes.get(vehicle_type, -1)
+
+    def positions(self, driver_ids: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Latitude, longitude and vehicle-code arrays for indexed drivers, in the given order"""
+        slots = np.fromiter(
+            (self._slot_of[d] for d in driver_ids), dtype=np.int64, count=len(driver_ids)
+        )
+        return self._lat[slots], self._lon[slots], self._vehicle[slots]
+
+    async def rebuild(self, db: AsyncIOMotorDatabase):
+        """Reload every online, verified driver from MongoDB"""
+        self.clear()
+        self._refreshed_at = datetime.utcnow()
+        cursor = db.drivers.find(
+            {"is_online": True, "is_verified": True},
+            INDEX_PROJECTION
+        ).batch_size(5000)
+        async for doc in cursor:
+            self.sync(doc)
+        self.ready = True
+        logger.info(
+            f"Driver index rebuilt: {len(self)} positioned, {len(self._pending)} awaiting location"
+        )
+
+    async def refresh(self, db: AsyncIOMotorDatabase, local: Optional[Callable[[str], bool]] = None) -> int:
+        """Re-sync drivers changed in MongoDB since the last refresh; returns how many.
+
+        `local(driver_id)` is true for drivers with a position queued by this
+        worker that is not stored yet; their indexed position is kept.
+        """
+        started = datetime.utcnow()
+        since = self._refreshed_at - timedelta(seconds=self.refresh_lag)
+        cursor = db.drivers.find(
+            {"$or": [
+                {"location_updated_at": {"$gt": since}},
+                {"status_updated_at": {"$gt": since}}
+            ]},
+            INDEX_PROJECTION
+        ).batch_size(5000)
+        changed = 0
+        async for doc in cursor:
+            fresher_here = local is not None and local(doc["id"]) and doc["id"] in self._slot_of
+            if fresher_here and doc.get("is_online") and doc.get("is_verified"):
+                continue
+            self.sync(doc)
+            changed += 1
+        self._refreshed_at = started
+        return changed
+
+    async def _run(self, db: AsyncIOMotorDatabase, local: Optional[Callable[[str], bool]]):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(db, local)
+            except Exception as e:
+                logger.error(f"Driver index refresh failed: {str(e)}")
+
+    def start(self, db: AsyncIOMotorDatabase, local: Optional[Callable[[str], bool]] = None):
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._run(db, local))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+driver_index = DriverSpatialIndex(
+    cell_size_km=float(os.environ.get("DRIVER_INDEX_CELL_KM", 1.0)),
+    refresh_interval=float(os.environ.get("DRIVER_INDEX_REFRESH_SECONDS", 2.0)),
+    refresh_lag=float(os.environ.get("DRIVER_INDEX_REFRESH_LAG_SECONDS", 10.0))
+)
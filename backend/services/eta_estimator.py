@@ -0,0 +1,358 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+import asyncio
+import os
+import time
+import logging
+import numpy as np
+
+from models import Location, RideStatus, TripType
+from services.geo_service import haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Pickups are assigned to the nearest city centre within its radius
+CITIES = [
+    {"name": "delhi", "latitude": 28.6139, "longitude": 77.2090, "radius_km": 25.0},
+    {"name": "gurugram", "latitude": 28.4595, "longitude": 77.0266, "radius_km": 15.0},
+    {"name": "noida", "latitude": 28.5355, "longitude": 77.3910, "radius_km": 15.0},
+    {"name": "ghaziabad", "latitude": 28.6692, "longitude": 77.4538, "radius_km": 12.0},
+    {"name": "faridabad", "latitude": 28.4089, "longitude": 77.3178, "radius_km": 12.0},
+]
+
+# Used until enough completed rides have been seen: road km per straight-line km,
+# and average speed (km/h) per local hour with morning and evening peaks
+DEFAULT_CIRCUITY = 1.35
+DEFAULT_SPEED_KMH = np.array([
+    32, 32, 32, 32, 32, 30, 28, 24, 18, 18, 19, 22,
+    22, 22, 22, 21, 20, 17, 17, 17, 18, 22, 26, 30
+], dtype=np.float64)
+
+# Samples outside these bounds are GPS glitches or meter errors, not traffic
+MIN_SAMPLE_STRAIGHT_KM = 0.5
+SAMPLE_CIRCUITY_RANGE = (1.0, 4.0)
+SAMPLE_SPEED_RANGE_KMH = (3.0, 110.0)
+
+
+class ETAEstimator:
+    """Road distance and trip duration between pickup and drop points.
+
+    distance = haversine(pickup, drop) * circuity[city]
+    duration = distance / speed[city, local hour of departure]
+
+    The city is the nearest entry of CITIES within its radius of the pickup
+    (else a catch-all bucket). Every step is a NumPy array operation, so a
+    batch of pairs costs about the same per pair as a single one.
+
+    `fit()` learns circuity (median road/straight ratio) per city and speed
+    (median km/h) per city and hour from the last `window_days` of completed
+    rides. Buckets with fewer than `min_samples` rides fall back to all
+    cities for that hour, then to the defaults. The server refits every
+    `refit_interval` seconds.
+
+    Estimates also check bookings and completions. A client-supplied
+    distance or duration further than `tolerance` times off the estimate
+    is replaced. A completion faster than `max_speed_kmh` still completes
+    but is billed a clamped distance; one shorter than the straight line or
+    over `flag_ratio` times the estimate is billed as read. All of these
+    are flagged for review.
+    """
+
+    def __init__(
+        self,
+        tz: str = "Asia/Kolkata",
+        cities: Sequence[Dict] = CITIES,
+        window_days: int = 60,
+        max_samples: int = 200000,
+        min_samples: int = 30,
+        refit_interval: float = 6 * 3600.0,
+        tolerance: float = 1.5,
+        flag_ratio: float = 3.0,
+        max_speed_kmh: float = 110.0
+    ):
+        self.tz = ZoneInfo(tz)
+        self.cities = [city["name"] for city in cities]
+        self.city_lat = np.array([city["latitude"] for city in cities], dtype=np.float64)
+        self.city_lon = np.array([city["longitude"] for city in cities], dtype=np.float64)
+        self.city_radius = np.array([city["radius_km"] for city in cities], dtype=np.float64)
+        self.window_days = window_days
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.refit_interval = refit_interval
+        self.tolerance = tolerance
+        self.flag_ratio = flag_ratio
+        self.max_speed_kmh = max_speed_kmh
+        # One row per city plus the catch-all bucket at the end
+        buckets = len(self.cities) + 1
+        self.circuity = np.full(buckets, DEFAULT_CIRCUITY)
+        self.speed = np.tile(DEFAULT_SPEED_KMH, (buckets, 1))
+        self.samples = np.zeros((buckets, 24), dtype=np.int64)
+        self.fitted_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "fits": 0,
+            "fit_failures": 0,
+            "fit_seconds": None,
+            "bookings_corrected": 0,
+            "completions_flagged": 0,
+            "completions_clamped": 0
+        }
+
+    # Estimates
+
+    def local_hour(self, moment: Optional[datetime] = None) -> int:
+        """Local hour of a naive UTC (or aware) datetime; now if None"""
+        moment = moment or datetime.utcnow()
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.astimezone(self.tz).hour
+
+    def city_of(self, latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+        """Bucket index per point: nearest city within its radius, else the catch-all"""
+        latitude = np.asarray(latitude, dtype=np.float64).reshape(-1, 1)
+        longitude = np.asarray(longitude, dtype=np.float64).reshape(-1, 1)
+        distance = haversine_km(latitude, longitude, self.city_lat, self.city_lon)
+        nearest = np.argmin(distance, axis=1)
+        inside = distance[np.arange(len(nearest)), nearest] <= self.city_radius[nearest]
+        return np.where(inside, nearest, len(self.cities))
+
+    def estimate(
+        self,
+        pickup_lat,
+        pickup_lon,
+        drop_lat,
+        drop_lon,
+        hour=None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Road km and minutes for arrays of pickup/drop coordinates.
+
+        hour is the local departure hour, a scalar or an array per pair
+        (default: now). Returns two float64 arrays of the pairs' length.
+        """
+        pickup_lat = np.asarray(pickup_lat, dtype=np.float64).ravel()
+        pickup_lon = np.asarray(pickup_lon, dtype=np.float64).ravel()
+        straight = haversine_km(pickup_lat, pickup_lon, drop_lat, drop_lon)
+        city = self.city_of(pickup_lat, pickup_lon)
+        if hour is None:
+            hour = self.local_hour()
+        hour = np.broadcast_to(np.asarray(hour, dtype=np.int64) % 24, city.shape)
+        distance = straight * self.circuity[city]
+        minutes = distance / self.speed[city, hour] * 60
+        return distance, minutes
+
+    def estimate_one(
+        self,
+        pickup: Location,
+        drop: Location,
+        departure: Optional[datetime] = None
+    ) -> Tuple[float, int]:
+        """(road km rounded to 0.1, whole minutes, at least 1) for one trip"""
+        distance, minutes = self.estimate(
+            pickup.latitude, pickup.longitude, drop.latitude, drop.longitude, self.local_hour(departure)
+        )
+        return round(float(distance[0]), 1), max(1, int(np.ceil(minutes[0])))
+
+    # Checks
+
+    def _off(self, value: float, estimate: float, slack: float) -> bool:
+        return value > estimate * self.tolerance + slack or value < estimate / self.tolerance - slack
+
+    def review_booking(
+        self,
+        pickup: Location,
+        drop: Location,
+        trip_type: TripType,
+        distance: Optional[float],
+        duration: Optional[int]
+    ) -> Tuple[float, int, List[str]]:
+        """Fill in a missing distance/duration and replace implausible ones.
+
+        Returns (distance, duration, corrections) where corrections names
+        each replaced or filled value, e.g. ["distance_replaced"].
+        """
+        estimated_distance, estimated_duration = self.estimate_one(pickup, drop)
+        corrections = []
+        # Rentals have no fixed route: the client's figures are only filled in, never replaced
+        checked = not trip_type.startswith("rental")
+        if distance is None:
+            distance = estimated_distance
+            corrections.append("distance_filled")
+        elif checked and self._off(distance, estimated_distance, slack=1.0):
+            distance = estimated_distance
+            corrections.append("distance_replaced")
+        if duration is None:
+            duration = estimated_duration
+            corrections.append("duration_filled")
+        elif checked and self._off(duration, estimated_duration, slack=5.0):
+            duration = estimated_duration
+            corrections.append("duration_replaced")
+        if corrections:
+            self.stats["bookings_corrected"] += 1
+        return distance, duration, corrections
+
+    def review_completion(self, ride, actual_distance: float, actual_duration: int) -> Tuple[float, int, List[str]]:
+        """Billable distance and duration for a completion.
+
+        Returns (distance, duration, flags). Implausible readings never block
+        the completion; they are flagged for review, e.g. ["speed_above_max"].
+        Only an over-counted distance is clamped: a meter below the estimate
+        is billed as read. Raises ValueError only for negative readings.
+        """
+        if actual_distance < 0 or actual_duration < 0:
+            raise ValueError("Distance and duration cannot be negative")
+        distance, duration = actual_distance, actual_duration
+        flags = []
+        if distance / self.max_speed_kmh * 60 > duration + 1:
+            # The meter over-counted: bill what max speed covers in the time taken
+            distance = round(self.max_speed_kmh * (duration + 1) / 60, 1)
+            flags.append("speed_above_max")
+
+        if not ride.trip_type.startswith("rental"):
+            pickup, drop = ride.pickup_location, ride.drop_location
+            straight = float(haversine_km(pickup.latitude, pickup.longitude, drop.latitude, drop.longitude))
+            legs = 2 if ride.trip_type == TripType.ROUND_TRIP else 1
+            estimated_distance, estimated_duration = self.estimate_one(pickup, drop, ride.started_at)
+            if straight >= MIN_SAMPLE_STRAIGHT_KM and distance < 0.9 * legs * straight:
+                # Dropped early or a bad meter; billed as read, never above it
+                flags.append("distance_below_straight_line")
+            if distance > legs * estimated_distance * self.flag_ratio + 2:
+                flags.append("distance_above_estimate")
+            if duration > legs * estimated_duration * self.flag_ratio + 15:
+                flags.append("duration_above_estimate")
+
+        if flags:
+            self.stats["completions_flagged"] += 1
+        if (distance, duration) != (actual_distance, actual_duration):
+            self.stats["completions_clamped"] += 1
+        return distance, duration, flags
+
+    # Learning
+
+    def fit_samples(self, pickup_lat, pickup_lon, drop_lat, drop_lon, distance, duration, hour) -> int:
+        """Refit circuity and speed profiles from completed trips; returns the samples used"""
+        distance = np.asarray(distance, dtype=np.float64)
+        duration = np.asarray(duration, dtype=np.float64)
+        hour = np.asarray(hour, dtype=np.int64) % 24
+        straight = haversine_km(pickup_lat, pickup_lon, drop_lat, drop_lon)
+        city = self.city_of(pickup_lat, pickup_lon)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = distance / straight
+            speed = distance / duration * 60
+        usable = (
+            (straight >= MIN_SAMPLE_STRAIGHT_KM)
+            & (ratio >= SAMPLE_CIRCUITY_RANGE[0]) & (ratio <= SAMPLE_CIRCUITY_RANGE[1])
+            & (speed >= SAMPLE_SPEED_RANGE_KMH[0]) & (speed <= SAMPLE_SPEED_RANGE_KMH[1])
+        )
+        ratio, speed, city, hour = ratio[usable], speed[usable], city[usable], hour[usable]
+
+        buckets = len(self.cities) + 1
+        circuity = np.full(buckets, DEFAULT_CIRCUITY)
+        speeds = np.tile(DEFAULT_SPEED_KMH, (buckets, 1))
+        samples = np.zeros((buckets, 24), dtype=np.int64)
+        np.add.at(samples, (city, hour), 1)
+
+        # All cities together: the fallback for thin buckets
+        overall_circuity = np.median(ratio) if len(ratio) >= self.min_samples else DEFAULT_CIRCUITY
+        overall_speed = DEFAULT_SPEED_KMH.copy()
+        for h in range(24):
+            in_hour = hour == h
+            if np.count_nonzero(in_hour) >= self.min_samples:
+                overall_speed[h] = np.median(speed[in_hour])
+
+        for bucket in range(buckets):
+            in_city = city == bucket
+            if np.count_nonzero(in_city) >= self.min_samples:
+                circuity[bucket] = np.median(ratio[in_city])
+            else:
+                circuity[bucket] = overall_circuity
+            for h in range(24):
+                if samples[bucket, h] >= self.min_samples:
+                    speeds[bucket, h] = np.median(speed[in_city & (hour == h)])
+                else:
+                    speeds[bucket, h] = overall_speed[h]
+
+        self.circuity, self.speed, self.samples = circuity, speeds, samples
+        self.fitted_at = datetime.utcnow()
+        return int(len(ratio))
+
+    async def fit(self, db: AsyncIOMotorDatabase) -> int:
+        """Refit from recent completed rides that recorded their actual distance and duration"""
+        started = time.perf_counter()
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        rides = await db.rides.find(
+            {
+                "status": RideStatus.COMPLETED,
+                "completed_at": {"$gte": since},
+                # Round trips and rentals do not follow the pickup -> drop line
+                "trip_type": TripType.ONE_WAY,
+                "actual_distance": {"$gt": 0},
+                "actual_duration": {"$gt": 0}
+            },
+            {
+                "_id": 0, "pickup_location": 1, "drop_location": 1,
+                "actual_distance": 1, "actual_duration": 1, "started_at": 1, "created_at": 1
+            }
+        ).sort("completed_at", -1).limit(self.max_samples).to_list(self.max_samples)
+
+        used = self.fit_samples(
+            [ride["pickup_location"]["latitude"] for ride in rides],
+            [ride["pickup_location"]["longitude"] for ride in rides],
+            [ride["drop_location"]["latitude"] for ride in rides],
+            [ride["drop_location"]["longitude"] for ride in rides],
+            [ride["actual_distance"] for ride in rides],
+            [ride["actual_duration"] for ride in rides],
+            [self.local_hour(ride.get("started_at") or ride["created_at"]) for ride in rides]
+        )
+        self.stats["fits"] += 1
+        self.stats["fit_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"ETA profiles fitted from {used} of {len(rides)} completed rides")
+        return used
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                await self.fit(db)
+            except Exception as e:
+                self.stats["fit_failures"] += 1
+                logger.error(f"ETA profile fit failed: {str(e)}")
+            await asyncio.sleep(self.refit_interval)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None and self.refit_interval > 0:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        names = self.cities + ["other"]
+        return {
+            **self.stats,
+            "fitted_at": self.fitted_at,
+            "cities": {
+                name: {
+                    "circuity": round(float(self.circuity[i]), 3),
+                    "speed_kmh": [round(float(v), 1) for v in self.speed[i]],
+                    "samples": int(self.samples[i].sum())
+                }
+                for i, name in enumerate(names)
+            }
+        }
+
+
+eta_estimator = ETAEstimator(
+    tz=os.environ.get("ETA_TIMEZONE", "Asia/Kolkata"),
+    window_days=int(os.environ.get("ETA_WINDOW_DAYS", 60)),
+    min_samples=int(os.environ.get("ETA_MIN_SAMPLES", 30)),
+    refit_interval=float(os.environ.get("ETA_REFIT_INTERVAL_SECONDS", 6 * 3600)),
+    tolerance=float(os.environ.get("ETA_TOLERANCE", 1.5)),
+    flag_ratio=float(os.environ.get("ETA_FLAG_RATIO", 3.0))
+)
@@ -0,0 +1,82 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+import numpy as np
+
+from models import TripType
+from services.pricing_cache import PricingTable
+
+TRIP_TYPES: List[str] = [trip_type.value for trip_type in TripType]
+
+# Upper bound on routes per API request; offline jobs call FareMatrix directly
+MAX_QUOTE_ROUTES = int(os.environ.get("FARE_QUOTE_MAX_ROUTES", 10000))
+
+
+class FareMatrix:
+    """Pricing table flattened into arrays for vectorised fare quotes.
+
+    Computes the same expression as BillGenerator.calculate_fare in the same
+    order and in float64, so every element equals the scalar result exactly:
+
+        max((base + distance * per_km + duration * per_min) * multiplier, minimum)
+    """
+
+    def __init__(self, table: PricingTable):
+        self.version = table.version
+        self.vehicle_types: List[str] = sorted(table.vehicles)
+        self.trip_types = TRIP_TYPES
+        pricing = [table.vehicles[name] for name in self.vehicle_types]
+        self.base = np.array([p.base_price for p in pricing], dtype=np.float64)
+        self.per_km = np.array([p.price_per_km for p in pricing], dtype=np.float64)
+        self.per_min = np.array([p.price_per_min for p in pricing], dtype=np.float64)
+        self.minimum = np.array([p.minimum_fare for p in pricing], dtype=np.float64)
+        # (vehicles, trip types); the table already resolved every trip type
+        self.multipliers = np.array(
+            [[p.trip_multipliers[trip] for trip in self.trip_types] for p in pricing],
+            dtype=np.float64
+        ).reshape(len(pricing), len(self.trip_types))
+
+    def select(self, vehicle_types: Optional[Sequence[str]]) -> np.ndarray:
+        """Row indices for the requested vehicle types (all if None)"""
+        if vehicle_types is None:
+            return np.arange(len(self.vehicle_types))
+        positions = {name: i for i, name in enumerate(self.vehicle_types)}
+        missing = [name for name in vehicle_types if name not in positions]
+        if missing:
+            raise KeyError(", ".join(missing))
+        return np.array([positions[name] for name in vehicle_types], dtype=np.int64)
+
+    def quote(
+        self,
+        distance: np.ndarray,
+        duration: np.ndarray,
+        vehicle_types: Optional[Sequence[str]] = None
+    ) -> Tuple[List[str], np.ndarray]:
+        """Fares for routes x vehicle types x trip types.
+
+        distance and duration are 1-D arrays of equal length (km, minutes).
+        Returns the vehicle type labels and a float64 array of shape
+        (routes, vehicles, trip types); trip types follow TRIP_TYPES.
+        """
+        rows = self.select(vehicle_types)
+        distance = np.asarray(distance, dtype=np.float64).reshape(-1, 1)
+        duration = np.asarray(duration, dtype=np.float64).reshape(-1, 1)
+
+        # (routes, vehicles): same association order as calculate_fare
+        subtotal = self.base[rows] + distance * self.per_km[rows]
+        subtotal += duration * self.per_min[rows]
+
+        # (routes, vehicles, trip types), minimum applied in place
+        fares = subtotal[:, :, np.newaxis] * self.multipliers[rows][np.newaxis, :, :]
+        np.maximum(fares, self.minimum[rows][np.newaxis, :, np.newaxis], out=fares)
+        return [self.vehicle_types[i] for i in rows], fares
+
+
+_compiled: Dict[str, object] = {"table": None, "matrix": None}
+
+
+def fare_matrix(table: PricingTable) -> FareMatrix:
+    """FareMatrix for a pricing table, compiled once per loaded table"""
+    if _compiled["table"] is not table:
+        _compiled["matrix"] = FareMatrix(table)
+        _compiled["table"] = table
+    return _compiled["matrix"]
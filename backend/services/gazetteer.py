@@ -0,0 +1,209 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLACES_PATH = Path(__file__).resolve().parent.parent / "data" / "places_delhi_ncr.json"
+
+# Latin letters, digits and the Devanagari block survive; everything else separates words
+_SEPARATORS = re.compile(r"[^0-9a-z\u0900-\u097f]+")
+# Nukta: "ज़" and "ज" are typed interchangeably
+_NUKTA = "\u093c"
+
+ABBREVIATIONS = {
+    "sec": "sector",
+    "sect": "sector",
+    "stn": "station",
+    "rly": "railway",
+    "rd": "road",
+    "mkt": "market",
+    "ngr": "nagar",
+    "center": "centre",
+    "chk": "chowk",
+    "apt": "airport"
+}
+
+# Terminal marker in trie nodes: the node completes (key, place index)
+_END = ""
+
+
+def normalize(text: str) -> str:
+    """Lowercase, NFKC-fold and split on punctuation; expands common abbreviations"""
+    text = unicodedata.normalize("NFKC", text).lower().replace(_NUKTA, "")
+    return " ".join(ABBREVIATIONS.get(token, token) for token in _SEPARATORS.sub(" ", text).split())
+
+
+def _max_distance(key: str) -> int:
+    # Short names tolerate no typos ("gk" vs "ggn"), long ones two
+    if len(key) < 4:
+        return 0
+    return 1 if len(key) < 8 else 2
+
+
+class Gazetteer:
+    """Offline lookup of known places by name, alias or a misspelling of either.
+
+    Every normalised name and alias goes into an exact-match dict and a
+    character trie. `resolve()` looks for an exact hit on any word span,
+    longest first, then repeats the scan with a bounded edit-distance walk
+    of the trie (1 edit for spans under 8 characters, 2 above), so
+    "conaught place gate 2" finds Connaught Place; failing that, the best
+    key starting with the text ("akshar") is taken. Ties go to the place
+    with the higher `weight`. Results are memoised per normalised text, so
+    repeated phrases cost one dict lookup.
+    """
+
+    def __init__(self, places: Iterable[Dict], cache_size: int = 50000):
+        self.places: List[Dict] = []
+        self._exact: Dict[str, int] = {}
+        self._root: Dict = {}
+        self._longest = 0
+        for place in places:
+            index = len(self.places)
+            self.places.append({
+                "name": place["name"],
+                "latitude": place["lat"],
+                "longitude": place["lon"],
+                "kind": place.get("kind", "place"),
+                "weight": place.get("weight", 1)
+            })
+            for name in [place["name"], *place.get("aliases", [])]:
+                self._add(normalize(name), index)
+        self._resolve = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "Gazetteer":
+        path = Path(path or os.environ.get("GAZETTEER_PATH") or DEFAULT_PLACES_PATH)
+        try:
+            with open(path, encoding="utf-8") as f:
+                places = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load gazetteer {path}: {str(e)}")
+            places = []
+        return cls(places)
+
+    def _add(self, key: str, index: int):
+        if not key:
+            return
+        current = self._exact.get(key)
+        if current is not None and self.places[current]["weight"] >= self.places[index]["weight"]:
+            return
+        self._exact[key] = index
+        self._longest = max(self._longest, len(key))
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[_END] = (key, index)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    # Matching
+
+    def _fuzzy(self, word: str, max_distance: int) -> Optional[Tuple[int, str, int]]:
+        """Closest trie key within max_distance edits as (distance, key, place index)"""
+        best = None
+        columns = len(word) + 1
+        # Levenshtein rows, one per trie depth; only the diagonal band of
+        # width 2 * max_distance + 1 can stay within budget, the rest is capped
+        over = max_distance + 1
+        first = [min(column, over) for column in range(columns)]
+        stack = [(char, child, first, 1) for char, child in self._root.items() if char != _END]
+        while stack:
+            char, node, previous, depth = stack.pop()
+            row = [over] * columns
+            row[0] = min(depth, over)
+            low, high = max(1, depth - max_distance), min(columns, depth + over)
+            lowest = row[0]
+            for column in range(low, high):
+                cost = min(
+                    row[column - 1] + 1,
+                    previous[column] + 1,
+                    previous[column - 1] + (word[column - 1] != char)
+                )
+                row[column] = cost
+                if cost < lowest:
+                    lowest = cost
+            terminal = node.get(_END)
+            if terminal is not None and row[-1] <= max_distance:
+                candidate = (row[-1], -self.places[terminal[1]]["weight"], terminal[0], terminal[1])
+                if best is None or candidate < best:
+                    best = candidate
+            if lowest <= max_distance:
+                stack.extend(
+                    (next_char, child, row, depth + 1) for next_char, child in node.items() if next_char != _END
+                )
+        return None if best is None else (best[0], best[2], best[3])
+
+    def _prefixed(self, prefix: str) -> Optional[Tuple[str, int]]:
+        """Highest-weight key starting with prefix"""
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        best = None
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == _END:
+                    if best is None or self.places[child[1]]["weight"] > self.places[best[1]]["weight"]:
+                        best = child
+                else:
+                    stack.append(child)
+        return best
+
+    def _match(self, index: int, score: float, matched: str) -> Dict:
+        return {**self.places[index], "score": round(score, 3), "matched": matched}
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        tokens = key.split()
+        # Word spans, longest first: "connaught place gate 2" matches on "connaught place"
+        spans = [
+            " ".join(tokens[start:start + size])
+            for size in range(len(tokens), 0, -1)
+            for start in range(len(tokens) - size + 1)
+        ]
+        for span in spans:
+            index = self._exact.get(span)
+            if index is not None:
+                return self._match(index, len(span) / len(key), span)
+        for span in spans:
+            max_distance = _max_distance(span)
+            if not max_distance or len(span) > self._longest + max_distance:
+                continue
+            found = self._fuzzy(span, max_distance)
+            if found is not None:
+                distance, matched, index = found
+                similarity = 1 - distance / max(len(span), len(matched))
+                return self._match(index, similarity * len(span) / len(key), matched)
+        if len(key) >= 4:
+            found = self._prefixed(key)
+            if found is not None:
+                return self._match(found[1], 0.9 * len(key) / len(found[0]), found[0])
+        return None
+
+    def resolve(self, text: str) -> Optional[Dict]:
+        """Best place for free text: name, latitude, longitude, kind, score (0-1], matched key"""
+        key = normalize(text)
+        return self._resolve(key) if key else None
+
+    def snapshot(self) -> Dict:
+        info = self._resolve.cache_info()
+        return {
+            "places": len(self.places),
+            "keys": len(self._exact),
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "cache_size": info.currsize
+        }
+
+
+gazetteer = Gazetteer.from_file()
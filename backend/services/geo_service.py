@@ -0,0 +1,73 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Dict, List, Optional
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or broadcastable NumPy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def to_geojson_point(latitude: float, longitude: float) -> Dict:
+    """GeoJSON points are stored as [longitude, latitude]"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def nearby_drivers_pipeline(
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    vehicle_type: Optional[str] = None,
+    limit: int = 10
+) -> List[Dict]:
+    """Aggregation answering a nearby search from the drivers 2dsphere index"""
+    query = {
+        "is_online": True,
+        "is_verified": True
+    }
+    if vehicle_type:
+        query["vehicle_type"] = vehicle_type
+
+    return [
+        {"$geoNear": {
+            "near": to_geojson_point(latitude, longitude),
+            "key": "current_location",
+            "distanceField": "distance_km",
+            "maxDistance": radius_km * 1000,
+            "distanceMultiplier": 0.001,
+            "spherical": True,
+            "query": query
+        }},
+        {"$limit": limit},
+        # Same fields as DriverSpatialIndex.describe() plus distance_km
+        {"$project": {
+            "_id": 0, "id": 1, "user_id": 1, "vehicle_type": 1, "current_location": 1, "distance_km": 1
+        }}
+    ]
+
+
+async def migrate_legacy_locations(db: AsyncIOMotorDatabase) -> int:
+    """Convert {latitude, longitude} locations to GeoJSON so they can be indexed"""
+    result = await db.drivers.update_many(
+        {"current_location.latitude": {"$exists": True}},
+        [{"$set": {"current_location": {
+            "type": "Point",
+            "coordinates": [
+                "$current_location.longitude",
+                "$current_location.latitude"
+            ]
+        }}}]
+    )
+    if result.modified_count:
+        logger.info(f"Migrated {result.modified_count} driver locations to GeoJSON")
+    return result.modified_count
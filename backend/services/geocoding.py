@@ -0,0 +1,396 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+import logging
+import httpx
+import numpy as np
+
+from services.gazetteer import Gazetteer, gazetteer, normalize
+from services.geo_service import haversine_km
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeError(Exception):
+    """Provider failed (transport, quota, bad key); the lookup is not cached"""
+
+
+class GeocodeProvider(ABC):
+    """Forward and reverse geocoding backend.
+
+    Both methods return {"address", "latitude", "longitude"}, None when the
+    provider has no match, and raise GeocodeError when it could not answer.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def geocode(self, address: str) -> Optional[Dict]:
+        """Best match for a free-text address"""
+
+    @abstractmethod
+    async def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """Address nearest to a point"""
+
+    async def close(self):
+        pass
+
+
+class _HTTPProvider(GeocodeProvider):
+    def __init__(self, key: str, timeout: float = 5.0):
+        self.key = key
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _get(self, url: str, params: Dict) -> Any:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._client.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise GeocodeError(f"{self.name}: {type(e).__name__}: {str(e)}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GoogleMapsProvider(_HTTPProvider):
+    """Google Maps Geocoding API"""
+
+    name = "google"
+    URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+    async def _first(self, params: Dict) -> Optional[Dict]:
+        data = await self._get(self.URL, {**params, "key": self.key, "region": "in"})
+        if data.get("status") == "ZERO_RESULTS":
+            return None
+        if data.get("status") != "OK":
+            raise GeocodeError(f"google: {data.get('status')} {data.get('error_message', '')}".strip())
+        result = data["results"][0]
+        location = result["geometry"]["location"]
+        return {"address": result["formatted_address"], "latitude": location["lat"], "longitude": location["lng"]}
+
+    async def geocode(self, address: str) -> Optional[Dict]:
+        return await self._first({"address": address})
+
+    async def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        return await self._first({"latlng": f"{latitude},{longitude}"})
+
+
+class GeoapifyProvider(_HTTPProvider):
+    """Geoapify Geocoding API"""
+
+    name = "geoapify"
+    URL = "https://api.geoapify.com/v1/geocode"
+
+    async def _first(self, path: str, params: Dict) -> Optional[Dict]:
+        data = await self._get(f"{self.URL}/{path}", {**params, "format": "json", "apiKey": self.key})
+        results = data.get("results") or []
+        if not results:
+            return None
+        result = results[0]
+        return {"address": result.get("formatted", ""), "latitude": result["lat"], "longitude": result["lon"]}
+
+    async def geocode(self, address: str) -> Optional[Dict]:
+        return await self._first("search", {"text": address, "filter": "countrycode:in"})
+
+    async def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        return await self._first("reverse", {"lat": latitude, "lon": longitude})
+
+
+class FakeGeocodeProvider(GeocodeProvider):
+    """Offline provider over the place gazetteer, for development and benchmarks.
+
+    Forward lookups resolve through the gazetteer; reverse lookups return
+    the nearest known place within `reverse_radius_km`. `latency` seconds
+    are slept per call to stand in for a network round trip.
+    """
+
+    name = "fake"
+
+    def __init__(self, places: Gazetteer, latency: float = 0.0, reverse_radius_km: float = 2.0):
+        self.places = places
+        self.latency = latency
+        self.reverse_radius_km = reverse_radius_km
+        self.calls = 0
+        self._coordinates = np.array(
+            [(place["latitude"], place["longitude"]) for place in places.places], dtype=np.float64
+        ).reshape(-1, 2)
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def geocode(self, address: str) -> Optional[Dict]:
+        await self._call()
+        match = self.places.resolve(address)
+        if match is None:
+            return None
+        return {"address": match["name"], "latitude": match["latitude"], "longitude": match["longitude"]}
+
+    async def reverse(self, latitude: float, longitude: float) -> Optional[Dict]:
+        await self._call()
+        if not len(self._coordinates):
+            return None
+        distances = haversine_km(latitude, longitude, self._coordinates[:, 0], self._coordinates[:, 1])
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.reverse_radius_km:
+            return None
+        place = self.places.places[nearest]
+        return {"address": place["name"], "latitude": place["latitude"], "longitude": place["longitude"]}
+
+
+# Provider name -> factory taking the admin API keys config; None when not configured
+PROVIDERS: Dict[str, Callable[[Dict], Optional[GeocodeProvider]]] = {
+    "google": lambda keys: GoogleMapsProvider(keys["google_maps_key"]) if keys.get("google_maps_key") else None,
+    "geoapify": lambda keys: GeoapifyProvider(keys["geoapify_key"]) if keys.get("geoapify_key") else None,
+    "fake": lambda keys: FakeGeocodeProvider(gazetteer),
+    "none": lambda keys: None
+}
+
+
+class GeocodeCache:
+    """Geocode and reverse-geocode lookups through two cache tiers.
+
+    Forward keys are the normalised address ("IGI Airport, Terminal-3"
+    and "igi airport terminal 3" share an entry); reverse keys are the
+    coordinates rounded to `precision` decimals (4 = about 11 m). A lookup
+    checks an in-process LRU of `lru_size` entries, then `geocode_cache`
+    in MongoDB, and only then the provider; the answer is written to both
+    tiers for `ttl_days`, and a "no match" answer for `negative_ttl`
+    seconds. Provider errors are not cached. Concurrent lookups of the
+    same key share one provider call.
+
+    The provider comes from the admin API keys: `provider="auto"` uses
+    Google Maps if its key is set, else Geoapify; "google", "geoapify",
+    "fake" (offline gazetteer) or "none" pin one.
+    """
+
+    def __init__(
+        self,
+        provider: str = "auto",
+        lru_size: int = 50000,
+        ttl_days: float = 90,
+        negative_ttl: float = 3600.0,
+        precision: int = 4
+    ):
+        if provider not in PROVIDERS and provider != "auto":
+            raise ValueError(f"Unknown geocoding provider: {provider}")
+        self.provider_name = provider
+        self.provider: Optional[GeocodeProvider] = None
+        self.lru_size = lru_size
+        self.ttl = timedelta(days=ttl_days)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+        self.precision = precision
+        # cache id -> (result or None, monotonic expiry)
+        self._lru: "OrderedDict[str, Tuple[Optional[Dict], float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "lookups": 0,
+            "lru_hits": 0,
+            "store_hits": 0,
+            "provider_calls": 0,
+            "provider_errors": 0,
+            "no_provider": 0,
+            "not_found": 0,
+            "coalesced": 0
+        }
+
+    # Provider
+
+    def configure(self, keys: Dict):
+        """Pick the provider from the admin API keys config"""
+        if self.provider_name == "auto":
+            provider = PROVIDERS["google"](keys) or PROVIDERS["geoapify"](keys)
+        else:
+            provider = PROVIDERS[self.provider_name](keys)
+        previous, self.provider = self.provider, provider
+        if previous is not None:
+            asyncio.ensure_future(previous.close())
+        logger.info(f"Geocoding provider: {provider.name if provider else 'none'}")
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        keys = await db.api_keys_config.find_one({"id": "api_keys_config"}, {"_id": 0})
+        self.configure(keys or {})
+
+    async def stop(self):
+        if self.provider is not None:
+            await self.provider.close()
+
+    # Keys
+
+    @staticmethod
+    def address_key(address: str) -> str:
+        return "fwd:" + normalize(address)
+
+    def point_key(self, latitude: float, longitude: float) -> str:
+        # Adding 0.0 folds -0.0 into 0.0 so both round to the same key
+        latitude, longitude = (round(value, self.precision) + 0.0 for value in (latitude, longitude))
+        return f"rev:{latitude:.{self.precision}f},{longitude:.{self.precision}f}"
+
+    # Lookups
+
+    async def geocode(self, db: AsyncIOMotorDatabase, address: str) -> Optional[Dict]:
+        """{"address", "latitude", "longitude"} for an address, or None"""
+        key = self.address_key(address)
+        if key == "fwd:":
+            return None
+        return await self._lookup(db, key, lambda provider: provider.geocode(address))
+
+    async def reverse(self, db: AsyncIOMotorDatabase, latitude: float, longitude: float) -> Optional[Dict]:
+        """Address near a point (looked up at the rounded coordinates), or None"""
+        latitude, longitude = round(latitude, self.precision), round(longitude, self.precision)
+        return await self._lookup(
+            db, self.point_key(latitude, longitude), lambda provider: provider.reverse(latitude, longitude)
+        )
+
+    def _remember(self, cache_id: str, result: Optional[Dict], seconds: float):
+        self._lru[cache_id] = (result, time.monotonic() + seconds)
+        self._lru.move_to_end(cache_id)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def _lookup(
+        self,
+        db: AsyncIOMotorDatabase,
+        cache_id: str,
+        fetch: Callable[[GeocodeProvider], Awaitable[Optional[Dict]]]
+    ) -> Optional[Dict]:
+        self.stats["lookups"] += 1
+        entry = self._lru.get(cache_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self._lru.move_to_end(cache_id)
+            self.stats["lru_hits"] += 1
+            return entry[0]
+
+        pending = self._pending.get(cache_id)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+        pending = self._pending[cache_id] = asyncio.ensure_future(self._load(db, cache_id, fetch))
+        pending.add_done_callback(lambda _: self._pending.pop(cache_id, None))
+        return await asyncio.shield(pending)
+
+    async def _load(
+        self,
+        db: AsyncIOMotorDatabase,
+        cache_id: str,
+        fetch: Callable[[GeocodeProvider], Awaitable[Optional[Dict]]]
+    ) -> Optional[Dict]:
+        now = datetime.utcnow()
+        doc = await db.geocode_cache.find_one({"id": cache_id}, {"_id": 0, "result": 1, "expires_at": 1})
+        # The TTL monitor runs once a minute, so expired entries can still be read
+        if doc is not None and doc["expires_at"] > now:
+            self.stats["store_hits"] += 1
+            self._remember(cache_id, doc["result"], (doc["expires_at"] - now).total_seconds())
+            return doc["result"]
+
+        provider = self.provider
+        if provider is None:
+            self.stats["no_provider"] += 1
+            return None
+        try:
+            result = await fetch(provider)
+        except GeocodeError as e:
+            self.stats["provider_errors"] += 1
+            logger.warning(f"Geocoding {cache_id} failed: {str(e)}")
+            return None
+        self.stats["provider_calls"] += 1
+        if result is None:
+            self.stats["not_found"] += 1
+
+        ttl = self.ttl if result is not None else self.negative_ttl
+        try:
+            await db.geocode_cache.update_one(
+                {"id": cache_id},
+                {"$set": {
+                    "result": result,
+                    "provider": provider.name,
+                    "created_at": now,
+                    "expires_at": now + ttl
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Geocode cache write for {cache_id} failed: {str(e)}")
+        self._remember(cache_id, result, ttl.total_seconds())
+        return result
+
+    # Warm-up
+
+    async def warm_from_rides(self, db: AsyncIOMotorDatabase, limit: int = 20000) -> int:
+        """Seed the store with the most used ride addresses and their mean coordinates.
+
+        Existing entries are left alone. Returns the number of entries written.
+        """
+        pipeline = [
+            {"$match": {"status": "completed"}},
+            {"$project": {"_id": 0, "points": ["$pickup_location", "$drop_location"]}},
+            {"$unwind": "$points"},
+            {"$group": {
+                "_id": "$points.address",
+                "latitude": {"$avg": "$points.latitude"},
+                "longitude": {"$avg": "$points.longitude"},
+                "rides": {"$sum": 1}
+            }},
+            {"$sort": {"rides": -1}},
+            {"$limit": limit}
+        ]
+        entries: Dict[str, Dict] = {}
+        async for row in db.rides.aggregate(pipeline, allowDiskUse=True):
+            if not row["_id"] or row["latitude"] is None or row["longitude"] is None:
+                continue
+            result = {"address": row["_id"], "latitude": row["latitude"], "longitude": row["longitude"]}
+            # Most used spelling wins for both the address and its rounded point
+            entries.setdefault(self.address_key(row["_id"]), result)
+            entries.setdefault(self.point_key(row["latitude"], row["longitude"]), result)
+        entries.pop("fwd:", None)
+        if not entries:
+            return 0
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"id": cache_id},
+                {"$setOnInsert": {"result": result, "provider": "rides", "created_at": now, "expires_at": now + self.ttl}},
+                upsert=True
+            )
+            for cache_id, result in entries.items()
+        ]
+        written = 0
+        for start in range(0, len(operations), 1000):
+            result = await db.geocode_cache.bulk_write(operations[start:start + 1000], ordered=False)
+            written += result.upserted_count
+        return written
+
+    def snapshot(self) -> Dict:
+        lookups = self.stats["lookups"]
+        served = self.stats["lru_hits"] + self.stats["store_hits"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": round(served / lookups, 4) if lookups else None,
+            "lru_hit_rate": round(self.stats["lru_hits"] / lookups, 4) if lookups else None,
+            "lru_entries": len(self._lru),
+            "provider": self.provider.name if self.provider else None,
+            "precision": self.precision
+        }
+
+
+geocoder = GeocodeCache(
+    provider=os.environ.get("GEOCODE_PROVIDER", "auto"),
+    lru_size=int(os.environ.get("GEOCODE_LRU_SIZE", 50000)),
+    ttl_days=float(os.environ.get("GEOCODE_CACHE_TTL_DAYS", 90)),
+    negative_ttl=float(os.environ.get("GEOCODE_NEGATIVE_TTL_SECONDS", 3600)),
+    precision=int(os.environ.get("GEOCODE_REVERSE_PRECISION", 4))
+)
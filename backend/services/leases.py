@@ -0,0 +1,43 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+
+
+class Lease:
+    """Single-leader lock shared by all worker processes through the `leases` collection.
+
+    `acquire()` takes the lease if it is free or expired and renews it if
+    this process already holds it; the holder must renew well within `ttl`
+    seconds. If the holder dies, another process takes over once the lease
+    expires.
+    """
+
+    def __init__(self, name: str, ttl: float = 30.0):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    async def acquire(self, db: AsyncIOMotorDatabase) -> bool:
+        now = datetime.utcnow()
+        try:
+            doc = await db.leases.find_one_and_update(
+                {"id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by another process: the upsert collided with its document
+            doc = None
+        self.held = doc is not None
+        return self.held
+
+    async def release(self, db: AsyncIOMotorDatabase):
+        if self.held:
+            self.held = False
+            await db.leases.delete_one({"id": self.name, "holder": self.holder})
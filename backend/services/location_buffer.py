@@ -0,0 +1,146 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import logging
+
+from services.geo_service import to_geojson_point
+
+logger = logging.getLogger(__name__)
+
+
+class LocationWriteBuffer:
+    """Coalesces driver GPS pings and persists them with one bulk write per window.
+
+    Only the most recent position per driver survives a flush window, so the
+    write rate follows the number of distinct active drivers rather than the
+    ping rate. A flush happens every `flush_interval` seconds, or earlier once
+    `max_pending` distinct drivers are waiting.
+
+    Each write only applies if the stored position is older, so a late
+    out-of-order ping never overwrites a newer position flushed earlier.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 5000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Tuple[float, float, datetime]] = {}
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            "pings": 0,
+            "stale_pings": 0,
+            "coalesced": 0,
+            "writes": 0,
+            "stale_writes": 0,
+            "flushes": 0,
+            "errors": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._pending
+
+    def add(
+        self,
+        driver_id: str,
+        latitude: float,
+        longitude: float,
+        recorded_at: Optional[datetime] = None
+    ) -> bool:
+        """Queue a position. Returns False if a newer one is already queued."""
+        recorded_at = recorded_at or datetime.utcnow()
+        self.stats["pings"] += 1
+
+        current = self._pending.get(driver_id)
+        if current is not None:
+            if current[2] > recorded_at:
+                self.stats["stale_pings"] += 1
+                return False
+            self.stats["coalesced"] += 1
+
+        self._pending[driver_id] = (latitude, longitude, recorded_at)
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+        return True
+
+    async def flush(self) -> int:
+        """Write every queued position with a single unordered bulk_write"""
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            operations = [
+                UpdateOne(
+                    {"id": driver_id, "$or": [
+                        {"location_updated_at": {"$lt": recorded_at}},
+                        {"location_updated_at": None}
+                    ]},
+                    {"$set": {
+                        "current_location": to_geojson_point(latitude, longitude),
+                        "location_updated_at": recorded_at
+                    }}
+                )
+                for driver_id, (latitude, longitude, recorded_at) in batch.items()
+            ]
+
+            try:
+                result = await self._db.drivers.bulk_write(operations, ordered=False)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Driver location flush failed ({len(batch)} drivers): {str(e)}")
+                # Re-queue positions that have not been superseded meanwhile
+                for driver_id, position in batch.items():
+                    self._pending.setdefault(driver_id, position)
+                return 0
+
+            self.stats["writes"] += len(operations)
+            # Unmatched: the stored position is newer (or the driver is gone)
+            self.stats["stale_writes"] += len(operations) - result.matched_count
+            self.stats["flushes"] += 1
+            return len(operations)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            "max_pending": self.max_pending
+        }
+
+
+location_buffer = LocationWriteBuffer(
+    flush_interval=float(os.environ.get("LOCATION_FLUSH_INTERVAL_SECONDS", 1.0)),
+    max_pending=int(os.environ.get("LOCATION_FLUSH_MAX_DRIVERS", 5000))
+)
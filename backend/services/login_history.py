@@ -0,0 +1,48 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+
+# Entries kept embedded on the user document (most recent last)
+EMBEDDED_LOGINS = int(os.environ.get("LOGIN_HISTORY_EMBEDDED", 20))
+# Full history lives in login_events and expires after this many days
+LOGIN_EVENTS_TTL_DAYS = int(os.environ.get("LOGIN_EVENTS_TTL_DAYS", 365))
+
+# Everything but the embedded history: the login response never needs it
+USER_LOGIN_PROJECTION = {"_id": 0, "login_history": 0}
+
+
+async def record_login(
+    db: AsyncIOMotorDatabase,
+    match: Dict,
+    ip_address: Optional[str],
+    device_info: Optional[str]
+) -> Optional[Dict]:
+    """Stamp a login on the user matching `match`; returns the user or None if absent.
+
+    One atomic update sets last_login and pushes the entry onto a
+    login_history capped at EMBEDDED_LOGINS, so its cost does not grow with
+    the account's age; the entry is also appended to login_events.
+    """
+    now = datetime.utcnow()
+    entry = {"timestamp": now, "ip_address": ip_address, "device_info": device_info}
+    user = await db.users.find_one_and_update(
+        match,
+        {
+            "$set": {"last_login": now},
+            "$push": {"login_history": {"$each": [entry], "$slice": -EMBEDDED_LOGINS}}
+        },
+        projection=USER_LOGIN_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if user:
+        await db.login_events.insert_one({"user_id": user["id"], **entry})
+    return user
+
+
+async def get_login_events(db: AsyncIOMotorDatabase, user_id: str, limit: int = 100) -> List[Dict]:
+    """Full login history for a user, newest first"""
+    return await db.login_events.find(
+        {"user_id": user_id}, {"_id": 0}
+    ).sort("timestamp", -1).limit(limit).to_list(limit)
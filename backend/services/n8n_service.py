@@ -1,16 +1,145 @@
 import os
-import requests
-from typing import Optional, Dict
+import httpx
+from typing import Optional, Dict, List
 from datetime import datetime
+import asyncio
+import random
+import uuid
 import logging
 
+from services.booking_parser import booking_parser
+
 logger = logging.getLogger(__name__)
 
+# Worth retrying: the webhook never saw the request, or asked us to come back
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _json_or_text(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
 class N8NIntegrationService:
-    """Service to integrate with n8n for WhatsApp and other automation"""
+    """Service to integrate with n8n for WhatsApp and other automation
+
+    All calls share a keep-alive pool of `max_connections` connections,
+    so a slow webhook only delays its own background task. The pool is
+    split over `pool_shards` httpx.AsyncClients and a post only starts once
+    its shard has a free connection: httpcore rescans every queued request
+    against every connection of a client, which costs more than the HTTP
+    exchange itself once hundreds of posts are queued on one client. At
+    most `max_concurrency` posts are in flight or waiting for a connection.
+    Connection failures, timeouts and 429/5xx responses are retried up to
+    `retries` times with full-jitter exponential backoff (a Retry-After
+    header is honoured). Every logical send carries one Idempotency-Key
+    header across its retries (callers may pass their own key) so the
+    workflow can drop duplicates.
+    """
     
-    def __init__(self, webhook_url: Optional[str] = None):
+    def __init__(
+        self,
+        webhook_url: Optional[str] = None,
+        timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        max_connections: int = 20,
+        max_concurrency: int = 50,
+        retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_shards: int = 4
+    ):
         self.webhook_url = webhook_url or os.getenv('N8N_WEBHOOK_URL')
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.pool_shards = max(1, min(pool_shards, max_connections))
+        per_shard = -(-max_connections // self.pool_shards)
+        self.limits = httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clients: List[Optional[httpx.AsyncClient]] = [None] * self.pool_shards
+        # Loading the CA bundle takes tens of milliseconds; do it once for every shard
+        self._ssl_context = httpx.create_ssl_context()
+        self._shard_slots = [asyncio.Semaphore(per_shard) for _ in range(self.pool_shards)]
+        self._shard_busy = [0] * self.pool_shards
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self.stats = {"sent": 0, "failed": 0, "skipped": 0, "retries": 0, "waiting": 0}
+    
+    def _client(self, shard: int) -> httpx.AsyncClient:
+        client = self._clients[shard]
+        if client is None or client.is_closed:
+            client = self._clients[shard] = httpx.AsyncClient(
+                timeout=self.timeout, limits=self.limits, verify=self._ssl_context
+            )
+        return client
+    
+    async def _request(self, payload: Dict, headers: Dict) -> httpx.Response:
+        # Least busy shard; waiting here is cheap, waiting inside httpcore is not
+        shard = min(range(self.pool_shards), key=self._shard_busy.__getitem__)
+        self._shard_busy[shard] += 1
+        try:
+            async with self._shard_slots[shard]:
+                return await self._client(shard).post(self.webhook_url, json=payload, headers=headers)
+        finally:
+            self._shard_busy[shard] -= 1
+    
+    async def close(self):
+        for shard, client in enumerate(self._clients):
+            if client is not None:
+                await client.aclose()
+                self._clients[shard] = None
+    
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+    
+    async def _post(self, payload: Dict, idempotency_key: Optional[str] = None) -> Dict:
+        """POST payload to the webhook with bounded concurrency and retries"""
+        
+        headers = {"Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+        self.stats["waiting"] += 1
+        async with self._slots:
+            self.stats["waiting"] -= 1
+            self._in_flight += 1
+            try:
+                for attempt in range(self.retries + 1):
+                    response = None
+                    try:
+                        response = await self._request(payload, headers)
+                    except httpx.TransportError as e:
+                        # Connect errors and timeouts
+                        error = f"{type(e).__name__}: {str(e)}"
+                    else:
+                        error = f"HTTP {response.status_code}"
+                        if response.is_success:
+                            self.stats["sent"] += 1
+                            return {"status": "success", "data": _json_or_text(response)}
+                        if response.status_code not in RETRY_STATUSES:
+                            break
+                    if attempt < self.retries:
+                        self.stats["retries"] += 1
+                        await asyncio.sleep(self._backoff(attempt, response))
+            finally:
+                self._in_flight -= 1
+        
+        self.stats["failed"] += 1
+        logger.error(f"n8n webhook error ({payload.get('type')}): {error}")
+        return {"status": "error", "message": error}
+    
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "in_flight": self._in_flight,
+            "configured": bool(self.webhook_url),
+            "max_concurrency": self.max_concurrency,
+            "pool_shards": self.pool_shards,
+            "max_retries": self.retries
+        }
     
     async def send_booking_notification(
         self,
@@ -20,12 +149,14 @@ class N8NIntegrationService:
         pickup: str,
         drop: str,
         fare: float,
-        otp: str
+        otp: str,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """Send booking confirmation via WhatsApp through n8n"""
         
         if not self.webhook_url:
             logger.warning("n8n webhook URL not configured")
+            self.stats["skipped"] += 1
             return {"status": "skipped", "message": "n8n not configured"}
         
         message = f"""🚗 *Gaddi24x7 - Booking Confirmed*
@@ -53,28 +184,20 @@ Thank you for choosing Gaddi24x7!
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            return {"status": "success", "data": response.json()}
-        except Exception as e:
-            logger.error(f"n8n webhook error: {str(e)}")
-            return {"status": "error", "message": str(e)}
+        return await self._post(payload, idempotency_key)
     
     async def send_bill(
         self,
         phone: str,
         bill_text: str,
-        bill_id: str
+        bill_id: str,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """Send bill via WhatsApp through n8n"""
         
         if not self.webhook_url:
             logger.warning("n8n webhook URL not configured")
+            self.stats["skipped"] += 1
             return {"status": "skipped", "message": "n8n not configured"}
         
         payload = {
@@ -85,17 +208,7 @@ Thank you for choosing Gaddi24x7!
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            return {"status": "success", "data": response.json()}
-        except Exception as e:
-            logger.error(f"n8n webhook error: {str(e)}")
-            return {"status": "error", "message": str(e)}
+        return await self._post(payload, idempotency_key)
     
     async def send_driver_notification(
         self,
@@ -104,11 +217,13 @@ Thank you for choosing Gaddi24x7!
         ride_id: str,
         customer_name: str,
         pickup: str,
-        fare: float
+        fare: float,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """Send new ride notification to driver via WhatsApp"""
         
         if not self.webhook_url:
+            self.stats["skipped"] += 1
             return {"status": "skipped", "message": "n8n not configured"}
         
         message = f"""🚕 *New Ride Request!*
@@ -132,17 +247,48 @@ Accept this ride in the app now!
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            return {"status": "success", "data": response.json()}
-        except Exception as e:
-            logger.error(f"n8n webhook error: {str(e)}")
-            return {"status": "error", "message": str(e)}
+        return await self._post(payload, idempotency_key)
+    
+    def render_driver_offer(
+        self,
+        ride_id: str,
+        customer_name: str,
+        pickup: str,
+        fare: float
+    ) -> Dict:
+        """Render the ride-level part of a driver alert once, for send_driver_offer to every driver"""
+        
+        message = f"""🚕 *New Ride Request!*
+
+Customer: {customer_name}
+📍 Pickup: {pickup}
+💰 Fare: ₹{fare}
+
+Ride ID: {ride_id}
+
+Accept this ride in the app now!
+"""
+        
+        return {
+            "type": "driver_notification",
+            "message": message,
+            "ride_id": ride_id,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    async def send_driver_offer(
+        self,
+        phone: str,
+        offer: Dict,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """Send a pre-rendered ride offer (render_driver_offer) to one driver"""
+        
+        if not self.webhook_url:
+            self.stats["skipped"] += 1
+            return {"status": "skipped", "message": "n8n not configured"}
+        
+        return await self._post({**offer, "phone": phone}, idempotency_key)
     
     async def process_whatsapp_booking(
         self,
@@ -151,32 +297,19 @@ Accept this ride in the app now!
     ) -> Dict:
         """Process booking request from WhatsApp via n8n webhook"""
         
-        # This endpoint will receive webhooks from n8n
-        # Parse the message and extract booking details
-        # Format: "Book ride from [pickup] to [drop]"
-        
-        # Simple parser (can be enhanced with NLP)
+        # Places resolve against the offline gazetteer; nothing leaves the process
         try:
-            if "book" in message.lower() and "from" in message.lower() and "to" in message.lower():
-                parts = message.lower().split("from")
-                if len(parts) > 1:
-                    location_parts = parts[1].split("to")
-                    if len(location_parts) > 1:
-                        pickup = location_parts[0].strip()
-                        drop = location_parts[1].strip()
-                        
-                        return {
-                            "status": "parsed",
-                            "phone": phone,
-                            "pickup": pickup,
-                            "drop": drop,
-                            "needs_confirmation": True
-                        }
-            
-            return {
-                "status": "invalid_format",
-                "message": "Please use format: Book ride from [pickup] to [drop]"
-            }
+            return {**booking_parser.parse(message), "phone": phone}
         except Exception as e:
             logger.error(f"WhatsApp booking parse error: {str(e)}")
             return {"status": "error", "message": str(e)}
+
+
+n8n_service = N8NIntegrationService(
+    timeout=float(os.environ.get("N8N_TIMEOUT_SECONDS", 5)),
+    connect_timeout=float(os.environ.get("N8N_CONNECT_TIMEOUT_SECONDS", 2)),
+    max_connections=int(os.environ.get("N8N_MAX_CONNECTIONS", 20)),
+    max_concurrency=int(os.environ.get("N8N_MAX_CONCURRENCY", 50)),
+    retries=int(os.environ.get("N8N_RETRIES", 3)),
+    pool_shards=int(os.environ.get("N8N_POOL_SHARDS", 4))
+)
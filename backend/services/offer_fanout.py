@@ -0,0 +1,247 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+import logging
+import numpy as np
+
+from models import RideStatus
+from services.driver_index import driver_index
+from services.n8n_service import N8NIntegrationService, n8n_service
+
+logger = logging.getLogger(__name__)
+
+
+class ContactCache:
+    """user_id -> (phone, name) for drivers, loaded with one $in query per batch of misses"""
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def prime(self, contacts: Iterable[Tuple[str, str, str]]):
+        """Store (user_id, phone, name) entries"""
+        expires = time.monotonic() + self.ttl
+        for user_id, phone, name in contacts:
+            self._entries[user_id] = (phone, name, expires)
+            self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, db: AsyncIOMotorDatabase, user_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        now = time.monotonic()
+        found: Dict[str, Tuple[str, str]] = {}
+        missing = []
+        for user_id in user_ids:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] > now:
+                found[user_id] = (entry[0], entry[1])
+            else:
+                missing.append(user_id)
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(missing)
+
+        if missing and db is not None:
+            users = await db.users.find(
+                {"id": {"$in": missing}}, {"_id": 0, "id": 1, "phone": 1, "name": 1}
+            ).to_list(len(missing))
+            contacts = [(user["id"], user["phone"], user["name"]) for user in users if user.get("phone")]
+            self.prime(contacts)
+            found.update((user_id, (phone, name)) for user_id, phone, name in contacts)
+        return found
+
+
+class OfferFanout:
+    """WhatsApp alerts for a new ride to the nearest eligible drivers at once.
+
+    `alert()` takes the `drivers_per_ride` nearest online, verified drivers
+    of the ride's vehicle type within `radius_km` from the driver index,
+    renders the ride message once and starts one send per driver; at most
+    `max_concurrency` sends run at a time across all rides. A driver is
+    alerted at most once per ride, however often the ride is alerted. When
+    the ride is accepted or closed, `ride_closed()` cancels the sends still
+    queued or in flight. An accept or cancel handled by another worker is
+    not seen by `ride_closed()`, so each send first checks that the ride is
+    still requested; one status read per ride is shared by its sends for
+    `status_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        sender: N8NIntegrationService,
+        drivers_per_ride: int = 10,
+        radius_km: float = 5.0,
+        max_concurrency: int = 200,
+        max_rides: int = 10000,
+        contact_ttl: float = 300.0,
+        status_ttl: float = 1.0
+    ):
+        self.sender = sender
+        self.drivers_per_ride = drivers_per_ride
+        self.radius_km = radius_km
+        self.max_concurrency = max_concurrency
+        self.max_rides = max_rides
+        self.contacts = ContactCache(ttl=contact_ttl)
+        self.status_ttl = status_ttl
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # ride_id -> drivers already alerted; oldest rides are forgotten past max_rides
+        self._alerted: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._tasks: Dict[str, Set[asyncio.Task]] = {}
+        # ride_id -> (monotonic expiry, pending or finished "still requested?" read)
+        self._status: Dict[str, Tuple[float, asyncio.Future]] = {}
+        self._send_latency = deque(maxlen=10000)
+        self.stats = {
+            "rides": 0,
+            "offers_scheduled": 0,
+            "offers_sent": 0,
+            "offers_failed": 0,
+            "offers_skipped": 0,
+            "offers_cancelled": 0,
+            "offers_closed": 0,
+            "duplicates_suppressed": 0,
+            "no_contact": 0
+        }
+
+    async def alert(
+        self,
+        db: AsyncIOMotorDatabase,
+        ride: Dict,
+        customer_name: str,
+        limit: Optional[int] = None
+    ) -> int:
+        """Start alerts for a ride to its nearest drivers; returns the number of sends scheduled"""
+        ride_id = ride["id"]
+        pickup = ride["pickup_location"]
+        nearby = driver_index.within_radius(
+            pickup["latitude"], pickup["longitude"], self.radius_km,
+            vehicle_type=ride["vehicle_type"], limit=limit or self.drivers_per_ride
+        )
+
+        alerted = self._alerted.setdefault(ride_id, set())
+        self._alerted.move_to_end(ride_id)
+        while len(self._alerted) > self.max_rides:
+            self._alerted.popitem(last=False)
+
+        targets: Dict[str, str] = {}
+        for driver_id, _ in nearby:
+            if driver_id in alerted:
+                self.stats["duplicates_suppressed"] += 1
+                continue
+            entry = driver_index.describe(driver_id)
+            if entry and entry["user_id"]:
+                targets[driver_id] = entry["user_id"]
+        if not targets:
+            return 0
+
+        contacts = await self.contacts.get_many(db, list(targets.values()))
+        offer = self.sender.render_driver_offer(
+            ride_id=ride_id,
+            customer_name=customer_name,
+            pickup=pickup.get("address", ""),
+            fare=ride.get("estimated_fare")
+        )
+
+        tasks = self._tasks.setdefault(ride_id, set())
+        scheduled = 0
+        for driver_id, user_id in targets.items():
+            contact = contacts.get(user_id)
+            if contact is None:
+                self.stats["no_contact"] += 1
+                continue
+            alerted.add(driver_id)
+            task = asyncio.create_task(self._send(db, ride_id, driver_id, contact[0], offer))
+            tasks.add(task)
+            task.add_done_callback(lambda done, ride_id=ride_id: self._forget(ride_id, done))
+            scheduled += 1
+
+        self.stats["rides"] += 1
+        self.stats["offers_scheduled"] += scheduled
+        return scheduled
+
+    def _forget(self, ride_id: str, task: asyncio.Task):
+        tasks = self._tasks.get(ride_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[ride_id]
+                self._status.pop(ride_id, None)
+        if task.cancelled():
+            self.stats["offers_cancelled"] += 1
+
+    async def _still_requested(self, db: AsyncIOMotorDatabase, ride_id: str) -> bool:
+        now = time.monotonic()
+        cached = self._status.get(ride_id)
+        if cached is None or cached[0] <= now:
+            read = asyncio.ensure_future(
+                db.rides.find_one({"id": ride_id, "status": RideStatus.REQUESTED}, {"_id": 0, "id": 1})
+            )
+            cached = self._status[ride_id] = (now + self.status_ttl, read)
+        try:
+            return await asyncio.shield(cached[1]) is not None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Unknown: alerting a taken ride beats dropping the alert for an open one
+            logger.warning(f"Ride status check for {ride_id} failed: {str(e)}")
+            return True
+
+    async def _send(self, db: Optional[AsyncIOMotorDatabase], ride_id: str, driver_id: str, phone: str, offer: Dict):
+        async with self._slots:
+            # Accepted or cancelled through another worker since the alert
+            if db is not None and not await self._still_requested(db, ride_id):
+                self.stats["offers_closed"] += 1
+                return
+            started = time.perf_counter()
+            result = await self.sender.send_driver_offer(phone, offer, idempotency_key=f"offer:{ride_id}:{driver_id}")
+            self._send_latency.append(time.perf_counter() - started)
+        status = result["status"]
+        if status == "success":
+            self.stats["offers_sent"] += 1
+        elif status == "skipped":
+            self.stats["offers_skipped"] += 1
+        else:
+            self.stats["offers_failed"] += 1
+
+    def ride_closed(self, ride_id: str):
+        """Ride accepted, cancelled or completed: stop its outstanding alerts"""
+        for task in list(self._tasks.get(ride_id, ())):
+            task.cancel()
+        self._status.pop(ride_id, None)
+
+    async def wait(self, ride_id: str):
+        """Wait until every alert for a ride has finished or been cancelled"""
+        tasks = list(self._tasks.get(ride_id, ()))
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stop(self):
+        tasks = [task for ride_tasks in self._tasks.values() for task in ride_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict:
+        def percentile(samples, q):
+            return round(float(np.percentile(samples, q)), 6) if samples else None
+
+        return {
+            **self.stats,
+            "outstanding": sum(len(tasks) for tasks in self._tasks.values()),
+            "send_seconds_p50": percentile(self._send_latency, 50),
+            "send_seconds_p99": percentile(self._send_latency, 99),
+            "contact_cache": self.contacts.stats,
+            "drivers_per_ride": self.drivers_per_ride,
+            "max_concurrency": self.max_concurrency
+        }
+
+
+offer_fanout = OfferFanout(
+    n8n_service,
+    drivers_per_ride=int(os.environ.get("OFFER_FANOUT_DRIVERS", 10)),
+    radius_km=float(os.environ.get("OFFER_FANOUT_RADIUS_KM", 5.0)),
+    max_concurrency=int(os.environ.get("OFFER_FANOUT_CONCURRENCY", 200))
+)
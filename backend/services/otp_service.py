@@ -0,0 +1,284 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import hashlib
+import hmac
+import os
+import secrets
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OTPError(Exception):
+    """Send or verify refused; status_code and retry_after map onto the HTTP response"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+# Stores
+
+class InMemoryOTPStore:
+    """Single-process store: codes and rate-limit windows in dictionaries.
+
+    A rate-limit bucket is dropped once its newest hit has left the window;
+    buckets are swept at most every `sweep_interval` seconds, so a flood of
+    distinct phones or IPs only holds the buckets of its current window.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._codes: Dict[str, Dict] = {}
+        self._windows: Dict[str, Deque[float]] = {}
+        # bucket -> when its newest hit leaves the window
+        self._window_ends: Dict[str, float] = {}
+        self._swept_at = time.time()
+
+    async def put_code(self, key: str, code_hash: str, ttl: float):
+        self._codes[key] = {"code_hash": code_hash, "expires_at": time.time() + ttl, "attempts": 0}
+        if len(self._codes) > 10000:
+            now = time.time()
+            self._codes = {k: v for k, v in self._codes.items() if v["expires_at"] > now}
+
+    async def take_attempt(self, key: str, max_attempts: int) -> Optional[Dict]:
+        """Count one attempt on a live code; None if absent, expired or out of attempts"""
+        record = self._codes.get(key)
+        if record is None or record["expires_at"] <= time.time():
+            self._codes.pop(key, None)
+            return None
+        if record["attempts"] >= max_attempts:
+            return None
+        record["attempts"] += 1
+        return dict(record)
+
+    async def consume_code(self, key: str, code_hash: str) -> bool:
+        record = self._codes.get(key)
+        if record is None or record["code_hash"] != code_hash:
+            return False
+        del self._codes[key]
+        return True
+
+    async def hit(self, bucket: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Sliding-window log: record a hit if fewer than `limit` in the last `window` seconds"""
+        now = time.time()
+        if now - self._swept_at >= self.sweep_interval:
+            self._sweep(now)
+        hits = self._windows.setdefault(bucket, deque())
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return False, hits[0] + window - now
+        hits.append(now)
+        self._window_ends[bucket] = now + window
+        return True, 0.0
+
+    def _sweep(self, now: float):
+        self._swept_at = now
+        for bucket in [bucket for bucket, ends in self._window_ends.items() if ends <= now]:
+            del self._window_ends[bucket]
+            del self._windows[bucket]
+
+
+class MongoOTPStore:
+    """Shared store for multiple workers: otp_codes and otp_rate_limits, both TTL-expired"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def put_code(self, key: str, code_hash: str, ttl: float):
+        await self.db.otp_codes.update_one(
+            {"id": key},
+            {"$set": {
+                "code_hash": code_hash,
+                "expires_at": datetime.utcnow() + timedelta(seconds=ttl),
+                "attempts": 0
+            }},
+            upsert=True
+        )
+
+    async def take_attempt(self, key: str, max_attempts: int) -> Optional[Dict]:
+        # The TTL monitor runs about once a minute, so expiry is also checked here
+        return await self.db.otp_codes.find_one_and_update(
+            {"id": key, "expires_at": {"$gt": datetime.utcnow()}, "attempts": {"$lt": max_attempts}},
+            {"$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def consume_code(self, key: str, code_hash: str) -> bool:
+        # Deleting on the hash makes a code single-use even under concurrent verifies
+        result = await self.db.otp_codes.delete_one({"id": key, "code_hash": code_hash})
+        return result.deleted_count == 1
+
+    async def hit(self, bucket: str, limit: int, window: float) -> Tuple[bool, float]:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=window)
+        # One atomic pipeline update: drop hits outside the window, then append if under the limit
+        doc = await self.db.otp_rate_limits.find_one_and_update(
+            {"id": bucket},
+            [
+                {"$set": {"hits": {"$filter": {
+                    "input": {"$ifNull": ["$hits", []]},
+                    "cond": {"$gt": ["$$this", cutoff]}
+                }}}},
+                {"$set": {"allowed": {"$lt": [{"$size": "$hits"}, limit]}}},
+                {"$set": {
+                    "hits": {"$cond": ["$allowed", {"$concatArrays": ["$hits", [now]]}, "$hits"]},
+                    "expires_at": now + timedelta(seconds=window)
+                }}
+            ],
+            projection={"_id": 0, "allowed": 1, "hits": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc["allowed"]:
+            return True, 0.0
+        return False, (doc["hits"][0] - cutoff).total_seconds()
+
+
+# SMS delivery
+
+class ConsoleSMSProvider:
+    """Local stand-in for an SMS gateway: logs messages and keeps the last few"""
+
+    def __init__(self, keep: int = 100):
+        self.sent: Deque[Tuple[str, str]] = deque(maxlen=keep)
+
+    async def send(self, phone: str, message: str):
+        self.sent.append((phone, message))
+        logger.info(f"SMS to {phone[:-4]}****: {len(message)} chars")
+
+
+SMS_PROVIDERS = {"console": ConsoleSMSProvider}
+
+
+# Service
+
+class OTPService:
+    """Phone OTP issue and verification.
+
+    Codes are random, stored only as HMAC-SHA256 hashes keyed by OTP_SECRET,
+    expire after `ttl` seconds and allow `max_attempts` guesses. Sends are
+    rate limited per phone and per client IP with sliding windows, and
+    verifies per IP. Verification is a single keyed lookup plus a delete and
+    never reads users. The store is in-process ("memory") or shared through
+    MongoDB TTL collections ("mongo").
+    """
+
+    def __init__(
+        self,
+        store: str = "mongo",
+        sms_provider: str = "console",
+        secret: Optional[str] = None,
+        length: int = 4,
+        ttl: float = 300,
+        max_attempts: int = 5,
+        phone_limit: Tuple[int, float] = (3, 600),
+        ip_limit: Tuple[int, float] = (20, 3600),
+        verify_ip_limit: Tuple[int, float] = (60, 3600),
+        echo: bool = False
+    ):
+        if store not in ("memory", "mongo"):
+            raise ValueError(f"Unknown OTP store: {store}")
+        self.store_name = store
+        self.store = InMemoryOTPStore() if store == "memory" else None
+        self.sms = SMS_PROVIDERS[sms_provider]()
+        if not secret and store == "memory":
+            # The memory store is single-process anyway
+            logger.warning("OTP_SECRET is not set; using a per-process secret")
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode() if secret else None
+        self.length = length
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.phone_limit = phone_limit
+        self.ip_limit = ip_limit
+        self.verify_ip_limit = verify_ip_limit
+        self.echo = echo
+        self.stats = {
+            "sent": 0,
+            "send_rate_limited": 0,
+            "verified": 0,
+            "rejected": 0,
+            "expired_or_exhausted": 0,
+            "verify_rate_limited": 0
+        }
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self.store_name == "mongo":
+            # Any worker may verify a code another one issued: they must share the secret
+            if self._secret is None:
+                raise RuntimeError("OTP_SECRET must be set when OTP_STORE=mongo")
+            self.store = MongoOTPStore(db)
+
+    def _hash(self, phone: str, code: str) -> str:
+        return hmac.new(self._secret, f"{phone}:{code}".encode(), hashlib.sha256).hexdigest()
+
+    async def _limit(self, bucket: str, limit: Tuple[int, float], counter: str):
+        allowed, retry_after = await self.store.hit(bucket, *limit)
+        if not allowed:
+            self.stats[counter] += 1
+            raise OTPError(429, "Too many OTP requests, try again later", retry_after=max(1, int(retry_after) + 1))
+
+    async def send(self, phone: str, ip_address: Optional[str]) -> Optional[str]:
+        """Issue a fresh code for phone and text it. Returns the code only when echo is on."""
+        await self._limit(f"send:phone:{phone}", self.phone_limit, "send_rate_limited")
+        if ip_address:
+            await self._limit(f"send:ip:{ip_address}", self.ip_limit, "send_rate_limited")
+
+        code = f"{secrets.randbelow(10 ** self.length):0{self.length}d}"
+        await self.store.put_code(phone, self._hash(phone, code), self.ttl)
+        await self.sms.send(phone, f"{code} is your Gaddi24x7 verification code. Valid for {int(self.ttl // 60)} minutes.")
+        self.stats["sent"] += 1
+        return code if self.echo else None
+
+    async def verify(self, phone: str, code: str, ip_address: Optional[str]):
+        """Raise OTPError unless code is the live code for phone; a code verifies once"""
+        if ip_address:
+            await self._limit(f"verify:ip:{ip_address}", self.verify_ip_limit, "verify_rate_limited")
+
+        record = await self.store.take_attempt(phone, self.max_attempts)
+        if record is None:
+            self.stats["expired_or_exhausted"] += 1
+            raise OTPError(400, "OTP expired or too many attempts, request a new one")
+
+        code_hash = self._hash(phone, code)
+        if not hmac.compare_digest(record["code_hash"], code_hash) or not await self.store.consume_code(phone, code_hash):
+            self.stats["rejected"] += 1
+            raise OTPError(400, "Invalid OTP")
+        self.stats["verified"] += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "store": self.store_name,
+            "ttl": self.ttl,
+            "max_attempts": self.max_attempts
+        }
+
+
+def _limit_env(name: str, default: str) -> Tuple[int, float]:
+    # "<count>/<seconds>", e.g. "3/600"
+    count, seconds = os.environ.get(name, default).split("/")
+    return int(count), float(seconds)
+
+
+otp_service = OTPService(
+    store=os.environ.get("OTP_STORE", "mongo"),
+    sms_provider=os.environ.get("OTP_SMS_PROVIDER", "console"),
+    secret=os.environ.get("OTP_SECRET"),
+    length=int(os.environ.get("OTP_LENGTH", 4)),
+    ttl=float(os.environ.get("OTP_TTL_SECONDS", 300)),
+    max_attempts=int(os.environ.get("OTP_MAX_ATTEMPTS", 5)),
+    phone_limit=_limit_env("OTP_PHONE_RATE_LIMIT", "3/600"),
+    ip_limit=_limit_env("OTP_IP_RATE_LIMIT", "20/3600"),
+    verify_ip_limit=_limit_env("OTP_VERIFY_IP_RATE_LIMIT", "60/3600"),
+    echo=os.environ.get("OTP_ECHO", "false").lower() == "true"
+)
@@ -0,0 +1,264 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import asyncio
+import os
+import random
+import time
+import uuid
+import logging
+
+from services.n8n_service import N8NIntegrationService, n8n_service
+
+logger = logging.getLogger(__name__)
+
+# Notification kind -> N8NIntegrationService method; payloads are its keyword arguments
+KINDS = {
+    "booking_confirmation": "send_booking_notification",
+    "bill": "send_bill",
+    "driver_notification": "send_driver_notification"
+}
+
+# pending -> sent | skipped (n8n not configured) | dead (out of attempts)
+PENDING, SENT, SKIPPED, DEAD = "pending", "sent", "skipped", "dead"
+
+# Delivered records are kept this long for inspection
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", 7))
+
+
+class NotificationOutbox:
+    """Durable queue of outbound notifications in `notification_outbox`.
+
+    Routes `enqueue()` a record keyed by a deduplication key in the same
+    write path as the change it announces; a second enqueue with the same
+    key is a no-op, so a notification is delivered at most once per key.
+    `workers` tasks per process claim due records with find_one_and_update,
+    which pushes `available_at` forward by `lease_seconds`: if a process dies
+    mid-delivery the lease runs out and another worker picks the record up.
+    Failed deliveries are retried with full-jitter exponential backoff;
+    after `max_attempts` the record is parked as dead for the dead-letter view.
+    """
+
+    def __init__(
+        self,
+        sender: N8NIntegrationService,
+        workers: int = 4,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 8,
+        backoff_base: float = 5.0,
+        backoff_max: float = 3600.0,
+        poll_interval: float = 1.0
+    ):
+        self.sender = sender
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        self._delivered_at: Deque[float] = deque()
+        self.stats = {
+            "enqueued": 0,
+            "duplicates": 0,
+            "delivered": 0,
+            "failed_attempts": 0,
+            "dead": 0,
+            "skipped": 0,
+            "lost_leases": 0
+        }
+
+    # Producers
+
+    async def enqueue(
+        self,
+        db: AsyncIOMotorDatabase,
+        kind: str,
+        key: str,
+        payload: Dict,
+        session=None
+    ) -> bool:
+        """Queue a notification. Returns False if one with this key already exists."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown notification kind: {kind}")
+        now = datetime.utcnow()
+        try:
+            result = await db.notification_outbox.update_one(
+                {"id": key},
+                {"$setOnInsert": {
+                    "kind": kind,
+                    "payload": payload,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "available_at": now,
+                    "created_at": now
+                }},
+                upsert=True,
+                session=session
+            )
+        except DuplicateKeyError:
+            # Two concurrent upserts of the same key: the other one won
+            result = None
+        if result is None or result.upserted_id is None:
+            self.stats["duplicates"] += 1
+            return False
+        self.stats["enqueued"] += 1
+        self._wake.set()
+        return True
+
+    # Workers
+
+    async def claim(self, db: AsyncIOMotorDatabase) -> Optional[Dict]:
+        """Lease the oldest due record, or None if nothing is due"""
+        now = datetime.utcnow()
+        lease = uuid.uuid4().hex
+        record = await db.notification_outbox.find_one_and_update(
+            {"status": PENDING, "available_at": {"$lte": now}},
+            {
+                "$set": {"available_at": now + timedelta(seconds=self.lease_seconds), "lease": lease},
+                "$inc": {"attempts": 1}
+            },
+            projection={"_id": 0},
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.BEFORE
+        )
+        if record is not None:
+            record["attempts"] += 1
+            record["lease"] = lease
+        return record
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    async def _finish(self, db: AsyncIOMotorDatabase, record: Dict, update: Dict) -> bool:
+        # Only the lease holder may settle the record
+        result = await db.notification_outbox.update_one(
+            {"id": record["id"], "lease": record["lease"]},
+            {"$set": {**update, "updated_at": datetime.utcnow()}, "$unset": {"lease": ""}}
+        )
+        if result.modified_count == 0:
+            self.stats["lost_leases"] += 1
+            return False
+        return True
+
+    async def deliver(self, db: AsyncIOMotorDatabase, record: Dict):
+        """Send one claimed record and record the outcome"""
+        method = getattr(self.sender, KINDS[record["kind"]])
+        try:
+            # The outbox key doubles as the webhook Idempotency-Key across redeliveries
+            result = await asyncio.wait_for(
+                method(**record["payload"], idempotency_key=record["id"]), timeout=self.lease_seconds
+            )
+        except asyncio.TimeoutError:
+            result = {"status": "error", "message": f"Delivery exceeded {self.lease_seconds}s lease"}
+        except Exception as e:
+            result = {"status": "error", "message": f"{type(e).__name__}: {str(e)}"}
+
+        if result["status"] == "success":
+            if await self._finish(db, record, {"status": SENT, "sent_at": datetime.utcnow()}):
+                self.stats["delivered"] += 1
+                self._delivered_at.append(time.monotonic())
+                self._trim()
+        elif result["status"] == "skipped":
+            if await self._finish(db, record, {"status": SKIPPED}):
+                self.stats["skipped"] += 1
+        else:
+            self.stats["failed_attempts"] += 1
+            error = result.get("message")
+            if record["attempts"] >= self.max_attempts:
+                if await self._finish(db, record, {"status": DEAD, "last_error": error}):
+                    self.stats["dead"] += 1
+                    logger.error(f"Notification {record['id']} dead after {record['attempts']} attempts: {error}")
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=self._backoff(record["attempts"]))
+                await self._finish(db, record, {"available_at": retry_at, "last_error": error})
+
+    async def _work(self):
+        while True:
+            try:
+                record = await self.claim(self._db)
+            except Exception as e:
+                logger.error(f"Outbox claim failed: {str(e)}")
+                record = None
+            if record is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            try:
+                await self.deliver(self._db, record)
+            except Exception as e:
+                # The lease runs out and the record is retried
+                logger.error(f"Outbox delivery of {record['id']} failed: {str(e)}")
+
+    def start(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Records in flight keep their lease and are retried after it expires
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # Admin and metrics
+
+    async def depth(self, db: AsyncIOMotorDatabase) -> Dict:
+        """Record counts per status, plus pending records already due"""
+        counts = {PENDING: 0, SENT: 0, SKIPPED: 0, DEAD: 0}
+        async for row in db.notification_outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        counts["due"] = await db.notification_outbox.count_documents(
+            {"status": PENDING, "available_at": {"$lte": datetime.utcnow()}}
+        )
+        return counts
+
+    async def dead_letters(self, db: AsyncIOMotorDatabase, limit: int = 50) -> List[Dict]:
+        """Records that ran out of attempts, most recently failed first"""
+        return await db.notification_outbox.find(
+            {"status": DEAD}, {"_id": 0}
+        ).sort("updated_at", -1).limit(limit).to_list(limit)
+
+    async def retry(self, db: AsyncIOMotorDatabase, key: str) -> bool:
+        """Put a dead record back in the queue with a fresh attempt budget"""
+        result = await db.notification_outbox.update_one(
+            {"id": key, "status": DEAD},
+            {"$set": {"status": PENDING, "attempts": 0, "available_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            self._wake.set()
+        return result.modified_count == 1
+
+    def _trim(self):
+        cutoff = time.monotonic() - 60
+        while self._delivered_at and self._delivered_at[0] < cutoff:
+            self._delivered_at.popleft()
+
+    def snapshot(self) -> Dict:
+        self._trim()
+        return {
+            **self.stats,
+            "delivered_last_minute": len(self._delivered_at),
+            "workers": len(self._tasks),
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts
+        }
+
+
+outbox = NotificationOutbox(
+    n8n_service,
+    workers=int(os.environ.get("OUTBOX_WORKERS", 4)),
+    lease_seconds=float(os.environ.get("OUTBOX_LEASE_SECONDS", 60)),
+    max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8)),
+    backoff_base=float(os.environ.get("OUTBOX_BACKOFF_BASE_SECONDS", 5)),
+    backoff_max=float(os.environ.get("OUTBOX_BACKOFF_MAX_SECONDS", 3600))
+)
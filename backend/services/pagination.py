@@ -0,0 +1,96 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import base64
+import json
+import os
+import time
+
+# Newest first; id breaks ties between equal timestamps
+KEYSET_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: Dict) -> str:
+    """Opaque continuation token for the position just after doc"""
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset_query(query: Dict, cursor: Optional[str]) -> Dict:
+    """Restrict query to documents after the cursor in KEYSET_SORT order"""
+    if not cursor:
+        return query
+    created_at, doc_id = decode_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": doc_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+async def keyset_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict,
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[Dict] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """One page in KEYSET_SORT order and the cursor for the next (None at the end).
+
+    Seeks through the (..., created_at, id) index, so every page costs the
+    same regardless of how deep it is.
+    """
+    docs = await collection.find(keyset_query(query, cursor), projection) \
+        .sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
+
+
+class CountCache:
+    """Short-lived cache of count_documents results per collection and filter"""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, int]] = {}
+
+    async def count(self, collection: AsyncIOMotorCollection, query: Dict) -> int:
+        key = f"{collection.name}:{json.dumps(query, sort_keys=True, default=str)}"
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        total = await collection.count_documents(query)
+        if len(self._entries) >= self.max_entries:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+        self._entries[key] = (now + self.ttl, total)
+        return total
+
+    async def total(self, collection: AsyncIOMotorCollection, query: Dict, mode: Optional[str]) -> Optional[int]:
+        """None, a cached exact count, or (unfiltered only) the metadata estimate"""
+        if mode is None:
+            return None
+        if mode == "estimated" and not query:
+            return await collection.estimated_document_count()
+        return await self.count(collection, query)
+
+
+count_cache = CountCache(ttl=float(os.environ.get("ADMIN_COUNT_CACHE_SECONDS", 30.0)))
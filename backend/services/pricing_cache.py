@@ -0,0 +1,136 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import os
+import logging
+
+from models import VehiclePricing, TripType
+
+logger = logging.getLogger(__name__)
+
+PRICING_CONFIG_ID = "pricing_config"
+
+
+class PricingTable:
+    """Immutable snapshot of one pricing_config version, keyed by vehicle type"""
+
+    __slots__ = ("version", "vehicles", "loaded_at")
+
+    def __init__(self, version: int, vehicles: List[Dict]):
+        self.version = version
+        self.vehicles: Dict[str, VehiclePricing] = {}
+        for raw in vehicles:
+            pricing = VehiclePricing(**raw)
+            # Resolve every trip type up front so lookups never need a default
+            multipliers = dict(pricing.trip_multipliers)
+            for trip_type in TripType:
+                multipliers.setdefault(trip_type.value, 1.0)
+            pricing.trip_multipliers = multipliers
+            self.vehicles[pricing.vehicle_type] = pricing
+        self.loaded_at = datetime.utcnow()
+
+    def get(self, vehicle_type: str) -> Optional[VehiclePricing]:
+        return self.vehicles.get(vehicle_type)
+
+
+class PricingCache:
+    """In-process pricing table, invalidated by a version stamp on pricing_config.
+
+    Every write through `update()` increments `version`. Each worker polls
+    that single field every `check_interval` seconds and reloads when it
+    changes, so a pricing change reaches all processes within one interval
+    while fare calculations never touch the database.
+    """
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self.table: Optional[PricingTable] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"reloads": 0, "version_checks": 0}
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.table.version if self.table else None
+
+    def get(self, vehicle_type: str) -> Optional[VehiclePricing]:
+        """Pricing for a vehicle type from the loaded table; None if unknown"""
+        if self.table is None:
+            return None
+        return self.table.get(vehicle_type)
+
+    def _install(self, doc: Optional[Dict]):
+        self.table = PricingTable(doc.get("version", 0), doc.get("vehicles", [])) if doc else None
+        self.stats["reloads"] += 1
+
+    async def load(self, db: AsyncIOMotorDatabase) -> Optional[PricingTable]:
+        doc = await db.pricing_config.find_one({"id": PRICING_CONFIG_ID}, {"_id": 0})
+        self._install(doc)
+        if self.table:
+            logger.info(f"Pricing table v{self.table.version} loaded ({len(self.table.vehicles)} vehicle types)")
+        return self.table
+
+    async def refresh_if_stale(self, db: AsyncIOMotorDatabase) -> bool:
+        """Reload if another process changed the config. Returns True on reload."""
+        self.stats["version_checks"] += 1
+        doc = await db.pricing_config.find_one({"id": PRICING_CONFIG_ID}, {"_id": 0, "version": 1})
+        stored = doc.get("version", 0) if doc else None
+        if stored == self.version and (doc is None) == (self.table is None):
+            return False
+        await self.load(db)
+        return True
+
+    async def update(self, db: AsyncIOMotorDatabase, config: Dict) -> PricingTable:
+        """Write a new config, bump its version and install it locally.
+
+        Raises ValueError (pydantic ValidationError) if a vehicle entry is invalid.
+        """
+        config = {k: v for k, v in config.items() if k not in ("_id", "id", "version")}
+        # Compile before writing so a bad config never reaches other workers
+        PricingTable(0, config.get("vehicles", []))
+        doc = await db.pricing_config.find_one_and_update(
+            {"id": PRICING_CONFIG_ID},
+            {"$set": config, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._install(doc)
+        return self.table
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.refresh_if_stale(db)
+            except Exception as e:
+                logger.error(f"Pricing version check failed: {str(e)}")
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        await self.load(db)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "version": self.version,
+            "vehicle_types": sorted(self.table.vehicles) if self.table else [],
+            "loaded_at": self.table.loaded_at if self.table else None,
+            "check_interval": self.check_interval
+        }
+
+
+pricing_cache = PricingCache(
+    check_interval=float(os.environ.get("PRICING_VERSION_CHECK_SECONDS", 5.0))
+)
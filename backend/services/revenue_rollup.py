@@ -0,0 +1,222 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import asyncio
+import os
+import logging
+
+from models import Ride, RideStatus
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_JOB_ID = "revenue_backfill"
+
+
+class RevenueRollup:
+    """Per-day and per-hour revenue, ride counts and vehicle breakdowns in a local timezone.
+
+    Rides are bucketed by completion time (created_at for rides completed
+    before completed_at was recorded). `revenue_daily` documents are keyed
+    by local date ("2024-03-01") and `revenue_hourly` by local hour
+    ("2024-03-01T18"); both carry `revenue`, `rides` and
+    `vehicles.<type>.{revenue, rides}`.
+
+    `record()` increments the current buckets when a ride completes.
+    `backfill()` recomputes whole closed days (before today) from the rides
+    collection and overwrites them, so it is idempotent; it checkpoints the
+    next day to process and resumes from there.
+    """
+
+    def __init__(self, tz: str = "Asia/Kolkata", backfill_interval: float = 3600.0, batch_days: int = 7):
+        self.tz_name = tz
+        self.tz = ZoneInfo(tz)
+        self.backfill_interval = backfill_interval
+        self.batch_days = batch_days
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "record_failures": 0, "backfilled_days": 0, "backfill_runs": 0}
+
+    # Time helpers (MongoDB datetimes are naive UTC)
+
+    def local(self, moment: datetime) -> datetime:
+        return moment.replace(tzinfo=timezone.utc).astimezone(self.tz)
+
+    def utc_start(self, day: date) -> datetime:
+        """Naive UTC instant at which the local day begins"""
+        return datetime.combine(day, time(), tzinfo=self.tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+    def today(self) -> date:
+        return self.local(datetime.utcnow()).date()
+
+    # Incremental updates
+
+    @staticmethod
+    def _increments(vehicle_type: str, fare: float) -> Dict:
+        return {
+            "revenue": fare,
+            "rides": 1,
+            f"vehicles.{vehicle_type}.revenue": fare,
+            f"vehicles.{vehicle_type}.rides": 1
+        }
+
+    async def record(self, db: AsyncIOMotorDatabase, ride: Ride, fare: float, completed_at: datetime, session=None):
+        """Add a completed ride to its day and hour buckets"""
+        local = self.local(completed_at)
+        day = local.strftime("%Y-%m-%d")
+        hour = f"{day}T{local.hour:02d}"
+        increments = {"$inc": self._increments(ride.vehicle_type, fare)}
+        writes = [
+            lambda: db.revenue_daily.update_one(
+                {"id": day}, {**increments, "$setOnInsert": {"date": day}}, upsert=True, session=session
+            ),
+            lambda: db.revenue_hourly.update_one(
+                {"id": hour}, {**increments, "$setOnInsert": {"date": day, "hour": local.hour}},
+                upsert=True, session=session
+            )
+        ]
+        if session is not None:
+            # Inside the completion transaction: sequential, and failures abort it
+            for write in writes:
+                await write()
+            self.stats["recorded"] += 1
+            return
+        try:
+            await asyncio.gather(*(write() for write in writes))
+            self.stats["recorded"] += 1
+        except Exception as e:
+            # The ride is already settled; the next backfill of this day repairs it
+            self.stats["record_failures"] += 1
+            logger.error(f"Revenue rollup update failed for ride {ride.id}: {str(e)}")
+
+    # Backfill
+
+    async def compute_days(
+        self, db: AsyncIOMotorDatabase, first: date, last: date
+    ) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """Daily and hourly documents for local days first..last, from rides"""
+        start, end = self.utc_start(first), self.utc_start(last + timedelta(days=1))
+        completed_at = {"$ifNull": ["$completed_at", "$created_at"]}
+        rows = await db.rides.aggregate([
+            {"$match": {
+                "status": RideStatus.COMPLETED,
+                "$or": [
+                    {"completed_at": {"$gte": start, "$lt": end}},
+                    {"completed_at": None, "created_at": {"$gte": start, "$lt": end}}
+                ]
+            }},
+            {"$group": {
+                "_id": {
+                    "hour": {"$dateToString": {"format": "%Y-%m-%dT%H", "date": completed_at, "timezone": self.tz_name}},
+                    "vehicle_type": "$vehicle_type"
+                },
+                "revenue": {"$sum": {"$ifNull": ["$actual_fare", 0]}},
+                "rides": {"$sum": 1}
+            }}
+        ]).to_list(None)
+
+        daily: Dict[str, Dict] = {}
+        hourly: Dict[str, Dict] = {}
+        for row in rows:
+            hour_id, vehicle_type = row["_id"]["hour"], row["_id"]["vehicle_type"]
+            day_id = hour_id[:10]
+            for buckets, key, extra in (
+                (daily, day_id, {"date": day_id}),
+                (hourly, hour_id, {"date": day_id, "hour": int(hour_id[11:])})
+            ):
+                doc = buckets.setdefault(key, {"id": key, **extra, "revenue": 0, "rides": 0, "vehicles": {}})
+                doc["revenue"] += row["revenue"]
+                doc["rides"] += row["rides"]
+                vehicle = doc["vehicles"].setdefault(vehicle_type, {"revenue": 0, "rides": 0})
+                vehicle["revenue"] += row["revenue"]
+                vehicle["rides"] += row["rides"]
+        return daily, hourly
+
+    async def rebuild_days(self, db: AsyncIOMotorDatabase, first: date, last: date) -> int:
+        """Overwrite the buckets of local days first..last (empty days are removed)"""
+        daily, hourly = await self.compute_days(db, first, last)
+        first_id, last_id = first.isoformat(), last.isoformat()
+        for collection, docs in ((db.revenue_daily, daily), (db.revenue_hourly, hourly)):
+            await collection.delete_many({"date": {"$gte": first_id, "$lte": last_id}, "id": {"$nin": list(docs)}})
+            if docs:
+                await collection.bulk_write(
+                    [ReplaceOne({"id": key}, doc, upsert=True) for key, doc in docs.items()],
+                    ordered=False
+                )
+        return (last - first).days + 1
+
+    async def backfill(self, db: AsyncIOMotorDatabase, since: Optional[date] = None) -> int:
+        """Rebuild every closed day from the checkpoint (or `since`) to yesterday.
+
+        Returns the number of days rebuilt. Safe to interrupt and rerun.
+        """
+        self.stats["backfill_runs"] += 1
+        if since is None:
+            job = await db.rollup_jobs.find_one({"id": BACKFILL_JOB_ID}, {"_id": 0})
+            if job:
+                since = date.fromisoformat(job["next_day"])
+            else:
+                oldest = await db.rides.find_one(
+                    {"status": RideStatus.COMPLETED}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)]
+                )
+                if not oldest:
+                    return 0
+                since = self.local(oldest["created_at"]).date()
+
+        yesterday = self.today() - timedelta(days=1)
+        rebuilt = 0
+        first = since
+        while first <= yesterday:
+            last = min(first + timedelta(days=self.batch_days - 1), yesterday)
+            count = await self.rebuild_days(db, first, last)
+            rebuilt += count
+            self.stats["backfilled_days"] += count
+            first = last + timedelta(days=1)
+            await db.rollup_jobs.update_one(
+                {"id": BACKFILL_JOB_ID},
+                {"$set": {"next_day": first.isoformat(), "timezone": self.tz_name, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        return rebuilt
+
+    # Reads
+
+    async def series(self, db: AsyncIOMotorDatabase, days: int, granularity: str = "day") -> List[Dict]:
+        """Rollup rows for the last `days` local days including today, oldest first"""
+        first = (self.today() - timedelta(days=days - 1)).isoformat()
+        collection = db.revenue_daily if granularity == "day" else db.revenue_hourly
+        return await collection.find({"date": {"$gte": first}}, {"_id": 0}).sort("id", 1).to_list(None)
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                await self.backfill(db)
+            except Exception as e:
+                logger.error(f"Revenue backfill failed: {str(e)}")
+            await asyncio.sleep(self.backfill_interval)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None and self.backfill_interval > 0:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "timezone": self.tz_name,
+            "backfill_interval": self.backfill_interval
+        }
+
+
+revenue_rollup = RevenueRollup(
+    tz=os.environ.get("REVENUE_TIMEZONE", "Asia/Kolkata"),
+    backfill_interval=float(os.environ.get("REVENUE_BACKFILL_INTERVAL_SECONDS", 3600))
+)
@@ -0,0 +1,248 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+import os
+
+from models import Bill, Ride, RideStatus, ActivityLog, ActivityType, Transaction, TransactionType
+from services.ride_state import transition_ride, RideTransitionError
+from services.activity_writer import activity_writer
+from services.stats_rollup import stats_rollup
+from services.revenue_rollup import revenue_rollup
+from services.bill_service import BillGenerator
+from services.outbox import outbox
+
+PLATFORM_COMMISSION = 0.20  # 20% platform fee
+
+# Run the completion writes in a multi-document transaction (needs a replica set)
+USE_TRANSACTIONS = os.environ.get("RIDE_COMPLETION_TRANSACTIONS", "false").lower() == "true"
+
+USER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "wallet_balance": 1}
+
+# An unfinished settlement older than this (its worker died) is resumed by a retried completion
+RESUME_AFTER_SECONDS = float(os.environ.get("RIDE_COMPLETION_RESUME_SECONDS", 30))
+
+# Rides whose wallet change a user document remembers, so a resumed settlement never applies it twice
+SETTLED_RIDES_KEPT = 20
+
+
+async def _adjust_wallet(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    delta: float,
+    ride_id: str,
+    session=None
+) -> Optional[Dict]:
+    """Atomically add delta to a wallet once per ride and return the user after the change"""
+    user = await db.users.find_one_and_update(
+        {"id": user_id, "settled_rides": {"$ne": ride_id}},
+        {
+            "$inc": {"wallet_balance": delta},
+            "$push": {"settled_rides": {"$each": [ride_id], "$slice": -SETTLED_RIDES_KEPT}}
+        },
+        projection=USER_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if user is None:
+        # Applied by the interrupted attempt already (or no such user)
+        user = await db.users.find_one({"id": user_id}, USER_PROJECTION, session=session)
+    return user
+
+
+async def _record_transaction(
+    db: AsyncIOMotorDatabase,
+    user: Dict,
+    amount: float,
+    delta: float,
+    transaction_type: TransactionType,
+    description: str,
+    ride_id: str,
+    session=None
+):
+    balance_after = user["wallet_balance"]
+    transaction = Transaction(
+        id=f"TXN-{ride_id}-{transaction_type.value}",
+        user_id=user["id"],
+        amount=amount,
+        transaction_type=transaction_type,
+        description=description,
+        ride_id=ride_id,
+        balance_before=balance_after - delta,
+        balance_after=balance_after
+    ).dict()
+    # Keyed by ride and type: a resumed settlement records it once
+    await db.transactions.update_one(
+        {"id": transaction["id"]}, {"$setOnInsert": transaction}, upsert=True, session=session
+    )
+
+
+async def _claim(
+    db: AsyncIOMotorDatabase,
+    ride: Ride,
+    bill: Bill,
+    payment_method: str,
+    details: Optional[Dict],
+    session=None
+) -> Dict:
+    """Start settling an ongoing ride, or take over a settlement its worker left unfinished"""
+    now = datetime.utcnow()
+    claimed = await db.rides.find_one_and_update(
+        {"id": ride.id, "status": RideStatus.ONGOING, "settlement": None},
+        {"$set": {"settlement": {
+            "bill": bill.dict(),
+            "payment_method": payment_method,
+            "details": details or {},
+            "completed_at": now,
+            "claimed_at": now,
+            "done": []
+        }}},
+        projection={"_id": 0, "settlement": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if claimed is None:
+        claimed = await db.rides.find_one_and_update(
+            {
+                "id": ride.id,
+                "status": RideStatus.ONGOING,
+                "settlement.claimed_at": {"$lte": now - timedelta(seconds=RESUME_AFTER_SECONDS)}
+            },
+            {"$set": {"settlement.claimed_at": now}},
+            projection={"_id": 0, "settlement": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+    if claimed is not None:
+        return claimed["settlement"]
+
+    current = await db.rides.find_one({"id": ride.id}, {"_id": 0, "status": 1}, session=session)
+    if current is None:
+        raise RideTransitionError(404, "Ride not found")
+    if current["status"] != RideStatus.ONGOING:
+        raise RideTransitionError(409, f"Cannot complete a ride that is {current['status']}")
+    raise RideTransitionError(409, "Ride completion is already in progress")
+
+
+async def _settle(
+    db: AsyncIOMotorDatabase,
+    ride: Ride,
+    bill: Bill,
+    payment_method: str,
+    details: Optional[Dict] = None,
+    session=None
+) -> Dict:
+    # The ride stays ONGOING until every write is done, so a failed completion
+    # can be retried; a resumed one keeps the bill of the first attempt
+    settlement = await _claim(db, ride, bill, payment_method, details, session)
+    bill = Bill(**settlement["bill"])
+    payment_method = settlement["payment_method"]
+    completed_at = settlement["completed_at"]
+    driver_earning = bill.total * (1 - PLATFORM_COMMISSION)
+
+    async def customer_step():
+        if payment_method != "wallet":
+            customer = await db.users.find_one({"id": ride.customer_id}, USER_PROJECTION, session=session)
+        else:
+            customer = await _adjust_wallet(db, ride.customer_id, -bill.total, ride.id, session)
+            if customer:
+                await _record_transaction(
+                    db, customer, bill.total, -bill.total, TransactionType.RIDE_PAYMENT,
+                    f"Ride payment for {ride.id}", ride.id, session
+                )
+        # WhatsApp bill, keyed by ride (ids are unique) so a retried completion never sends two
+        if customer:
+            await outbox.enqueue(db, "bill", f"bill:{ride.id}", {
+                "phone": customer["phone"],
+                "bill_text": BillGenerator.format_bill_text(bill),
+                "bill_id": bill.id
+            }, session=session)
+        return customer
+
+    async def driver_step():
+        if not ride.driver_id:
+            return None
+        driver = await _adjust_wallet(db, ride.driver_id, driver_earning, ride.id, session)
+        if driver:
+            await _record_transaction(
+                db, driver, driver_earning, driver_earning, TransactionType.DRIVER_EARNING,
+                f"Earning from ride {ride.id}", ride.id, session
+            )
+        return driver
+
+    async def counters_step():
+        # $inc is not idempotent: claimed once, and the reconcile/backfill jobs repair a lost one
+        claimed = await db.rides.update_one(
+            {"id": ride.id, "settlement.done": {"$ne": "counters"}},
+            {"$addToSet": {"settlement.done": "counters"}},
+            session=session
+        )
+        if claimed.modified_count:
+            await stats_rollup.ride_completed(db, ride, bill.total, session)
+            await revenue_rollup.record(db, ride, bill.total, completed_at, session)
+
+    # Motor starts an operation as soon as it is called, so steps are thunks
+    steps = [
+        customer_step,
+        driver_step,
+        lambda: db.bills.update_one({"id": bill.id}, {"$setOnInsert": bill.dict()}, upsert=True, session=session),
+        counters_step
+    ]
+    if session is None:
+        customer, driver, *_ = await asyncio.gather(*(step() for step in steps))
+    else:
+        # Operations on one session must not overlap
+        customer, driver, *_ = [await step() for step in steps]
+
+    completed = await transition_ride(db, ride.id, "complete", {
+        **settlement["details"],
+        "completed_at": completed_at,
+        "actual_fare": bill.total,
+        "payment_method": payment_method
+    }, session=session)
+
+    activity = ActivityLog(
+        user_id=ride.customer_id,
+        activity_type=ActivityType.RIDE_COMPLETED,
+        description=f"Ride {ride.id} completed",
+        metadata={"ride_id": ride.id, "fare": bill.total}
+    )
+    if session is None:
+        activity_writer.log(activity)
+    else:
+        await db.activity_logs.insert_one(activity.dict(), session=session)
+
+    return {"ride": completed, "bill": bill, "customer": customer, "driver": driver}
+
+
+async def settle_completed_ride(
+    db: AsyncIOMotorDatabase,
+    ride: Ride,
+    bill: Bill,
+    payment_method: str,
+    details: Optional[Dict] = None
+) -> Dict:
+    """Mark the ride completed, move wallet balances and record bill, transactions, activity and bill message.
+
+    `details` are extra fields stored on the completed ride (actual and
+    billed distance and duration, completion flags). Returns the completed
+    ride, the bill charged, and the customer and driver after the change.
+
+    Wallets change with atomic $inc, so concurrent completions never lose
+    updates; independent writes run concurrently. The ride first records
+    a settlement (bill, payment method) and only turns COMPLETED after
+    every write: each write is keyed by the ride, so if one fails the
+    completion can be retried, and a retry after RESUME_AFTER_SECONDS
+    finishes the interrupted settlement with its original bill. With
+    RIDE_COMPLETION_TRANSACTIONS=true everything commits atomically in one
+    multi-document transaction instead.
+    """
+    if not USE_TRANSACTIONS:
+        return await _settle(db, ride, bill, payment_method, details)
+
+    async with await db.client.start_session() as session:
+        async def callback(session):
+            return await _settle(db, ride, bill, payment_method, details, session=session)
+
+        return await session.with_transaction(callback)
@@ -0,0 +1,53 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from typing import Dict, List, Optional, Tuple
+
+from models import RideStatus
+
+# event -> (statuses the ride may be in, status it moves to)
+TRANSITIONS: Dict[str, Tuple[List[RideStatus], RideStatus]] = {
+    "accept": ([RideStatus.REQUESTED], RideStatus.ACCEPTED),
+    "start": ([RideStatus.ACCEPTED], RideStatus.ONGOING),
+    "complete": ([RideStatus.ONGOING], RideStatus.COMPLETED),
+    "cancel": ([RideStatus.REQUESTED, RideStatus.ACCEPTED], RideStatus.CANCELLED),
+}
+
+
+class RideTransitionError(Exception):
+    """Raised when a ride is missing or not in a state that allows the event"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def transition_ride(
+    db: AsyncIOMotorDatabase,
+    ride_id: str,
+    event: str,
+    fields: Optional[Dict] = None,
+    session=None
+) -> Dict:
+    """Apply a lifecycle event with one conditional find_one_and_update.
+
+    The status guard is part of the update filter, so of several concurrent
+    callers exactly one succeeds; the others get a 409. Returns the updated
+    ride document.
+    """
+    sources, target = TRANSITIONS[event]
+    ride = await db.rides.find_one_and_update(
+        {"id": ride_id, "status": {"$in": sources}},
+        {"$set": {"status": target, **(fields or {})}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if ride is not None:
+        return ride
+
+    # Only reached on failure: tell a missing ride from a wrong state
+    current = await db.rides.find_one({"id": ride_id}, {"_id": 0, "status": 1}, session=session)
+    if current is None:
+        raise RideTransitionError(404, "Ride not found")
+    raise RideTransitionError(409, f"Cannot {event} a ride that is {current['status']}")
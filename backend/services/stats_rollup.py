@@ -0,0 +1,216 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+import os
+import logging
+
+from models import Ride, RideStatus, UserRole
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_ID = "global"
+
+
+def day_id(moment: datetime) -> str:
+    """Daily bucket id (UTC day, matching the dashboard's 'today')"""
+    return f"day:{moment.strftime('%Y-%m-%d')}"
+
+
+class StatsRollup:
+    """Dashboard counters kept current with atomic $inc updates.
+
+    `stats_counters` holds one `global` document (users by role, online
+    drivers, rides, completed rides, revenue) and one `day:YYYY-MM-DD`
+    bucket per UTC day (rides created that day, and how many of them were
+    completed and for how much, i.e. bucketed by the ride's created_at like
+    the original aggregation). Write paths call the hooks below; the
+    dashboard reads both documents in one query. `reconcile()` recomputes
+    everything from the source collections and reports the drift it fixed.
+    """
+
+    def __init__(self, reconcile_interval: float = 3600.0, reconcile_days: int = 7):
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_days = reconcile_days
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"increments": 0, "increment_failures": 0, "reconciles": 0, "last_drift": None}
+
+    async def _inc(self, db: AsyncIOMotorDatabase, doc_id: str, fields: Dict, session=None):
+        self.stats["increments"] += 1
+        update = db.stats_counters.update_one({"id": doc_id}, {"$inc": fields}, upsert=True, session=session)
+        if session is not None:
+            # Part of a transaction: a failure must abort it
+            await update
+            return
+        try:
+            await update
+        except Exception as e:
+            # Never fail the request over a counter; reconcile() repairs drift
+            self.stats["increment_failures"] += 1
+            logger.error(f"Stats counter update failed: {str(e)}")
+
+    # Write-path hooks
+
+    async def user_registered(self, db: AsyncIOMotorDatabase, role: str):
+        await self._inc(db, GLOBAL_ID, {f"users.{UserRole(role).value}": 1})
+
+    async def driver_online_changed(self, db: AsyncIOMotorDatabase, online: bool):
+        await self._inc(db, GLOBAL_ID, {"active_drivers": 1 if online else -1})
+
+    async def ride_created(self, db: AsyncIOMotorDatabase, ride: Ride):
+        await asyncio.gather(
+            self._inc(db, GLOBAL_ID, {"rides": 1}),
+            self._inc(db, day_id(ride.created_at), {"rides": 1})
+        )
+
+    async def ride_completed(self, db: AsyncIOMotorDatabase, ride: Ride, fare: float, session=None):
+        fields = {"completed_rides": 1, "revenue": fare}
+        await self._inc(db, GLOBAL_ID, fields, session)
+        await self._inc(db, day_id(ride.created_at), fields, session)
+
+    # Reads
+
+    async def read(self, db: AsyncIOMotorDatabase) -> Dict:
+        """Dashboard stats from the counters: one query for both documents"""
+        today = day_id(datetime.utcnow())
+        docs = {
+            doc["id"]: doc
+            async for doc in db.stats_counters.find({"id": {"$in": [GLOBAL_ID, today]}}, {"_id": 0})
+        }
+        if GLOBAL_ID not in docs:
+            # Never initialised (fresh deployment): build from source once
+            await self.reconcile(db)
+            return await self.read(db)
+        return self._format(docs[GLOBAL_ID], docs.get(today, {}))
+
+    @staticmethod
+    def _format(counters: Dict, today: Dict) -> Dict:
+        users = counters.get("users", {})
+        return {
+            "total_customers": users.get("customer", 0),
+            "total_drivers": users.get("driver", 0),
+            "active_drivers": counters.get("active_drivers", 0),
+            "total_rides": counters.get("rides", 0),
+            "completed_rides": counters.get("completed_rides", 0),
+            "total_revenue": round(counters.get("revenue", 0), 2),
+            "today_rides": today.get("rides", 0),
+            "today_revenue": round(today.get("revenue", 0), 2)
+        }
+
+    # Reconciliation
+
+    async def compute(self, db: AsyncIOMotorDatabase, since: datetime) -> Dict[str, Dict]:
+        """Counter documents recomputed from users, drivers and rides"""
+        users, active_drivers, rides, completed, daily = await asyncio.gather(
+            db.users.aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}]).to_list(None),
+            db.drivers.count_documents({"is_online": True}),
+            db.rides.count_documents({}),
+            db.rides.aggregate([
+                {"$match": {"status": RideStatus.COMPLETED}},
+                {"$group": {"_id": None, "count": {"$sum": 1}, "revenue": {"$sum": "$actual_fare"}}}
+            ]).to_list(1),
+            db.rides.aggregate([
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                    "rides": {"$sum": 1},
+                    "completed_rides": {"$sum": {"$cond": [{"$eq": ["$status", RideStatus.COMPLETED]}, 1, 0]}},
+                    "revenue": {"$sum": {"$cond": [
+                        {"$eq": ["$status", RideStatus.COMPLETED]}, {"$ifNull": ["$actual_fare", 0]}, 0
+                    ]}}
+                }}
+            ]).to_list(None)
+        )
+        completed = completed[0] if completed else {"count": 0, "revenue": 0}
+        docs = {GLOBAL_ID: {
+            "users": {row["_id"]: row["count"] for row in users if row["_id"]},
+            "active_drivers": active_drivers,
+            "rides": rides,
+            "completed_rides": completed["count"],
+            "revenue": completed["revenue"] or 0
+        }}
+        for row in daily:
+            docs[f"day:{row['_id']}"] = {
+                "rides": row["rides"],
+                "completed_rides": row["completed_rides"],
+                "revenue": row["revenue"]
+            }
+        return docs
+
+    async def reconcile(self, db: AsyncIOMotorDatabase) -> Dict:
+        """Overwrite the counters (and the last reconcile_days buckets) from source.
+
+        Returns the drift that was corrected, per counter: {"stored", "actual"}.
+        """
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        since = today - timedelta(days=self.reconcile_days - 1)
+        bucket_ids = [day_id(since + timedelta(days=i)) for i in range(self.reconcile_days)]
+
+        actual = await self.compute(db, since)
+        stored = {
+            doc["id"]: doc
+            async for doc in db.stats_counters.find({"id": {"$in": [GLOBAL_ID, *bucket_ids]}}, {"_id": 0})
+        }
+
+        operations = []
+        drift: Dict[str, Dict] = {}
+        for doc_id in [GLOBAL_ID, *bucket_ids]:
+            values = actual.get(doc_id, {"rides": 0, "completed_rides": 0, "revenue": 0})
+            before = stored.get(doc_id, {})
+            for field, value in values.items():
+                if field == "users":
+                    stored_users = before.get("users", {})
+                    for role, count in value.items():
+                        if stored_users.get(role, 0) != count:
+                            drift[f"{doc_id}.users.{role}"] = {"stored": stored_users.get(role, 0), "actual": count}
+                elif round(before.get(field, 0), 2) != round(value, 2):
+                    drift[f"{doc_id}.{field}"] = {"stored": before.get(field, 0), "actual": value}
+            operations.append(UpdateOne(
+                {"id": doc_id},
+                {"$set": {**values, "reconciled_at": datetime.utcnow()}},
+                upsert=True
+            ))
+        await db.stats_counters.bulk_write(operations, ordered=False)
+
+        self.stats["reconciles"] += 1
+        self.stats["last_drift"] = len(drift)
+        if drift:
+            logger.warning(f"Stats counters drifted on {len(drift)} fields: {', '.join(sorted(drift))}")
+        return drift
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile(db)
+            except Exception as e:
+                logger.error(f"Stats reconcile failed: {str(e)}")
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if not await db.stats_counters.find_one({"id": GLOBAL_ID}, {"_id": 1}):
+            await self.reconcile(db)
+        if self._task is None and self.reconcile_interval > 0:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "reconcile_interval": self.reconcile_interval,
+            "reconcile_days": self.reconcile_days
+        }
+
+
+stats_rollup = StatsRollup(
+    reconcile_interval=float(os.environ.get("STATS_RECONCILE_INTERVAL_SECONDS", 3600)),
+    reconcile_days=int(os.environ.get("STATS_RECONCILE_DAYS", 7))
+)
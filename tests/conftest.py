@@ -0,0 +1,57 @@
+"""Shared fixtures.
+
+Tests that need MongoDB use the `mongo` fixture: it connects to
+MONGO_TEST_URL (default mongodb://localhost:27017) and skips the test
+when no mongod answers, e.g. `docker run -p 27017:27017 mongo:7`. Each
+test gets a scratch database that is dropped afterwards.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(MONGO_TEST_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod at {MONGO_TEST_URL}")
+    finally:
+        client.close()
+    return MONGO_TEST_URL
+
+
+@pytest.fixture
+def mongo(mongo_url):
+    """run(coroutine_function) awaits coroutine_function(db) on a fresh loop and scratch database"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import MongoClient
+
+    name = f"gaddi24x7_test_{uuid.uuid4().hex[:8]}"
+
+    def run(test):
+        async def main():
+            # Motor clients are bound to the loop they were created on
+            client = AsyncIOMotorClient(mongo_url, maxPoolSize=200)
+            try:
+                return await test(client[name])
+            finally:
+                client.close()
+
+        return asyncio.run(main())
+
+    yield run
+    MongoClient(mongo_url).drop_database(name)
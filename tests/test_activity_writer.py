@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.activity_writer import ActivityLogWriter
+
+
+class FakeActivityLogs:
+    def __init__(self, failures=0, during_failure=None):
+        self.failures = failures
+        self.during_failure = during_failure
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            if self.during_failure:
+                self.during_failure()
+            raise ConnectionError("no primary")
+        self.batches.append([doc["n"] for doc in docs])
+
+
+def _writer(logs, **options):
+    writer = ActivityLogWriter(**options)
+    writer._db = SimpleNamespace(activity_logs=logs)
+    return writer
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop_newest", [0, 1, 2]), ("drop_oldest", [2, 3, 4])])
+def test_overflow_policy(overflow, kept):
+    writer = _writer(FakeActivityLogs(), max_queue=3, overflow=overflow)
+    accepted = [writer.log({"n": n}) for n in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert [doc["n"] for doc in writer._queue] == kept
+    assert writer.stats["dropped"] == 2
+
+
+def test_flush_writes_in_batches():
+    logs = FakeActivityLogs()
+    writer = _writer(logs, batch_size=2)
+    for n in range(5):
+        writer.log({"n": n})
+    # A full batch wakes the background task early
+    assert writer._wake.is_set()
+    assert asyncio.run(writer.flush()) == 5
+    assert logs.batches == [[0, 1], [2, 3], [4]]
+    assert (writer.stats["written"], writer.stats["flushes"], len(writer)) == (5, 3, 0)
+
+
+def test_failed_batch_goes_back_in_front_while_it_fits():
+    def arrivals():
+        # Logged while the write is in flight; they leave one slot for the failed batch
+        writer.log({"n": 4})
+        writer.log({"n": 5})
+
+    logs = FakeActivityLogs(failures=1, during_failure=arrivals)
+    writer = _writer(logs, batch_size=3, max_queue=4)
+    for n in range(4):
+        writer.log({"n": n})
+
+    assert asyncio.run(writer.flush()) == 0
+    assert [doc["n"] for doc in writer._queue] == [0, 3, 4, 5]
+    assert writer.stats["errors"] == 1
+    assert writer.stats["dropped"] == 2
+
+    assert asyncio.run(writer.flush()) == 4
+    assert logs.batches == [[0, 3, 4], [5]]
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        ActivityLogWriter(overflow="block")
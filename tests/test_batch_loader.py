@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from services.batch_loader import BatchLoader
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Records each find() and answers {"id": {"$in": [...]}} from a dict"""
+
+    def __init__(self, docs, fail=False):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.fail = fail
+        self.finds = []
+
+    def find(self, query, projection=None):
+        keys = query["id"]["$in"]
+        self.finds.append((keys, projection))
+        if self.fail:
+            raise ConnectionError("no primary")
+        return FakeCursor([self.docs[k] for k in keys if k in self.docs])
+
+
+USERS = [{"id": "U1", "name": "Asha"}, {"id": "U2", "name": "Ravi"}]
+
+
+def test_concurrent_loads_share_one_query():
+    async def scenario():
+        users = FakeCollection(USERS)
+        loader = BatchLoader(users, "id", {"_id": 0, "name": 1})
+        first = await asyncio.gather(loader.load("U1"), loader.load("U2"), loader.load("U1"), loader.load("U9"))
+        # Memoised: no second query for keys already loaded
+        again = await loader.load_many(["U2", None, "U1", "U2"])
+        return users, loader, first, again
+
+    users, loader, first, again = asyncio.run(scenario())
+    assert [doc and doc["name"] for doc in first] == ["Asha", "Ravi", "Asha", None]
+    assert users.finds == [(["U1", "U2", "U9"], {"_id": 0, "name": 1, "id": 1})]
+    assert loader.queries == 1
+    assert list(again) == ["U2", "U1"]
+
+
+def test_failed_lookup_is_not_cached():
+    async def scenario():
+        users = FakeCollection(USERS, fail=True)
+        loader = BatchLoader(users)
+        with pytest.raises(ConnectionError):
+            await loader.load("U1")
+        users.fail = False
+        return await loader.load("U1"), loader.queries
+
+    doc, queries = asyncio.run(scenario())
+    assert doc["name"] == "Asha"
+    assert queries == 2
@@ -0,0 +1,76 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from bench_booking_parser import LABELLED, NOW  # noqa: E402
+from services.booking_parser import BookingParser  # noqa: E402
+from services.gazetteer import Gazetteer  # noqa: E402
+
+PLACES = Gazetteer.from_file()
+
+
+@pytest.fixture
+def parser():
+    return BookingParser(PLACES)
+
+
+@pytest.mark.parametrize("message", sorted(LABELLED))
+def test_labelled_phrasings(parser, message):
+    result = parser.parse(message, NOW)
+    got = (
+        (result.get("pickup") or {}).get("address"), (result.get("drop") or {}).get("address"),
+        result.get("vehicle_type"), result.get("trip_type")
+    )
+    assert got == LABELLED[message]
+    assert result["pickup"]["latitude"] is not None
+
+
+def test_rental_needs_no_drop(parser):
+    result = parser.parse("4 hour rental from cp", NOW)
+    assert (result["status"], result["trip_type"], result["drop"], result["missing"]) == (
+        "parsed", "rental-4hr", None, []
+    )
+    assert result["pickup"]["address"] == "Connaught Place"
+
+
+def test_unknown_place_is_incomplete(parser):
+    # The old parser split "Toronto" on "to"
+    result = parser.parse("Book ride from Toronto Tower to saket", NOW)
+    assert result["status"] == "incomplete"
+    assert result["missing"] == ["pickup_location"]
+    assert result["pickup"]["text"] == "toronto tower"
+    assert result["drop"]["address"] == "Saket"
+    assert parser.parse("hello there", NOW)["status"] == "invalid_format"
+    assert parser.stats["incomplete"] == 1 and parser.stats["invalid_format"] == 1
+
+
+@pytest.mark.parametrize("message, pickup_time", [
+    # NOW is 11:30 in Asia/Kolkata; times come back as naive UTC
+    ("in 20 min hauz khas to saket", datetime(2026, 1, 15, 6, 20)),
+    ("kal subah 9 baje CP se T3", datetime(2026, 1, 16, 3, 30)),
+    ("hauz khas to saket abhi", None),
+])
+def test_pickup_times(parser, message, pickup_time):
+    result = parser.parse(message, NOW)
+    assert result["status"] == "parsed"
+    assert result["pickup_time"] == pickup_time
+
+
+@pytest.mark.parametrize("text, name", [
+    ("conaught place gate 2", "Connaught Place"),
+    ("qutab minar", "Qutub Minar"),
+    ("akshar", "Akshardham"),
+    ("gk", "Greater Kailash"),
+])
+def test_gazetteer_matches(text, name):
+    assert PLACES.resolve(text)["name"] == name
+
+
+def test_gazetteer_is_strict_on_short_keys():
+    # One edit from "gk" and "ggn", but short names allow no typos
+    assert PLACES.resolve("gkn") is None
+    assert PLACES.resolve("") is None
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+
+from services import dispatch_service
+from services.dispatch_service import DispatchEngine, greedy_assignment
+from services.driver_connections import DriverConnection, DriverConnectionManager
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, frame):
+        self.sent.append(frame)
+
+    async def close(self, code=None):
+        pass
+
+
+def _connect(manager, driver_id, queue_size=4):
+    socket = FakeSocket()
+    connection = DriverConnection(driver_id, "session", socket, queue_size)
+    connection.sender = asyncio.create_task(connection._send_loop())
+    manager._connections[driver_id] = connection
+    return connection, socket
+
+
+async def _requested_ride(db, engine, ride_id="R1"):
+    ride = {
+        "id": ride_id,
+        "status": "requested",
+        "pickup_location": {"address": "A", "latitude": 28.6, "longitude": 77.2},
+        "drop_location": {"address": "B", "latitude": 28.5, "longitude": 77.3},
+        "vehicle_type": "sedan",
+        "created_at": datetime.utcnow()
+    }
+    await db.rides.insert_one(dict(ride))
+    engine._queue(ride)
+    return engine._pending[ride_id]
+
+
+def test_greedy_assignment_takes_cheapest_pairs_first():
+    cost = np.array([[1.0, 3.0, np.inf], [2.0, 5.0, np.inf], [np.inf, np.inf, np.inf]])
+    # Ride 0 takes driver 0; ride 1 falls back to driver 1; ride 2 has no usable driver
+    assert sorted(greedy_assignment(cost)) == [(0, 0), (1, 1)]
+    assert greedy_assignment(np.full((2, 2), np.inf)) == []
+
+
+def test_offer_reaches_a_driver_on_another_worker(mongo, monkeypatch):
+    async def scenario(db):
+        leader, other = DriverConnectionManager(relay_interval=0), DriverConnectionManager(relay_interval=0)
+        leader._db = other._db = db
+        _, socket = _connect(other, "D1")
+        monkeypatch.setattr(dispatch_service, "connection_manager", leader)
+        engine = DispatchEngine()
+        engine._db = db
+        ride = await _requested_ride(db, engine)
+
+        offered = await engine._offer(ride, "D1", 0.4)
+        relayed = [await other.relay_once(), await other.relay_once()]
+        await asyncio.sleep(0)
+        return offered, relayed, socket.sent, await db.rides.find_one({"id": "R1"})
+
+    offered, relayed, sent, stored = mongo(scenario)
+    assert offered
+    assert relayed == [1, 0]
+    assert len(sent) == 1 and '"ride_id":"R1"' in sent[0]
+    assert stored["offered_driver_id"] == "D1"
+
+
+def test_undeliverable_offers_count_toward_max_offers(mongo, monkeypatch):
+    async def scenario(db):
+        manager = DriverConnectionManager(relay_interval=0)
+        manager._db = db
+        monkeypatch.setattr(dispatch_service, "connection_manager", manager)
+        engine = DispatchEngine(max_offers=2)
+        engine._db = db
+        ride = await _requested_ride(db, engine)
+        for driver_id in ("D1", "D2"):
+            # Connected here, but the outbound queue is already full
+            connection, _ = _connect(manager, driver_id, queue_size=1)
+            connection.sender.cancel()
+            connection.queue.put_nowait("backlog")
+            assert not await engine._offer(ride, driver_id, 0.4)
+        engine._abandon_exhausted()
+        return ride.offers, dict(engine._pending), engine.stats
+
+    offers, pending, stats = mongo(scenario)
+    assert offers == 2
+    assert pending == {}
+    assert stats["offers_undeliverable"] == 2 and stats["rides_abandoned"] == 1
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from services.driver_connections import FRAME_AUTH_OK, FRAME_ERROR, FRAME_PONG, DriverConnectionManager
+
+
+class ScriptedSocket:
+    """Plays back ASGI receive messages, then disconnects"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        # Lets the connection's sender drain between frames
+        await asyncio.sleep(0.01)
+        if not self.messages:
+            return {"type": "websocket.disconnect", "code": 1000}
+        return self.messages.pop(0)
+
+    async def send_text(self, frame):
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code=None):
+        pass
+
+
+def _serve(messages):
+    async def scenario():
+        manager = DriverConnectionManager()
+
+        async def authenticate(websocket, db):
+            return "D1"
+
+        manager._authenticate = authenticate
+        socket = ScriptedSocket(messages)
+        await manager.serve(socket, None)
+        return manager, socket
+
+    return asyncio.run(scenario())
+
+
+def test_binary_frame_is_counted_and_ignored():
+    manager, socket = _serve([
+        {"type": "websocket.receive", "bytes": b"\x00\x01"},
+        {"type": "websocket.receive", "text": '["p"]'}
+    ])
+    assert [frame[0] for frame in socket.sent] == [FRAME_AUTH_OK, FRAME_ERROR, FRAME_PONG]
+    assert manager.stats["bad_frames"] == 1
+    assert manager.stats["frames_in"] == 2
+    assert manager.stats["disconnected"] == 1
+
+
+def test_invalid_json_is_counted_and_ignored():
+    manager, socket = _serve([{"type": "websocket.receive", "text": "{not json"}])
+    assert [frame[0] for frame in socket.sent] == [FRAME_AUTH_OK, FRAME_ERROR]
+    assert manager.stats["bad_frames"] == 1
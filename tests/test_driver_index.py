@@ -0,0 +1,80 @@
+import numpy as np
+
+from services.driver_index import DriverSpatialIndex
+from services.geo_service import haversine_km
+
+CENTER = (28.6139, 77.2090)
+
+
+def _populated(count=500, seed=3):
+    rng = np.random.default_rng(seed)
+    index = DriverSpatialIndex(cell_size_km=1.0, initial_capacity=16)
+    drivers = {}
+    for i in range(count):
+        latitude = float(CENTER[0] + rng.uniform(-0.2, 0.2))
+        longitude = float(CENTER[1] + rng.uniform(-0.2, 0.2))
+        vehicle_type = "sedan" if i % 3 else "suv"
+        index.upsert(f"D{i}", vehicle_type, latitude, longitude, user_id=f"U{i}")
+        drivers[f"D{i}"] = (latitude, longitude, vehicle_type)
+    return index, drivers
+
+
+def _brute_force(drivers, radius_km, vehicle_type=None):
+    found = []
+    for driver_id, (latitude, longitude, vehicle) in drivers.items():
+        distance = float(haversine_km(CENTER[0], CENTER[1], latitude, longitude))
+        if distance <= radius_km and vehicle_type in (None, vehicle):
+            found.append((distance, driver_id))
+    return [driver_id for _, driver_id in sorted(found)]
+
+
+def test_within_radius_matches_brute_force():
+    # initial_capacity=16 also exercises growing the arrays
+    index, drivers = _populated()
+    assert len(index) == 500
+    assert [d for d, _ in index.within_radius(*CENTER, 5.0)] == _brute_force(drivers, 5.0)
+    assert [d for d, _ in index.within_radius(*CENTER, 8.0, vehicle_type="suv")] == _brute_force(drivers, 8.0, "suv")
+    assert index.within_radius(*CENTER, 8.0, vehicle_type="bike") == []
+
+
+def test_nearest_expands_until_k_found():
+    index, drivers = _populated()
+    nearest = index.nearest(*CENTER, k=7, max_radius_km=30.0)
+    assert [d for d, _ in nearest] == _brute_force(drivers, 30.0)[:7]
+    distances = [distance for _, distance in nearest]
+    assert distances == sorted(distances)
+
+
+def test_moves_and_removals_change_cells():
+    index = DriverSpatialIndex(cell_size_km=1.0)
+    index.upsert("D1", "sedan", *CENTER, user_id="U1")
+    index.upsert("D2", "sedan", CENTER[0] + 0.001, CENTER[1], user_id="U2")
+
+    # About 11 km north: out of a 2 km search, then back in
+    assert index.update_position("D1", CENTER[0] + 0.1, CENTER[1])
+    assert [d for d, _ in index.within_radius(*CENTER, 2.0)] == ["D2"]
+    index.update_position("D1", *CENTER)
+    assert [d for d, _ in index.within_radius(*CENTER, 2.0)] == ["D1", "D2"]
+
+    index.remove("D2")
+    assert "D2" not in index
+    assert [d for d, _ in index.within_radius(*CENTER, 2.0)] == ["D1"]
+    assert not index.update_position("D2", *CENTER)
+
+
+def test_online_driver_without_position_is_indexed_on_first_ping():
+    index = DriverSpatialIndex()
+    index.sync({"id": "D1", "user_id": "U1", "vehicle_type": "auto", "is_online": True, "is_verified": True})
+    assert "D1" in index and len(index) == 0
+    assert index.within_radius(*CENTER, 5.0) == []
+
+    assert index.update_position("D1", *CENTER)
+    assert index.describe("D1") == {
+        "id": "D1",
+        "user_id": "U1",
+        "vehicle_type": "auto",
+        "current_location": {"type": "Point", "coordinates": [CENTER[1], CENTER[0]]}
+    }
+
+    index.sync({"id": "D1", "vehicle_type": "auto", "is_online": False, "is_verified": True})
+    assert "D1" not in index
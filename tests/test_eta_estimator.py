@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from models import Location, Ride, TripType, VehiclePricing
+from services.bill_service import BillGenerator
+from services.eta_estimator import ETAEstimator
+
+PRICING = VehiclePricing(vehicle_type="sedan", base_price=50, price_per_km=12, price_per_min=1.5, minimum_fare=100)
+
+
+def _ride(trip_type=TripType.ONE_WAY):
+    # Connaught Place to Noida: about 19.6 km in a straight line
+    return Ride(
+        customer_id="C1",
+        driver_id="D1",
+        pickup_location=Location(address="Connaught Place", latitude=28.6315, longitude=77.2167),
+        drop_location=Location(address="Noida", latitude=28.5355, longitude=77.391),
+        vehicle_type="sedan",
+        trip_type=trip_type,
+        distance=26.5,
+        estimated_duration=50,
+        estimated_fare=450,
+        started_at=datetime(2024, 1, 1, 6, 30)
+    )
+
+
+def test_plausible_reading_is_billed_unflagged():
+    assert ETAEstimator().review_completion(_ride(), 25.0, 45) == (25.0, 45, [])
+
+
+def test_short_trip_is_billed_at_the_meter():
+    estimator = ETAEstimator()
+    ride = _ride()
+    distance, duration, flags = estimator.review_completion(ride, 4.0, 12)
+    assert (distance, duration, flags) == (4.0, 12, ["distance_below_straight_line"])
+
+    bill = BillGenerator.generate_bill(ride, PRICING, distance, duration)
+    meter = BillGenerator.generate_bill(ride, PRICING, 4.0, 12)
+    assert bill.total == meter.total
+    assert "Distance Charge (4.0 km)" in [item.description for item in bill.items]
+    assert estimator.stats["completions_clamped"] == 0
+
+
+def test_over_counted_distance_is_clamped_to_max_speed():
+    estimator = ETAEstimator(max_speed_kmh=110.0)
+    distance, duration, flags = estimator.review_completion(_ride(), 500.0, 10)
+    assert flags[0] == "speed_above_max"
+    assert distance == pytest.approx(110 * 11 / 60, abs=0.1)
+    assert duration == 10
+    assert estimator.stats["completions_clamped"] == 1
+
+
+def test_readings_far_above_the_estimate_are_flagged_but_billed():
+    assert ETAEstimator().review_completion(_ride(), 25.0, 400) == (25.0, 400, ["duration_above_estimate"])
+
+
+def test_rentals_skip_route_checks():
+    assert ETAEstimator().review_completion(_ride(TripType.RENTAL_8HR), 1.0, 480) == (1.0, 480, [])
+
+
+def test_negative_readings_are_rejected():
+    with pytest.raises(ValueError):
+        ETAEstimator().review_completion(_ride(), -1.0, 10)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from models import TripType
+from services.bill_service import BillGenerator
+from services.fare_quote import TRIP_TYPES, FareMatrix, fare_matrix
+from services.pricing_cache import PricingTable
+
+TABLE = PricingTable(1, [
+    {"vehicle_type": "sedan", "base_price": 50, "price_per_km": 12, "price_per_min": 1.5, "minimum_fare": 100},
+    {"vehicle_type": "auto", "base_price": 25.5, "price_per_km": 9.3, "price_per_min": 0.7, "minimum_fare": 60,
+     "trip_multipliers": {"round-trip": 1.7}},
+    {"vehicle_type": "suv", "base_price": 80, "price_per_km": 17.1, "price_per_min": 2.2, "minimum_fare": 180},
+])
+
+
+def test_matrix_equals_calculate_fare_exactly():
+    rng = np.random.default_rng(5)
+    distance = np.round(rng.uniform(0, 80, 200), 1)
+    duration = rng.integers(0, 240, 200)
+    vehicles, fares = FareMatrix(TABLE).quote(distance, duration)
+
+    assert vehicles == ["auto", "sedan", "suv"]
+    assert fares.shape == (200, 3, len(TRIP_TYPES))
+    for r in range(len(distance)):
+        for v, vehicle_type in enumerate(vehicles):
+            for t, trip_type in enumerate(TRIP_TYPES):
+                expected = BillGenerator.calculate_fare(
+                    TABLE.get(vehicle_type), float(distance[r]), int(duration[r]), TripType(trip_type)
+                )
+                # Bit-for-bit, not approximately: quotes must match the bill
+                assert fares[r, v, t] == expected
+
+
+def test_select_keeps_request_order_and_rejects_unknown():
+    matrix = FareMatrix(TABLE)
+    vehicles, fares = matrix.quote(np.array([0.0]), np.array([0]), ["suv", "auto"])
+    assert vehicles == ["suv", "auto"]
+    # A zero-length route costs the minimum fare
+    assert fares[0, :, 0].tolist() == [180.0, 60.0]
+    with pytest.raises(KeyError):
+        matrix.select(["sedan", "bike"])
+
+
+def test_matrix_compiled_once_per_table():
+    assert fare_matrix(TABLE) is fare_matrix(TABLE)
+    assert fare_matrix(PricingTable(2, [])) is not fare_matrix(TABLE)
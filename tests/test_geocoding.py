@@ -0,0 +1,89 @@
+import asyncio
+
+from services.gazetteer import Gazetteer
+from services.geocoding import FakeGeocodeProvider, GeocodeCache, GeocodeError, GeocodeProvider
+
+PLACES = Gazetteer.from_file()
+INDIA_GATE = PLACES.resolve("india gate")
+
+
+class FailingProvider(GeocodeProvider):
+    name = "failing"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def geocode(self, address):
+        self.calls += 1
+        raise GeocodeError("quota exceeded")
+
+    async def reverse(self, latitude, longitude):
+        self.calls += 1
+        raise GeocodeError("quota exceeded")
+
+
+def _cache(provider, **options):
+    cache = GeocodeCache(provider="none", **options)
+    cache.provider = provider
+    return cache
+
+
+def test_keys_normalise_addresses_and_round_points():
+    cache = GeocodeCache(precision=4)
+    assert cache.address_key("IGI Airport, Terminal-3") == cache.address_key("igi  airport terminal 3")
+    assert cache.point_key(28.61291, 77.22951) == cache.point_key(28.61289, 77.22949) == "rev:28.6129,77.2295"
+    assert cache.point_key(-0.00001, 0.0) == "rev:0.0000,0.0000"
+
+
+def test_auto_provider_prefers_google():
+    async def scenario():
+        cache = GeocodeCache(provider="auto")
+        chosen = []
+        for keys in ({"google_maps_key": "g", "geoapify_key": "a"}, {"geoapify_key": "a"}, {}):
+            cache.configure(keys)
+            chosen.append(cache.provider.name if cache.provider else None)
+        return chosen
+
+    assert asyncio.run(scenario()) == ["google", "geoapify", None]
+
+
+def test_fake_provider_reverse_within_radius():
+    provider = FakeGeocodeProvider(PLACES, reverse_radius_km=2.0)
+    near = asyncio.run(provider.reverse(INDIA_GATE["latitude"] + 0.002, INDIA_GATE["longitude"]))
+    assert near["address"] == "India Gate"
+    # Middle of the Arabian Sea
+    assert asyncio.run(provider.reverse(15.0, 65.0)) is None
+
+
+def test_lookups_hit_lru_then_store_and_share_provider_calls(mongo):
+    async def scenario(db):
+        provider = FakeGeocodeProvider(PLACES, latency=0.01)
+        first = _cache(provider)
+        concurrent = await asyncio.gather(*(first.geocode(db, "India Gate") for _ in range(5)))
+        again = await first.geocode(db, "india gate!")
+        missing = [await first.geocode(db, "xyzzy plaza") for _ in range(2)]
+
+        # Another worker: empty LRU, same store
+        second = _cache(provider)
+        shared = await second.geocode(db, "INDIA GATE")
+        return provider.calls, first.stats, second.stats, concurrent, again, missing, shared
+
+    calls, first, second, concurrent, again, missing, shared = mongo(scenario)
+    assert calls == 2
+    assert all(result["address"] == "India Gate" for result in concurrent + [again, shared])
+    assert missing == [None, None]
+    assert (first["provider_calls"], first["coalesced"], first["lru_hits"], first["not_found"]) == (2, 4, 2, 1)
+    assert (second["store_hits"], second["provider_calls"]) == (1, 0)
+
+
+def test_provider_errors_are_not_cached(mongo):
+    async def scenario(db):
+        provider = FailingProvider()
+        cache = _cache(provider)
+        results = [await cache.reverse(db, 28.6, 77.2) for _ in range(2)]
+        return results, provider.calls, cache.stats, await db.geocode_cache.count_documents({})
+
+    results, calls, stats, stored = mongo(scenario)
+    assert results == [None, None]
+    assert calls == 2 and stats["provider_errors"] == 2
+    assert stored == 0
@@ -0,0 +1,62 @@
+from pymongo import ASCENDING
+
+from indexes import INDEXES, QUERY_SHAPES, check_query_plans, ensure_indexes, index_drift
+
+
+def test_declared_indexes_apply_without_drift(mongo):
+    async def scenario(db):
+        first = await ensure_indexes(db)
+        # Re-applying at the next startup is a no-op
+        second = await ensure_indexes(db)
+        return first, second
+
+    first, second = mongo(scenario)
+    assert first == {}
+    assert second == {}
+
+
+def test_drift_reports_missing_and_undeclared_indexes(mongo):
+    async def scenario(db):
+        await ensure_indexes(db)
+        await db.rides.drop_index("rides_customer_created")
+        await db.rides.create_index([("otp", ASCENDING)], name="rides_otp_adhoc")
+        return await index_drift(db)
+
+    drift = mongo(scenario)
+    assert drift == {"rides": {"missing": ["rides_customer_created"], "changed": [], "undeclared": ["rides_otp_adhoc"]}}
+
+
+def test_drift_reports_changed_options(mongo):
+    async def scenario(db):
+        await ensure_indexes(db)
+        await db.users.drop_index("users_id")
+        await db.users.create_index([("id", ASCENDING)], name="users_id", unique=True)
+        return await index_drift(db)
+
+    assert mongo(scenario)["users"]["changed"] == ["users_id"]
+
+
+def test_no_query_shape_is_a_collection_scan(mongo):
+    async def scenario(db):
+        await ensure_indexes(db)
+        # explain() on a missing collection short-circuits to EOF; give each one a document
+        for collection in {collection for _, collection, _, _ in QUERY_SHAPES} | set(INDEXES):
+            await db[collection].insert_one({"seed": True})
+        return await check_query_plans(db)
+
+    results = mongo(scenario)
+    assert len(results) == len(QUERY_SHAPES)
+    assert [r["name"] for r in results if r["collscan"]] == []
+
+
+def test_retired_activity_ttl_is_dropped(mongo):
+    async def scenario(db):
+        # The old backstop expired rows by age, archived or not
+        await db.activity_logs.create_index([("created_at", ASCENDING)], name="activity_logs_ttl", expireAfterSeconds=86400)
+        drift = await ensure_indexes(db)
+        return drift, [info["name"] async for info in db.activity_logs.list_indexes()]
+
+    drift, names = mongo(scenario)
+    assert drift == {}
+    assert "activity_logs_ttl" not in names
+    assert {"activity_logs_created", "activity_logs_exported_ttl"} <= set(names)
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services.location_buffer import LocationWriteBuffer
+
+T0 = datetime(2024, 1, 1, 10, 0, 0)
+
+
+class FailingDrivers:
+    def __init__(self):
+        self.calls = 0
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+        raise ConnectionError("primary stepped down")
+
+
+def test_pings_coalesce_to_the_newest_per_driver():
+    buffer = LocationWriteBuffer(max_pending=2)
+    assert buffer.add("D1", 28.60, 77.20, T0)
+    assert buffer.add("D1", 28.61, 77.21, T0 + timedelta(seconds=2))
+    # Older than the queued one: dropped
+    assert not buffer.add("D1", 28.62, 77.22, T0 + timedelta(seconds=1))
+
+    assert len(buffer) == 1
+    assert buffer._pending["D1"] == (28.61, 77.21, T0 + timedelta(seconds=2))
+    assert (buffer.stats["pings"], buffer.stats["coalesced"], buffer.stats["stale_pings"]) == (3, 1, 1)
+
+    assert not buffer._wake.is_set()
+    buffer.add("D2", 28.5, 77.3, T0)
+    assert buffer._wake.is_set()
+
+
+def test_failed_flush_requeues_unless_superseded():
+    async def scenario():
+        buffer = LocationWriteBuffer()
+        drivers = FailingDrivers()
+        buffer._db = SimpleNamespace(drivers=drivers)
+        buffer.add("D1", 28.60, 77.20, T0)
+        buffer.add("D2", 28.50, 77.30, T0)
+
+        original = drivers.bulk_write
+
+        async def superseded_meanwhile(operations, ordered=True):
+            # A newer ping arrives while the write is in flight
+            buffer.add("D2", 28.51, 77.31, T0 + timedelta(seconds=5))
+            await original(operations, ordered)
+
+        drivers.bulk_write = superseded_meanwhile
+        written = await buffer.flush()
+        return buffer, drivers, written
+
+    buffer, drivers, written = asyncio.run(scenario())
+    assert written == 0 and drivers.calls == 1
+    assert buffer.stats["errors"] == 1
+    assert buffer._pending == {
+        "D1": (28.60, 77.20, T0),
+        "D2": (28.51, 77.31, T0 + timedelta(seconds=5))
+    }
+
+
+def test_late_flush_does_not_overwrite_a_newer_position(mongo):
+    async def scenario(db):
+        await db.drivers.insert_many([{"id": "D1"}, {"id": "D2"}])
+        buffer = LocationWriteBuffer()
+        buffer._db = db
+        buffer.add("D1", 28.61, 77.21, T0 + timedelta(seconds=10))
+        buffer.add("D2", 28.50, 77.30, T0)
+        first = await buffer.flush()
+        # A ping for D1 that was delayed past the newer one
+        buffer.add("D1", 28.60, 77.20, T0)
+        second = await buffer.flush()
+        docs = {doc["id"]: doc async for doc in db.drivers.find({}, {"_id": 0})}
+        return buffer, first, second, docs
+
+    buffer, first, second, docs = mongo(scenario)
+    assert (first, second) == (2, 1)
+    assert buffer.stats["stale_writes"] == 1
+    assert docs["D1"]["current_location"]["coordinates"] == [77.21, 28.61]
+    assert docs["D1"]["location_updated_at"] == T0 + timedelta(seconds=10)
+    assert docs["D2"]["current_location"]["coordinates"] == [77.30, 28.50]
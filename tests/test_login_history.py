@@ -0,0 +1,25 @@
+from services import login_history
+from services.login_history import get_login_events, record_login
+
+
+def test_embedded_history_is_capped(mongo, monkeypatch):
+    monkeypatch.setattr(login_history, "EMBEDDED_LOGINS", 3)
+
+    async def scenario(db):
+        await db.users.insert_one({"id": "U1", "phone": "9000000001", "login_history": []})
+        returned = [await record_login(db, {"phone": "9000000001"}, f"10.0.0.{i}", "android") for i in range(5)]
+        missing = await record_login(db, {"phone": "9999999999"}, "10.0.0.9", "ios")
+        stored = await db.users.find_one({"id": "U1"}, {"_id": 0})
+        return returned, missing, stored, await get_login_events(db, "U1"), await db.login_events.count_documents({})
+
+    returned, missing, stored, events, total_events = mongo(scenario)
+    # The login response never carries the embedded history
+    assert all("login_history" not in user for user in returned)
+    assert missing is None
+    assert [entry["ip_address"] for entry in stored["login_history"]] == ["10.0.0.2", "10.0.0.3", "10.0.0.4"]
+    assert stored["last_login"] == stored["login_history"][-1]["timestamp"]
+    # The full history stays in login_events, newest first (logins within a millisecond tie)
+    assert sorted(event["ip_address"] for event in events) == [f"10.0.0.{i}" for i in range(5)]
+    timestamps = [event["timestamp"] for event in events]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert total_events == 5
@@ -0,0 +1,77 @@
+import asyncio
+import random
+import sys
+from pathlib import Path
+
+from services.n8n_service import N8NIntegrationService
+
+# The webhook stand-in is shared with the n8n load benchmark
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from fake_webhook import FakeWebhook  # noqa: E402
+
+
+def run(webhook, scenario, **options):
+    """Serve `webhook` on a free port and await scenario(service) against it"""
+    async def main():
+        server = await webhook.serve(0)
+        port = server.sockets[0].getsockname()[1]
+        service = N8NIntegrationService(webhook_url=f"http://127.0.0.1:{port}/webhook", backoff_base=0.001, **options)
+        try:
+            return await scenario(service)
+        finally:
+            await service.close()
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(main())
+
+
+def send(service, bill_id, idempotency_key=None):
+    return service.send_bill("9000000000", "bill", bill_id, idempotency_key)
+
+
+def test_retryable_failures_give_up_after_retries():
+    webhook = FakeWebhook(failure_rate=1.0, failure_status=503)
+    result = run(webhook, lambda service: send(service, "B1"), retries=3)
+    assert result == {"status": "error", "message": "HTTP 503"}
+    assert webhook.stats["received"] == 4
+
+
+def test_client_errors_are_not_retried():
+    webhook = FakeWebhook(failure_rate=1.0, failure_status=400)
+
+    async def scenario(service):
+        return await send(service, "B1"), service.stats
+
+    result, stats = run(webhook, scenario, retries=3)
+    assert result["status"] == "error"
+    assert webhook.stats["received"] == 1
+    assert stats["retries"] == 0 and stats["failed"] == 1
+
+
+def test_retries_reuse_one_idempotency_key_per_send():
+    random.seed(11)
+    webhook = FakeWebhook(failure_rate=0.3)
+
+    async def scenario(service):
+        return await asyncio.gather(*(send(service, f"B{i}") for i in range(100)))
+
+    results = run(webhook, scenario, retries=8)
+    assert [r["status"] for r in results] == ["success"] * 100
+    assert webhook.stats["failed"] > 0
+    assert webhook.stats["accepted"] == 100
+    assert webhook.stats["duplicates"] == 0
+    assert len(webhook.accepted_keys) == 100
+
+
+def test_caller_key_is_sent_unchanged():
+    webhook = FakeWebhook()
+
+    async def scenario(service):
+        await send(service, "B1", idempotency_key="bill-B1")
+        await send(service, "B1", idempotency_key="bill-B1")
+
+    run(webhook, scenario)
+    assert webhook.accepted_keys == {"bill-B1"}
+    assert webhook.stats["duplicates"] == 1
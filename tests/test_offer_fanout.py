@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+from services.driver_index import driver_index
+from services.n8n_service import N8NIntegrationService
+from services.offer_fanout import OfferFanout
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from fake_webhook import FakeWebhook  # noqa: E402
+
+RIDE = {
+    "id": "R1",
+    "status": "requested",
+    "vehicle_type": "sedan",
+    "estimated_fare": 300,
+    "pickup_location": {"address": "Connaught Place", "latitude": 28.6315, "longitude": 77.2167}
+}
+
+
+def _alert(mongo, close_elsewhere):
+    webhook = FakeWebhook()
+
+    async def scenario(db):
+        server = await webhook.serve(0)
+        sender = N8NIntegrationService(webhook_url=f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/webhook")
+        fanout = OfferFanout(sender, drivers_per_ride=5)
+        driver_index.clear()
+        for i in range(5):
+            driver_index.upsert(f"D{i}", "sedan", 28.6315 + i * 0.001, 77.2167, user_id=f"U{i}")
+        fanout.contacts.prime((f"U{i}", f"900000000{i}", f"Driver {i}") for i in range(5))
+        await db.rides.insert_one(dict(RIDE))
+        try:
+            scheduled = await fanout.alert(db, RIDE, "Asha")
+            if close_elsewhere:
+                # Accepted through another worker: this worker's ride_closed() never runs
+                await db.rides.update_one({"id": "R1"}, {"$set": {"status": "accepted"}})
+            await fanout.wait("R1")
+            return scheduled, fanout.stats
+        finally:
+            driver_index.clear()
+            await sender.close()
+            server.close()
+
+    scheduled, stats = mongo(scenario)
+    return scheduled, stats, webhook.stats["received"]
+
+
+def test_open_ride_alerts_every_driver(mongo):
+    scheduled, stats, received = _alert(mongo, close_elsewhere=False)
+    assert scheduled == 5
+    assert stats["offers_sent"] == 5 and received == 5
+
+
+def test_ride_taken_on_another_worker_sends_nothing(mongo):
+    scheduled, stats, received = _alert(mongo, close_elsewhere=True)
+    assert scheduled == 5
+    assert stats["offers_closed"] == 5
+    assert received == 0
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import otp_service as otp_module
+from services.otp_service import InMemoryOTPStore, OTPError, OTPService
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(otp_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_sliding_window_limit_and_retry_after(clock):
+    store = InMemoryOTPStore()
+
+    async def scenario():
+        results = [await store.hit("send:phone:1", 3, 600) for _ in range(4)]
+        clock.value += 601
+        return results, await store.hit("send:phone:1", 3, 600)
+
+    results, later = asyncio.run(scenario())
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == pytest.approx(600)
+    assert later == (True, 0.0)
+
+
+def test_expired_buckets_are_freed(clock):
+    store = InMemoryOTPStore(sweep_interval=60)
+
+    async def scenario():
+        for i in range(5000):
+            await store.hit(f"send:phone:{i}", 3, 600)
+        held = len(store._windows)
+        clock.value += 601
+        await store.hit("send:phone:fresh", 3, 600)
+        return held, len(store._windows)
+
+    held, after = asyncio.run(scenario())
+    assert held == 5000
+    assert after == 1
+
+
+def test_code_verifies_once(clock):
+    service = OTPService(store="memory", secret="s", echo=True, max_attempts=2)
+
+    async def scenario():
+        code = await service.send("9000000001", "10.0.0.1")
+        await service.verify("9000000001", code, "10.0.0.1")
+        with pytest.raises(OTPError) as reused:
+            await service.verify("9000000001", code, "10.0.0.1")
+        return reused.value.status_code
+
+    assert asyncio.run(scenario()) == 400
+    assert service.stats["verified"] == 1
+
+
+def test_wrong_guesses_exhaust_the_code(clock):
+    service = OTPService(store="memory", secret="s", echo=True, max_attempts=2)
+
+    async def scenario():
+        code = await service.send("9000000001", None)
+        wrong = "0000" if code != "0000" else "1111"
+        for _ in range(2):
+            with pytest.raises(OTPError):
+                await service.verify("9000000001", wrong, None)
+        # Out of attempts: even the right code is refused
+        with pytest.raises(OTPError) as exhausted:
+            await service.verify("9000000001", code, None)
+        return exhausted.value.detail
+
+    assert "too many attempts" in asyncio.run(scenario())
+
+
+def test_phone_send_limit_is_429(clock):
+    service = OTPService(store="memory", secret="s", phone_limit=(2, 600))
+
+    async def scenario():
+        await service.send("9000000001", None)
+        await service.send("9000000001", None)
+        with pytest.raises(OTPError) as limited:
+            await service.send("9000000001", None)
+        return limited.value
+
+    limited = asyncio.run(scenario())
+    assert limited.status_code == 429 and limited.retry_after == 601
+
+
+def test_mongo_store_requires_secret():
+    with pytest.raises(RuntimeError):
+        OTPService(store="mongo", secret=None).start(db=None)
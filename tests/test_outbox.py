@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+from models import Bill, Ride
+from services.n8n_service import N8NIntegrationService
+from services.outbox import NotificationOutbox
+
+FROZEN = 1700000000.0
+
+
+def _rides_in_one_second(count):
+    with patch("models.datetime") as clock:
+        clock.utcnow.return_value.timestamp.return_value = FROZEN
+        return [
+            Ride(
+                customer_id="C1",
+                pickup_location={"address": "A", "latitude": 28.6, "longitude": 77.2},
+                drop_location={"address": "B", "latitude": 28.5, "longitude": 77.4},
+                vehicle_type="sedan",
+                distance=20,
+                estimated_duration=40,
+                estimated_fare=400
+            )
+            for _ in range(count)
+        ]
+
+
+def test_ride_and_bill_ids_do_not_repeat_within_a_second():
+    rides = _rides_in_one_second(1000)
+    assert all(ride.id.startswith(f"R{int(FROZEN)}") for ride in rides)
+    assert len({ride.id for ride in rides}) == 1000
+    bills = {Bill(ride_id="R", customer_id="C", driver_id="D", items=[], subtotal=0, tax=0, discount=0, total=0).id
+             for _ in range(1000)}
+    assert len(bills) == 1000
+
+
+def test_rides_booked_in_the_same_second_each_get_a_notification(mongo):
+    async def scenario(db):
+        outbox = NotificationOutbox(N8NIntegrationService(webhook_url="http://127.0.0.1:9/webhook"))
+        queued = []
+        for ride in _rides_in_one_second(2):
+            queued.append(await outbox.enqueue(db, "bill", f"bill:{ride.id}", {"phone": "9", "bill_text": "", "bill_id": "B"}))
+        # A retried completion of the second ride is deduplicated
+        queued.append(await outbox.enqueue(db, "bill", f"bill:{ride.id}", {"phone": "9", "bill_text": "", "bill_id": "B"}))
+        return queued, await db.notification_outbox.count_documents({})
+
+    queued, stored = mongo(scenario)
+    assert queued == [True, True, False]
+    assert stored == 2
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from routes.admin import get_all_users
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_query
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 1, 10, 0, 0, 123456)
+    token = encode_cursor({"created_at": created_at, "id": "U123"})
+    assert "=" not in token
+    assert decode_cursor(token) == (created_at, "U123")
+
+
+# Not base64 JSON; "{}"; a timestamp that is not ISO 8601
+@pytest.mark.parametrize("token", ["not-a-cursor!", "e30", "WyJ5ZXN0ZXJkYXkiLCJVMSJd"])
+def test_invalid_cursor(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_keyset_query_keeps_filter():
+    created_at = datetime(2024, 1, 1)
+    token = encode_cursor({"created_at": created_at, "id": "U9"})
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": "U9"}}
+    ]}
+    assert keyset_query({"role": "driver"}, None) == {"role": "driver"}
+    assert keyset_query({}, token) == after
+    assert keyset_query({"role": "driver"}, token) == {"$and": [{"role": "driver"}, after]}
+
+
+def test_user_listing_pages(mongo):
+    async def scenario(db):
+        base = datetime(2024, 1, 1)
+        # Equal timestamps in pairs: the id tie-break must neither skip nor repeat
+        await db.users.insert_many([
+            {"id": f"U{i:02d}", "name": f"User {i}", "role": "customer", "created_at": base + timedelta(minutes=i // 2)}
+            for i in range(25)
+        ])
+        first = await get_all_users(role=None, cursor=None, limit=10, count=None, page=None, db=db)
+        pages = [first]
+        while pages[-1]["next_cursor"]:
+            pages.append(await get_all_users(
+                role=None, cursor=pages[-1]["next_cursor"], limit=10, count=None, page=None, db=db
+            ))
+        return pages
+
+    pages = mongo(scenario)
+    first = pages[0]
+    assert (first["total"], first["page"], first["pages"], first["has_more"]) == (25, 1, 3, True)
+    assert [page["total"] for page in pages[1:]] == [None, None]
+    assert "page" not in pages[1]
+    ids = [user["id"] for page in pages for user in page["users"]]
+    assert ids == [f"U{i:02d}" for i in reversed(range(25))]
@@ -0,0 +1,45 @@
+import pytest
+
+from services.pricing_cache import PricingCache, PricingTable
+
+SEDAN = {"vehicle_type": "sedan", "base_price": 50, "price_per_km": 12, "price_per_min": 1.5, "minimum_fare": 100}
+
+
+def test_table_resolves_every_trip_type():
+    table = PricingTable(3, [{**SEDAN, "trip_multipliers": {"round-trip": 2.0}}])
+    assert table.version == 3
+    assert table.get("sedan").trip_multipliers == {
+        "round-trip": 2.0, "one-way": 1.0, "rental-4hr": 1.0, "rental-8hr": 1.0, "rental-12hr": 1.0
+    }
+    assert table.get("bike") is None
+
+
+def test_invalid_config_is_rejected_before_writing(mongo):
+    async def scenario(db):
+        cache = PricingCache()
+        with pytest.raises(ValueError):
+            await cache.update(db, {"vehicles": [{"vehicle_type": "sedan", "base_price": "cheap"}]})
+        return await db.pricing_config.count_documents({})
+
+    assert mongo(scenario) == 0
+
+
+def test_update_reaches_other_workers_on_version_check(mongo):
+    async def scenario(db):
+        writer, reader = PricingCache(), PricingCache()
+        await writer.update(db, {"vehicles": [SEDAN]})
+        await reader.load(db)
+        unchanged = await reader.refresh_if_stale(db)
+
+        await writer.update(db, {"vehicles": [{**SEDAN, "price_per_km": 14}]})
+        stale = reader.get("sedan").price_per_km
+        reloaded = await reader.refresh_if_stale(db)
+        return unchanged, stale, reloaded, reader
+
+    unchanged, stale, reloaded, reader = mongo(scenario)
+    assert not unchanged
+    assert stale == 12
+    assert reloaded
+    assert reader.version == 2
+    assert reader.get("sedan").price_per_km == 14
+    assert reader.stats["version_checks"] == 2
@@ -0,0 +1,84 @@
+import pytest
+
+from models import Ride, RideStatus, VehiclePricing
+from services import ride_completion
+from services.activity_writer import activity_writer
+from services.bill_service import BillGenerator
+from services.ride_completion import settle_completed_ride
+from services.ride_state import RideTransitionError
+
+PRICING = VehiclePricing(vehicle_type="sedan", base_price=50, price_per_km=12, price_per_min=1.5, minimum_fare=100)
+LOCATION = {"address": "Connaught Place", "latitude": 28.63, "longitude": 77.22}
+
+
+async def _seed(db):
+    await db.users.insert_many([
+        {"id": "C1", "name": "Asha", "phone": "9000000001", "wallet_balance": 1000.0},
+        {"id": "D1", "name": "Ravi", "phone": "9000000002", "wallet_balance": 0.0}
+    ])
+    ride = Ride(
+        customer_id="C1", driver_id="D1", pickup_location=LOCATION, drop_location=LOCATION,
+        vehicle_type="sedan", distance=10, estimated_duration=20, estimated_fare=200, status=RideStatus.ONGOING
+    )
+    await db.rides.insert_one(ride.dict())
+    return ride
+
+
+async def _balances(db):
+    return {user["id"]: user["wallet_balance"] async for user in db.users.find({}, {"_id": 0})}
+
+
+def test_completion_writes_everything_once(mongo):
+    async def scenario(db):
+        ride = await _seed(db)
+        bill = BillGenerator.generate_bill(ride, PRICING, 10, 20)
+        queued = activity_writer.stats["enqueued"]
+        settled = await settle_completed_ride(db, ride, bill, "wallet")
+        return (
+            bill, settled, await _balances(db), await db.transactions.count_documents({}),
+            await db.bills.count_documents({}), activity_writer.stats["enqueued"] - queued
+        )
+
+    bill, settled, balances, transactions, bills, logged = mongo(scenario)
+    assert settled["ride"]["status"] == RideStatus.COMPLETED
+    assert balances == {"C1": 1000.0 - bill.total, "D1": pytest.approx(bill.total * 0.8)}
+    assert (transactions, bills) == (2, 1)
+    # Without a session the activity goes through the batched writer
+    assert logged == 1
+
+
+def test_failed_completion_stays_ongoing_and_resumes_once(mongo, monkeypatch):
+    async def scenario(db):
+        ride = await _seed(db)
+        first_bill = BillGenerator.generate_bill(ride, PRICING, 10, 20)
+        enqueue = ride_completion.outbox.enqueue
+
+        async def outbox_down(*args, **kwargs):
+            raise RuntimeError("outbox down")
+
+        monkeypatch.setattr(ride_completion.outbox, "enqueue", outbox_down)
+        with pytest.raises(RuntimeError):
+            await settle_completed_ride(db, ride, first_bill, "wallet")
+        status = (await db.rides.find_one({"id": ride.id}))["status"]
+
+        monkeypatch.setattr(ride_completion.outbox, "enqueue", enqueue)
+        # A retry right away could race the failed attempt's worker
+        with pytest.raises(RideTransitionError) as in_progress:
+            await settle_completed_ride(db, ride, first_bill, "wallet")
+
+        monkeypatch.setattr(ride_completion, "RESUME_AFTER_SECONDS", 0)
+        retry_bill = BillGenerator.generate_bill(ride, PRICING, 50, 90)
+        settled = await settle_completed_ride(db, ride, retry_bill, "wallet")
+        return (
+            first_bill, status, in_progress.value.status_code, settled, await _balances(db),
+            await db.transactions.count_documents({}), await db.notification_outbox.count_documents({}),
+            (await db.stats_counters.find_one({"id": "global"}))["completed_rides"]
+        )
+
+    first_bill, status, in_progress, settled, balances, transactions, messages, completed = mongo(scenario)
+    assert status == RideStatus.ONGOING
+    assert in_progress == 409
+    assert settled["ride"]["status"] == RideStatus.COMPLETED
+    assert settled["bill"].id == first_bill.id
+    assert balances == {"C1": 1000.0 - first_bill.total, "D1": pytest.approx(first_bill.total * 0.8)}
+    assert (transactions, messages, completed) == (2, 1, 1)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from models import RideStatus
+from services.ride_state import transition_ride, RideTransitionError
+
+
+async def _insert(db, ride_id="R1", status=RideStatus.REQUESTED):
+    await db.rides.insert_one({"id": ride_id, "status": status})
+
+
+def test_concurrent_accepts_have_one_winner(mongo):
+    async def scenario(db):
+        await _insert(db)
+
+        async def accept(driver):
+            try:
+                await transition_ride(db, "R1", "accept", {"driver_id": f"D{driver}"})
+                return f"D{driver}"
+            except RideTransitionError as e:
+                assert e.status_code == 409
+                return None
+
+        results = await asyncio.gather(*(accept(i) for i in range(300)))
+        winners = [r for r in results if r]
+        stored = await db.rides.find_one({"id": "R1"})
+        return winners, stored
+
+    winners, stored = mongo(scenario)
+    assert len(winners) == 1
+    assert stored["status"] == RideStatus.ACCEPTED
+    assert stored["driver_id"] == winners[0]
+
+
+def test_unknown_ride_is_404(mongo):
+    async def scenario(db):
+        with pytest.raises(RideTransitionError) as raised:
+            await transition_ride(db, "missing", "accept", {"driver_id": "D1"})
+        return raised.value.status_code
+
+    assert mongo(scenario) == 404
+
+
+@pytest.mark.parametrize("status, event", [
+    (RideStatus.REQUESTED, "start"),
+    (RideStatus.REQUESTED, "complete"),
+    (RideStatus.ACCEPTED, "accept"),
+    (RideStatus.ONGOING, "cancel"),
+    (RideStatus.COMPLETED, "complete"),
+    (RideStatus.CANCELLED, "accept"),
+])
+def test_wrong_state_is_409_and_leaves_ride_unchanged(mongo, status, event):
+    async def scenario(db):
+        await _insert(db, status=status)
+        with pytest.raises(RideTransitionError) as raised:
+            await transition_ride(db, "R1", event, {"marker": True})
+        return raised.value.status_code, await db.rides.find_one({"id": "R1"}, {"_id": 0})
+
+    status_code, stored = mongo(scenario)
+    assert status_code == 409
+    assert stored == {"id": "R1", "status": status}
+
+
+def test_lifecycle_returns_updated_documents(mongo):
+    async def scenario(db):
+        await _insert(db)
+        seen = []
+        for event, fields in [("accept", {"driver_id": "D1"}), ("start", None), ("complete", {"actual_fare": 250.0})]:
+            ride = await transition_ride(db, "R1", event, fields)
+            seen.append(ride["status"])
+        return seen, ride
+
+    seen, ride = mongo(scenario)
+    assert seen == [RideStatus.ACCEPTED, RideStatus.ONGOING, RideStatus.COMPLETED]
+    assert ride["driver_id"] == "D1" and ride["actual_fare"] == 250.0
+    assert "_id" not in ride